@@ -0,0 +1,246 @@
+from typing import Iterable
+
+import numpy as np
+
+from table import Interner
+import timestamps as ts
+
+# Each (user, bucket) pair of the sparse dimensions is counted under one integer key:
+# user << BUCKET_BITS | bucket.
+BUCKET_BITS = 32
+BUCKET_MASK = (1 << BUCKET_BITS) - 1
+
+# Position recorded for the cells without messages, after any real one.
+NEVER = np.iinfo(np.int64).max
+
+
+class ActivityCube:
+    """
+    Message counts per user and time bucket, answering activity questions with array operations.
+
+    Counts per user, weekday and hour of day are kept in a dense (users, 7, 24) int32 cube, so the
+    activity of any users, weekdays and hours is a slice, a heatmap is a sum over the user
+    axis, and each user's most active hour or weekday is an `argmax`. Months and days, whose
+    number grows with the export, are kept as sparse counts per (user, bucket) key.
+
+    The position of each user's first message in each hour and weekday is kept as well, so
+    ties are broken like `Counter.most_common`: by first occurrence.
+
+    Args:
+    - users (list): The users, in the order of their codes.
+    """
+
+    def __init__(self, users: list | None = None):
+        self.interner = Interner(users or [])
+        self.cells = np.zeros((len(self.users), 7, 24), dtype=np.int32)
+        self.first_hour = np.full((len(self.users), 24), NEVER, dtype=np.int64)
+        self.first_weekday = np.full((len(self.users), 7), NEVER, dtype=np.int64)
+        empty = np.zeros(0, dtype=np.int64)
+        self.months = ts.KeyCounts(empty, empty, empty, 0)
+        self.days = ts.KeyCounts(empty, empty, empty, 0)
+        self.size = 0
+
+    @property
+    def users(self) -> list:
+        return self.interner.values
+
+    @property
+    def codes(self) -> dict:
+        return self.interner.codes
+
+    @classmethod
+    def from_messages(cls, users: list, senders: np.ndarray, timestamps: np.ndarray) -> 'ActivityCube':
+        """
+        Count a batch of messages in one vectorized pass.
+
+        Args:
+        - users (list): The users, in the order of their codes.
+        - senders (np.ndarray): The user code of each message, negative where it is not counted.
+        - timestamps (np.ndarray): The timestamp of each message, `ts.MISSING` where it has none.
+
+        Returns:
+        - cube (ActivityCube): The counts over the batch.
+        """
+        senders = np.asarray(senders, dtype=np.int64)
+        positions = np.flatnonzero((senders >= 0) & (timestamps != ts.MISSING))
+        cube = cls(users)
+        cube._count(senders[positions], timestamps[positions], np.ones(len(positions), dtype=np.int64), positions)
+        keys = senders[positions] << BUCKET_BITS
+        cube.months = ts.KeyCounts.from_keys(keys | ts.months(timestamps[positions]), positions, len(timestamps))
+        cube.days = ts.KeyCounts.from_keys(keys | ts.days(timestamps[positions]), positions, len(timestamps))
+        cube.size = len(timestamps)
+        return cube
+
+    @classmethod
+    def from_counts(cls, users: list, senders: np.ndarray, starts: np.ndarray, counts: np.ndarray,
+                    first: np.ndarray, size: int) -> 'ActivityCube':
+        """
+        Build the cube from message counts per user and quarter hour, such as `MessageStore.time_counts`.
+
+        Args:
+        - users (list): The users, in the order of their codes.
+        - senders (np.ndarray): The user code of each count.
+        - starts (np.ndarray): The timestamp at which the quarter hour of each count starts.
+        - counts (np.ndarray): The number of messages of each count.
+        - first (np.ndarray): The position of the first message of each count.
+        - size (int): Number of messages the counts were taken over.
+
+        Returns:
+        - cube (ActivityCube): The counts.
+        """
+        senders = np.asarray(senders, dtype=np.int64)
+        cube = cls(users)
+        cube._count(senders, starts, counts, first)
+        keys = senders << BUCKET_BITS
+        cube.months = ts.KeyCounts.from_counts(keys | ts.months(starts), counts, first, size)
+        cube.days = ts.KeyCounts.from_counts(keys | ts.days(starts), counts, first, size)
+        cube.size = size
+        return cube
+
+    def _count(self, senders: np.ndarray, timestamps: np.ndarray, counts: np.ndarray, first: np.ndarray):
+        # Add counts to the dense cells, and lower the first positions of their hours and weekdays.
+        hours, weekdays = ts.hours(timestamps), ts.weekdays(timestamps)
+        users = len(self.users)
+        self.cells += np.bincount((senders * 7 + weekdays) * 24 + hours, weights=counts,
+                                  minlength=users * 7 * 24).astype(np.int32).reshape(users, 7, 24)
+        np.minimum.at(self.first_hour.reshape(-1), senders * 24 + hours, first)
+        np.minimum.at(self.first_weekday.reshape(-1), senders * 7 + weekdays, first)
+
+    def merge(self, other: 'ActivityCube'):
+        """
+        Fold in the cube of the messages that follow.
+
+        Args:
+        - other (ActivityCube): Counts taken over the next messages.
+        """
+        users = len(self.users)
+        lookup = np.array([self.interner.code(user) for user in other.users], dtype=np.int64)
+        new = len(self.users) - users
+        if new:
+            self.cells = np.concatenate((self.cells, np.zeros((new, 7, 24), dtype=np.int32)))
+            self.first_hour = np.concatenate((self.first_hour, np.full((new, 24), NEVER, dtype=np.int64)))
+            self.first_weekday = np.concatenate((self.first_weekday, np.full((new, 7), NEVER, dtype=np.int64)))
+        self.cells[lookup] += other.cells
+        for mine, theirs in ((self.first_hour, other.first_hour), (self.first_weekday, other.first_weekday)):
+            mine[lookup] = np.minimum(mine[lookup], np.where(theirs != NEVER, theirs + self.size, NEVER))
+        for name in ('months', 'days'):
+            counts = getattr(other, name)
+            keys = lookup[counts.keys >> BUCKET_BITS] << BUCKET_BITS | (counts.keys & BUCKET_MASK)
+            renamed = ts.KeyCounts(keys, counts.counts, counts.first, counts.size)
+            setattr(self, name, getattr(self, name).merge(renamed))
+        self.size += other.size
+
+    def totals(self) -> np.ndarray:
+        """
+        Return the number of dated messages of each user.
+        """
+        return self.cells.sum(axis=(1, 2))
+
+    def first_seen(self) -> np.ndarray:
+        """
+        Return the position of each user's first dated message, `NEVER` for users without any.
+        """
+        return self.first_weekday.min(axis=1)
+
+    def _selection(self, users: Iterable | None) -> np.ndarray | slice:
+        # Codes of the named users; all of them when no names are given.
+        if users is None:
+            return slice(None)
+        return np.array([self.codes[user] for user in users if user in self.codes], dtype=np.int64)
+
+    def select(self, users: Iterable | None = None, weekdays: Iterable[int] | None = None,
+               hours: Iterable[int] | None = None) -> np.ndarray:
+        """
+        Slice the cube.
+
+        Args:
+        - users (Iterable): Names of the users to keep, in the order given. None keeps all of them.
+        - weekdays (Iterable[int]): Weekdays to keep, Monday being 0. None keeps all of them.
+        - hours (Iterable[int]): Hours of the day to keep, from 0 to 23. None keeps all of them.
+
+        Returns:
+        - cells (np.ndarray): A (users, weekdays, hours) array of message counts.
+        """
+        cells = self.cells[self._selection(users)]
+        if weekdays is not None:
+            cells = cells[:, list(weekdays)]
+        if hours is not None:
+            cells = cells[:, :, list(hours)]
+        return cells
+
+    def heatmap(self, users: Iterable | None = None) -> np.ndarray:
+        """
+        Count messages per weekday and hour of day.
+
+        Args:
+        - users (Iterable): Names of the users whose messages are counted. None counts everyone's.
+
+        Returns:
+        - heatmap (np.ndarray): A (7, 24) array of message counts, Monday first.
+        """
+        return self.cells[self._selection(users)].sum(axis=0)
+
+    def most_active(self, dimension: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find each user's most active bucket of a time dimension.
+
+        Args:
+        - dimension (str): 'Hour', 'Weekday', 'Month' or 'Day'.
+
+        Returns:
+        - codes (np.ndarray): The users with dated messages, in ascending code order.
+        - buckets (np.ndarray): Each user's most active bucket: an hour, a weekday, or the
+          month or day number used by `timestamps`.
+        - counts (np.ndarray): The number of messages of each user in that bucket.
+        """
+        if dimension in ('Month', 'Day'):
+            counts = self.months if dimension == 'Month' else self.days
+            return ts.most_common_by_group(counts.keys >> BUCKET_BITS, counts.keys & BUCKET_MASK,
+                                           counts.counts, counts.first)
+        counts, first = (self.cells.sum(axis=1), self.first_hour) if dimension == 'Hour' \
+            else (self.cells.sum(axis=2), self.first_weekday)
+        codes = np.flatnonzero(counts.any(axis=1))
+        counts, first = counts[codes], first[codes]
+        best = counts.max(axis=1)
+        # Among the buckets with the most messages, the one whose first message came first.
+        buckets = np.where(counts == best[:, None], first, NEVER).argmin(axis=1)
+        return codes, buckets, best
+
+    def get_state(self) -> dict:
+        """
+        Return the cube as JSON-serialisable data, its dense arrays stored as their non-empty cells.
+
+        Returns:
+        - state (dict): The users, cells, first positions, sparse counts and batch size.
+        """
+        filled = np.flatnonzero(self.cells)
+        hours, weekdays = np.flatnonzero(self.first_hour != NEVER), np.flatnonzero(self.first_weekday != NEVER)
+        return {
+            'users': self.users,
+            'cells': [filled.tolist(), self.cells.reshape(-1)[filled].tolist()],
+            'first_hour': [hours.tolist(), self.first_hour.reshape(-1)[hours].tolist()],
+            'first_weekday': [weekdays.tolist(), self.first_weekday.reshape(-1)[weekdays].tolist()],
+            'months': self.months.get_state(),
+            'days': self.days.get_state(),
+            'size': self.size
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'ActivityCube':
+        """
+        Rebuild a cube from the data returned by `get_state`.
+
+        Args:
+        - state (dict): The serialised cube.
+
+        Returns:
+        - cube (ActivityCube): The cube.
+        """
+        cube = cls(state['users'])
+        for name in ('cells', 'first_hour', 'first_weekday'):
+            indices, values = state[name]
+            getattr(cube, name).reshape(-1)[np.array(indices, dtype=np.int64)] = values
+        cube.months = ts.KeyCounts.from_state(state['months'])
+        cube.days = ts.KeyCounts.from_state(state['days'])
+        cube.size = state['size']
+        return cube
@@ -0,0 +1,287 @@
+from itertools import islice
+import json
+from typing import Any, Iterator
+
+import numpy as np
+
+from stream import iter_messages
+from table import ABSENT, TEXT_ABSENT, TEXT_RICH, Interner, MessageTable
+import timestamps as ts
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+# Number of messages converted at a time, and written as one Parquet row group.
+ROW_GROUP_SIZE = 1 << 17
+
+# Schema metadata key under which the chat header is kept, as JSON.
+HEADER_KEY = b'telegram_chat'
+
+
+def _require():
+    if pa is None:
+        raise ImportError("Exporting to Arrow and Parquet requires pyarrow, which is not installed")
+
+
+def schema(header: dict | None = None) -> 'pa.Schema':
+    """
+    Return the Arrow schema of exported messages.
+
+    Dates are timestamps in seconds on the export's wall clock, without a time zone, like the
+    `date` strings of the export. Senders, `from_id` values and forward sources are
+    dictionary-encoded strings, which pandas reads as categoricals. Texts are kept as in the
+    export: plain texts as strings and rich texts, lists of entities, as their JSON.
+
+    Args:
+    - header (dict): The chat header, such as its name, type and id, stored in the schema metadata.
+
+    Returns:
+    - schema (pa.Schema): The schema.
+    """
+    _require()
+    names = pa.dictionary(pa.int32(), pa.string())
+    fields = [
+        ('id', pa.int64()),
+        ('date', pa.timestamp('s')),
+        ('from', names),
+        ('from_id', names),
+        ('reply_to_message_id', pa.int64()),
+        ('forwarded_from', names),
+        ('edited', pa.timestamp('s')),
+        ('text', pa.large_string()),
+        ('rich_text', pa.bool_()),
+    ]
+    metadata = {HEADER_KEY: json.dumps(header or {}, ensure_ascii=False).encode('utf-8')}
+    return pa.schema(fields, metadata=metadata)
+
+
+def _header(data: Any) -> dict:
+    return {key: value for key, value in data.items() if key != 'messages'} if isinstance(data, dict) \
+        else dict(getattr(data, 'header', {}))
+
+
+def _mask(absent: np.ndarray) -> np.ndarray | None:
+    # Arrow skips the validity bitmap of columns without nulls.
+    return absent if absent.any() else None
+
+
+def _integers(values: np.ndarray, missing: int) -> 'pa.Array':
+    return pa.array(values, type=pa.int64(), mask=_mask(values == missing))
+
+
+def _timestamps(values: np.ndarray) -> 'pa.Array':
+    return pa.array(values.view('datetime64[s]'), mask=_mask(values == ts.MISSING))
+
+
+def _dictionary(codes: np.ndarray, values: list, interner: Interner | None = None) -> 'pa.DictionaryArray':
+    # Without an interner, each batch gets a dictionary of the values it uses only; with one,
+    # every batch's dictionary extends the previous one, so an IPC file stores deltas. None
+    # values, such as the names of deleted accounts, are nulls: Parquet dictionaries cannot hold them.
+    codes = codes.astype(np.int64)
+    if interner is None:
+        known = np.array([value is not None for value in values], dtype=bool)
+        used = np.flatnonzero((np.bincount(codes + 1, minlength=len(values) + 1)[1:] > 0) & known)
+        lookup = np.full(len(values) + 1, ABSENT, dtype=np.int32)
+        lookup[used + 1] = np.arange(len(used), dtype=np.int32)
+        values = [values[code] for code in used.tolist()]
+    else:
+        lookup = np.array([ABSENT] + [interner.code(value) if value is not None else ABSENT for value in values],
+                          dtype=np.int32)
+        values = interner.values
+    indices = lookup[codes + 1]
+    return pa.DictionaryArray.from_arrays(pa.array(indices, mask=_mask(indices == ABSENT)),
+                                          pa.array(values, type=pa.string()))
+
+
+def record_batch(table: MessageTable, pools: tuple[Interner, Interner, Interner] | None = None,
+                 header: dict | None = None) -> 'pa.RecordBatch':
+    """
+    Convert a `MessageTable` to an Arrow record batch.
+
+    Numeric and timestamp columns, text offsets and the text buffer are handed to Arrow
+    without being copied; only validity bitmaps and dictionary indices are built.
+
+    Args:
+    - table (MessageTable): The messages.
+    - pools (tuple): Interners of the senders, `from_id` values and forward sources shared by
+      consecutive batches, so that their dictionaries only grow. None gives each batch its own.
+    - header (dict): The chat header stored in the schema metadata.
+
+    Returns:
+    - batch (pa.RecordBatch): The messages, with the columns of `schema`.
+    """
+    _require()
+    pools = pools or (None, None, None)
+    present = table.text_kind != TEXT_ABSENT
+    validity = None if present.all() else pa.py_buffer(np.packbits(present, bitorder='little'))
+    text = pa.Array.from_buffers(pa.large_string(), len(table),
+                                 [validity, pa.py_buffer(np.ascontiguousarray(table.text_offsets)),
+                                  pa.py_buffer(table.text_data)], null_count=len(table) - int(present.sum()))
+    columns = [
+        _integers(table.id, ABSENT),
+        _timestamps(table.timestamp),
+        _dictionary(table.sender, table.senders, pools[0]),
+        _dictionary(table.from_id, table.from_ids, pools[1]),
+        _integers(table.reply_to, ABSENT),
+        _dictionary(table.forwarded_from, table.forward_sources, pools[2]),
+        _timestamps(table.edited),
+        text,
+        pa.array(table.text_kind == TEXT_RICH, mask=_mask(~present)),
+    ]
+    return pa.RecordBatch.from_arrays(columns, schema=schema(header))
+
+
+def _tables(data: Any, batch_size: int) -> Iterator[MessageTable]:
+    # Consecutive parts of the export, as tables of at most `batch_size` messages.
+    if isinstance(data, MessageTable):
+        for start in range(0, len(data), batch_size):
+            yield data.take(slice(start, start + batch_size))
+        return
+    # The messages of each part are consumed as they are read, never held as a list of dictionaries.
+    messages = iter(iter_messages(data))
+    while True:
+        table = MessageTable.build(islice(messages, batch_size))
+        if not len(table):
+            return
+        yield table
+
+
+def record_batches(data: Any, batch_size: int = ROW_GROUP_SIZE, shared_dictionaries: bool = False) \
+        -> Iterator['pa.RecordBatch']:
+    """
+    Convert an export to Arrow record batches while its messages are read.
+
+    Only one batch of messages is held at a time, so streamed exports are converted in
+    bounded memory.
+
+    Args:
+    - data: The JSON data, a `ChatStream`, a `MessageTable`, a `MessageStore`, or an iterable of messages.
+    - batch_size (int): Number of messages per batch.
+    - shared_dictionaries (bool): Whether each batch's dictionaries extend the previous batch's
+      (see `record_batch`), as the Arrow IPC file format requires.
+
+    Returns:
+    - batches (Iterator[pa.RecordBatch]): The batches, in export order.
+    """
+    _require()
+    header = _header(data)
+    pools = (Interner(), Interner(), Interner()) if shared_dictionaries else None
+    for table in _tables(data, batch_size):
+        yield record_batch(table, pools, header)
+
+
+def to_arrow(data: Any) -> 'pa.Table':
+    """
+    Convert an export to an Arrow table in memory.
+
+    The columns of a `MessageTable` are shared with the returned table rather than copied.
+    The result converts directly with `to_pandas()` or `polars.from_arrow`, and DuckDB
+    can query it by name.
+
+    Args:
+    - data: The JSON data, a `ChatStream`, a `MessageTable`, a `MessageStore`, or an iterable of messages.
+
+    Returns:
+    - table (pa.Table): The messages, with the columns of `schema`.
+    """
+    _require()
+    table = data if isinstance(data, MessageTable) else MessageTable.build(iter_messages(data))
+    return pa.Table.from_batches([record_batch(table, header=_header(data))])
+
+
+def write_parquet(data: Any, path: str, row_group_size: int = ROW_GROUP_SIZE, compression: str = 'zstd') -> int:
+    """
+    Write an export to a Parquet file, one row group at a time.
+
+    Each row group is converted and written before the next messages are read, and
+    dictionary-encoded columns are written as Parquet dictionary pages.
+
+    Args:
+    - data: The JSON data, a `ChatStream`, a `MessageTable`, a `MessageStore`, or an iterable of messages.
+    - path (str): The path of the file to write.
+    - row_group_size (int): Number of messages per row group.
+    - compression (str): The Parquet compression codec, such as 'zstd', 'snappy' or 'none'.
+
+    Returns:
+    - count (int): Number of messages written.
+    """
+    _require()
+    count = 0
+    with pq.ParquetWriter(path, schema(_header(data)), compression=compression) as writer:
+        for batch in record_batches(data, row_group_size):
+            writer.write_table(pa.Table.from_batches([batch]), row_group_size=row_group_size)
+            count += batch.num_rows
+    return count
+
+
+def read_parquet(path: str, columns: list | None = None) -> 'pa.Table':
+    """
+    Read a file written by `write_parquet`.
+
+    Parquet has no timestamps in seconds, so dates are read back in milliseconds.
+
+    Args:
+    - path (str): The path of the file.
+    - columns (list): Names of the columns to read; all of them when omitted.
+
+    Returns:
+    - table (pa.Table): The messages, with dictionary-encoded columns kept as such.
+    """
+    _require()
+    return pq.read_table(path, columns=columns, memory_map=True)
+
+
+def write_arrow(data: Any, path: str, batch_size: int = ROW_GROUP_SIZE) -> int:
+    """
+    Write an export to an uncompressed Arrow IPC file (Feather version 2), one batch at a time.
+
+    Unlike Parquet, the file holds the columns in their in-memory layout, so `read_arrow`
+    maps them instead of decoding them.
+
+    Args:
+    - data: The JSON data, a `ChatStream`, a `MessageTable`, a `MessageStore`, or an iterable of messages.
+    - path (str): The path of the file to write.
+    - batch_size (int): Number of messages per record batch.
+
+    Returns:
+    - count (int): Number of messages written.
+    """
+    _require()
+    count = 0
+    options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema(_header(data)), options=options) as writer:
+        for batch in record_batches(data, batch_size, shared_dictionaries=True):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+
+def read_arrow(path: str) -> 'pa.Table':
+    """
+    Memory-map a file written by `write_arrow`, without copying its columns.
+
+    Args:
+    - path (str): The path of the file.
+
+    Returns:
+    - table (pa.Table): The messages, backed by the mapped file.
+    """
+    _require()
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def chat_header(table: 'pa.Table') -> dict:
+    """
+    Return the chat header stored in the metadata of an exported table.
+
+    Args:
+    - table (pa.Table): A table returned by `to_arrow`, `read_parquet` or `read_arrow`.
+
+    Returns:
+    - header (dict): The chat header, such as its name, type and id.
+    """
+    return json.loads((table.schema.metadata or {}).get(HEADER_KEY, b'{}').decode('utf-8'))
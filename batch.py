@@ -0,0 +1,172 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import mmap
+import os
+import re
+from typing import Any, Iterator
+
+from compression import detect_compression
+from engine import Analysis, METRICS, finish, merge_states
+from parallel import array_layout, boundaries, imap_bounded, parse_messages
+from stream import ChatStream, is_account_export, iter_chats
+
+
+CHATS_KEY = re.compile(rb'\n([ \t]*)"chats"[ \t]*:[ \t]*\{')
+SUMMARY_FILE = 'summary.json'
+
+
+def chat_ranges(file_path: str) -> list | None:
+    """
+    Find the byte range of each chat of a pretty-printed full-account export.
+
+    Args:
+    - file_path (str): The path to the JSON file.
+
+    Returns:
+    - ranges (list): (start, end) byte offsets of each chat under `chats.list`, in order.
+    - None: If the export is compressed, is not pretty-printed or has no chats.
+    """
+    if detect_compression(file_path) is not None:
+        return None
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            match = CHATS_KEY.search(data)
+            if match is None:
+                return None
+            layout = array_layout(data, b'list', match.end())
+            if layout is None:
+                return None
+            return boundaries(data, *layout)
+
+
+def chat_file_name(chat: Any, index: int) -> str:
+    return f"chat_{chat.get('id', index)}.json"
+
+
+def write_json(path: str, data: Any):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+
+
+def analyze_chat(analysis: Analysis, chat: Any, index: int, output_dir: str) -> tuple[dict, dict]:
+    """
+    Analyse one chat and write its results to `output_dir`.
+
+    Args:
+    - analysis (Analysis): The metrics to compute; must include 'messages_count'.
+    - chat: The chat, as a dictionary or a `ChatStream`.
+    - index (int): Position of the chat in the export, used to name chats without an `id`.
+    - output_dir (str): The directory to write the results to.
+
+    Returns:
+    - info (dict): The chat's name, type, id and number of messages.
+    - states (dict): The metric states, to be merged into the cross-chat summary.
+    """
+    states = analysis.scan(chat)
+    info = {
+        'name': chat.get('name', 'Unknown'),
+        'type': chat.get('type', 'Unknown'),
+        'id': chat.get('id', 'Unknown'),
+        'messages_count': states['messages_count'].result()
+    }
+    write_json(os.path.join(output_dir, chat_file_name(chat, index)), {'chat': info, 'results': finish(states)})
+    return info, states
+
+
+def _analyze_range(analysis: Analysis, file_path: str, start: int, end: int, index: int,
+                   output_dir: str) -> tuple[dict, dict]:
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        chat = parse_messages(f.read(end - start))[0]
+    return analyze_chat(analysis, chat, index, output_dir)
+
+
+def _chat_arguments(analysis: Analysis, file_path: str, output_dir: str) -> Iterator[tuple]:
+    ranges = chat_ranges(file_path)
+    if ranges is not None:
+        for index, (start, end) in enumerate(ranges):
+            yield _analyze_range, (analysis, file_path, start, end, index, output_dir)
+    else:
+        for index, chat in enumerate(iter_chats(file_path)):
+            yield analyze_chat, (analysis, chat, index, output_dir)
+
+
+def run_batch(analysis: Analysis, file_path: str, output_dir: str, workers: int | None = None,
+              in_flight: int | None = None) -> dict:
+    """
+    Analyse every chat of an export with a pool of processes.
+
+    Each chat is analysed by one worker, which writes `chat_<id>.json` to `output_dir`.
+    The per-chat states are then merged into a cross-chat summary written to
+    `summary.json`. At most `in_flight` chats are being analysed or waiting for a worker
+    at any time, so memory use is bounded by the largest few chats rather than the export.
+
+    Pretty-printed full-account exports are cut into chats by byte offsets and each worker
+    parses its own chat; otherwise the chats are streamed from the file and sent to the
+    workers. A single-chat export is analysed as a batch of one.
+
+    Args:
+    - analysis (Analysis): The metrics to compute.
+    - file_path (str): The path to the JSON file.
+    - output_dir (str): The directory to write the results to.
+    - workers (int): Number of worker processes. Defaults to the number of CPUs.
+    - in_flight (int): Maximum number of chats submitted at once. Defaults to twice the number of workers.
+
+    Returns:
+    - summary (dict): The number of chats and messages, the information of each chat and
+      the results over all chats together.
+    """
+    # Every chat reports its size, so make sure its messages are counted.
+    requested, analysis = analysis.requested, Analysis().add('messages_count')
+    analysis.requested.update(requested)
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    if is_account_export(file_path):
+        calls = _chat_arguments(analysis, file_path, output_dir)
+    else:
+        calls = iter([(analyze_chat, (analysis, ChatStream(file_path), 0, output_dir))])
+
+    if workers == 1:
+        analysed = (function(*arguments) for function, arguments in calls)
+        return _summarize(analysed, output_dir)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        analysed = imap_bounded(executor, _call, calls, in_flight or 2 * workers)
+        return _summarize(analysed, output_dir)
+
+
+def _call(function, arguments):
+    return function(*arguments)
+
+
+def _summarize(analysed: Iterator[tuple[dict, dict]], output_dir: str) -> dict:
+    chats, merged = [], None
+    for info, states in analysed:
+        chats.append(info)
+        merged = states if merged is None else merge_states([merged, states])
+    summary = {
+        'chats_count': len(chats),
+        'messages_count': sum(chat['messages_count'] for chat in chats),
+        'chats': chats,
+        'results': finish(merged) if merged is not None else {}
+    }
+    write_json(os.path.join(output_dir, SUMMARY_FILE), summary)
+    return summary
+
+
+def main(argv: list | None = None):
+    parser = argparse.ArgumentParser(description='Analyse every chat of a Telegram export with a pool of processes.')
+    parser.add_argument('export')
+    parser.add_argument('-o', '--output', required=True, help='Directory to write the per-chat results and summary to.')
+    parser.add_argument('--metrics', nargs='+', default=list(METRICS), choices=list(METRICS))
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args(argv)
+    summary = run_batch(Analysis(*args.metrics), args.export, args.output, args.workers)
+    print(f"Analysed {summary['chats_count']} chats, {summary['messages_count']} messages")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import random
+import sys
+import time
+sys.path.append('../')
+from engine import Analysis
+from synthetic import make_export
+from tokenizer import count_words
+
+
+def counter_bytes(counts: dict) -> int:
+    # The dictionary itself plus its keys; small counts are shared int objects.
+    return sys.getsizeof(counts) + sum(sys.getsizeof(key) for key in counts)
+
+
+def add_rare_words(messages: list, words: int, seed: int = 0):
+    # Synthetic chats reuse a small vocabulary; typos, names and links make real ones grow.
+    generator = random.Random(seed)
+    for message in messages:
+        if isinstance(message.get('text'), str) and words > 0:
+            message['text'] += f' w{generator.getrandbits(40):x}'
+            words -= 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare approximate word counts with exact ones.')
+    parser.add_argument('--messages', type=int, default=300000)
+    parser.add_argument('--rare-words', type=int, default=200000)
+    parser.add_argument('--top-n', type=int, default=20)
+    args = parser.parse_args()
+
+    messages = make_export(args.messages)['messages']
+    add_rare_words(messages, args.rare_words)
+
+    start = time.perf_counter()
+    exact = count_words(messages)
+    seconds = time.perf_counter() - start
+    expected = [word for word, _ in exact.most_common(args.top_n)]
+    print(f"{len(messages)} messages, {sum(exact.values())} words, {len(exact)} distinct")
+    print(f"{'exact':>12} {counter_bytes(exact) / 1e6:8.2f} MB {seconds:6.2f}s")
+
+    print(f"{'memory':>12} {'sketch':>11} {'time':>7} {'epsilon':>9} {'bound':>7} {'max error':>9} {'recall':>7}")
+    for memory in (None, 1 << 20, 1 << 17, 1 << 14):
+        analysis = Analysis().add('approximate_words', top_n=args.top_n, memory=memory)
+        start = time.perf_counter()
+        result = analysis.run(messages)['approximate_words']
+        seconds = time.perf_counter() - start
+        errors = [row['occurrence'] - exact[row['word']] for row in result['ranking']]
+        assert min(errors) >= 0
+        recall = len({row['word'] for row in result['ranking']} & set(expected)) / len(expected)
+        print(f"{str(memory):>12} {result['memory_bytes'] / 1e6:8.2f} MB {seconds:6.2f}s {result['epsilon']:9.5f} "
+              f"{result['error_bound']:7d} {max(errors):9d} {recall:7.0%}")
@@ -0,0 +1,50 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+sys.path.append('../')
+from arrow_export import read_arrow, read_parquet, to_arrow, write_arrow, write_parquet
+from parsers import parse_file
+from stream import ChatStream
+from synthetic import write_export
+from table import MessageTable
+
+
+def timed(function, *args, **kwargs) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare Arrow and Parquet export speed with parsing the JSON.')
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--row-group-size', type=int, default=1 << 17)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = write_export(os.path.join(directory, 'result.json'), args.messages)
+        parquet_path, arrow_path = os.path.join(directory, 'result.parquet'), os.path.join(directory, 'result.arrow')
+        print(f"Export: {args.messages} messages, {os.path.getsize(file_path) / 1e6:.1f} MB")
+
+        seconds, _ = timed(parse_file, file_path)
+        print(f"{'parse JSON':>28} {seconds * 1e3:8.1f}ms")
+        seconds, table = timed(MessageTable.build, ChatStream(file_path))
+        print(f"{'stream into a table':>28} {seconds * 1e3:8.1f}ms")
+        seconds, _ = timed(to_arrow, table)
+        print(f"{'table to Arrow':>28} {seconds * 1e3:8.1f}ms")
+
+        for name, write, path in (('Parquet', write_parquet, parquet_path), ('Arrow IPC', write_arrow, arrow_path)):
+            seconds, _ = timed(write, ChatStream(file_path), path, args.row_group_size)
+            print(f"{f'stream JSON to {name}':>28} {seconds * 1e3:8.1f}ms {os.path.getsize(path) / 1e6:8.1f} MB")
+            seconds, _ = timed(write, table, path, args.row_group_size)
+            print(f"{f'table to {name}':>28} {seconds * 1e3:8.1f}ms")
+
+        seconds, exported = timed(read_parquet, parquet_path)
+        print(f"{'read Parquet':>28} {seconds * 1e3:8.1f}ms")
+        seconds, mapped = timed(read_arrow, arrow_path)
+        print(f"{'map Arrow IPC':>28} {seconds * 1e3:8.1f}ms")
+        assert exported.num_rows == mapped.num_rows == len(table)
+        assert mapped.column('from_id').to_pylist() == [table.from_ids[code] if code >= 0 else None
+                                                        for code in table.from_id.tolist()]
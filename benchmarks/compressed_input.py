@@ -0,0 +1,95 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.append('../')
+from compression import OPENERS, open_binary
+from parsers import parse_file
+from stream import ChatStream
+from synthetic import write_export
+
+import bz2
+import gzip
+import lzma
+
+COMPRESSORS = {
+    'gzip': lambda path: gzip.open(path, 'wb'),
+    'xz': lambda path: lzma.open(path, 'wb', preset=1),
+    'bz2': lambda path: bz2.open(path, 'wb'),
+}
+
+try:
+    import zstandard
+    COMPRESSORS['zstd'] = lambda path: zstandard.open(path, 'wb')
+except ImportError:
+    pass
+
+EXTENSIONS = {'gzip': '.gz', 'xz': '.xz', 'bz2': '.bz2', 'zstd': '.zst'}
+
+
+def compress(file_path: str, compression: str) -> str:
+    path = file_path + EXTENSIONS[compression]
+    with open(file_path, 'rb') as source, COMPRESSORS[compression](path) as target:
+        shutil.copyfileobj(source, target, 1 << 20)
+    return path
+
+
+def decompress(file_path: str, directory: str) -> str:
+    path = os.path.join(directory, 'decompressed.json')
+    with open_binary(file_path) as source, open(path, 'wb') as target:
+        shutil.copyfileobj(source, target, 1 << 20)
+    return path
+
+
+def load(file_path: str):
+    parse_file(file_path)
+
+
+def stream(file_path: str):
+    for _ in ChatStream(file_path).messages():
+        pass
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def decompress_then(function, file_path: str, directory: str) -> float:
+    start = time.perf_counter()
+    path = decompress(file_path, directory)
+    function(path)
+    elapsed = time.perf_counter() - start
+    os.remove(path)
+    return elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compare reading compressed exports directly with decompressing them to disk first.')
+    parser.add_argument('--messages', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = write_export(os.path.join(directory, 'result.json'), args.messages)
+        size = os.path.getsize(file_path) / 1e6
+        print(f"Export: {args.messages} messages, {size:.1f} MB uncompressed")
+        print(f"{'':>6} {'ratio':>6} {'load direct':>12} {'load via disk':>14} {'stream direct':>14} "
+              f"{'stream via disk':>16}   (MB/s of uncompressed JSON)")
+        for compression in COMPRESSORS:
+            if compression not in OPENERS:
+                continue
+            compressed = compress(file_path, compression)
+            ratio = size / (os.path.getsize(compressed) / 1e6)
+            results = [
+                timed(load, compressed),
+                decompress_then(load, compressed, directory),
+                timed(stream, compressed),
+                decompress_then(stream, compressed, directory),
+            ]
+            print(f"{compression:>6} {ratio:6.1f} " + ' '.join(
+                f"{size / seconds:{width}.1f}" for seconds, width in zip(results, (12, 14, 14, 16))))
+            os.remove(compressed)
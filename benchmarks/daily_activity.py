@@ -0,0 +1,44 @@
+import argparse
+from datetime import date
+import sys
+import time
+sys.path.append('../')
+from synthetic import make_export
+from table import MessageTable
+import tool
+
+
+def timed(function, *args, **kwargs) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def per_window(messages: list, window: int) -> list:
+    # Distinct senders over each trailing window, as a set union per day.
+    senders = {}
+    for message in messages:
+        if message.get('date') and message.get('from_id') is not None:
+            senders.setdefault(message['date'][:10], set()).add(message['from_id'])
+    by_number = {date.fromisoformat(day).toordinal(): active for day, active in senders.items()}
+    return [len(set().union(*(by_number.get(day - offset, ()) for offset in range(window))))
+            for day in range(min(by_number), max(by_number) + 1)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare cumulative-sum DAU/WAU/MAU with per-day set unions.')
+    parser.add_argument('--messages', type=int, default=1000000)
+    args = parser.parse_args()
+
+    data = make_export(args.messages)
+    table = MessageTable.build(data)
+    seconds, result = timed(tool.get_daily_activity, table)
+    print(f"{args.messages} messages over {len(result['days'])} days")
+    print(f"{'daily series (table)':>28} {seconds * 1e3:8.1f}ms")
+    seconds, _ = timed(tool.get_daily_activity, data)
+    print(f"{'daily series (JSON data)':>28} {seconds * 1e3:8.1f}ms")
+
+    for name, window in (('wau', 7), ('mau', 30)):
+        baseline, expected = timed(per_window, data['messages'], window)
+        assert result[name] == expected
+        print(f"{name + ', set unions':>28} {baseline * 1e3:8.1f}ms")
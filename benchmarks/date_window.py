@@ -0,0 +1,56 @@
+import argparse
+import sys
+import time
+sys.path.append('../')
+from synthetic import make_export
+from table import MessageTable
+from timeindex import ChatData, time_index, window
+import tool
+
+WINDOWS = [
+    ('2021-01-01', '2021-01-02'),
+    ('2021-03-01', '2021-04-01'),
+    ('2021-01-01', '2022-01-01'),
+]
+
+
+def timed(function, *args, repeat: int = 1, **kwargs) -> tuple[float, object]:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def scan(messages: list, start: str, end: str) -> list:
+    # The Python filter the index replaces.
+    return [message for message in messages if 'date' in message and start <= message['date'] < end]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare date windows found by binary search with a Python filter.')
+    parser.add_argument('--messages', type=int, default=1000000)
+    args = parser.parse_args()
+
+    data = make_export(args.messages)
+    table = MessageTable.build(data)
+    seconds, index = timed(time_index, data)
+    print(f"{'build index (JSON data)':>28} {seconds * 1e3:8.1f}ms")
+
+    print(f"{'window':>28} {'messages':>9} {'index':>9} {'table':>9} {'filter':>9}   (best of 5)")
+    for start, end in WINDOWS:
+        indexed, kept = timed(window, data, start, end, index, repeat=5)
+        sliced, view = timed(window, table, start, end, repeat=5)
+        baseline, expected = timed(scan, data['messages'], start + 'T00:00:00', end + 'T00:00:00', repeat=5)
+        assert kept['messages'] == expected and len(view) == len(expected)
+        print(f"{start + ' to ' + end:>28} {len(expected):9d} {indexed * 1e3:7.2f}ms {sliced * 1e3:7.2f}ms "
+              f"{baseline * 1e3:7.2f}ms")
+
+    # As returned by `tool.load_json`, which keeps the index built by its first call.
+    loaded = ChatData(data)
+    tool.get_oldest_message(loaded)
+    for function in (tool.get_oldest_message, tool.get_latest_message):
+        for name, source in (('table', table), ('load_json', loaded)):
+            seconds, message = timed(function, source, repeat=5)
+            print(f"{f'{function.__name__} ({name})':>40} {seconds * 1e6:8.1f}us (id {message['id']})")
@@ -0,0 +1,61 @@
+import argparse
+from collections import Counter
+import re
+import sys
+import time
+sys.path.append('../')
+from ngrams import NgramCounts
+from synthetic import make_export
+from tokenizer import flatten_text, text_blocks
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def tuple_counts(messages: list, n: int) -> Counter:
+    # The straightforward way: a Counter keyed by tuples of words.
+    counts = Counter()
+    for message in messages:
+        for line in flatten_text(message).lower().split('\n'):
+            words = WORD_PATTERN.findall(line)
+            counts.update(zip(*(words[offset:] for offset in range(n))))
+    return counts
+
+
+def counter_bytes(counts: Counter) -> int:
+    # The dictionary and its tuples; the words themselves are shared with the vocabulary.
+    return sys.getsizeof(counts) + sum(sys.getsizeof(key) for key in counts)
+
+
+def block_counts(messages: list, n: int, max_size: int | None) -> NgramCounts:
+    counts = NgramCounts(n, max_size)
+    for block in text_blocks(messages):
+        counts.add(block)
+    return counts
+
+
+def timed(function, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare hashed n-gram counts with a Counter of tuples.')
+    parser.add_argument('--messages', type=int, default=300000)
+    parser.add_argument('--max-size', type=int, default=20000)
+    args = parser.parse_args()
+
+    messages = make_export(args.messages)['messages']
+    print(f"{'':>22} {'time':>7} {'memory':>9} {'n-grams':>8}")
+    for n in (2, 3):
+        seconds, expected = timed(tuple_counts, messages, n)
+        print(f"{f'{n}-grams, tuples':>22} {seconds:6.2f}s {counter_bytes(expected) / 1e6:6.2f} MB {len(expected):8d}")
+        for max_size in (None, args.max_size):
+            seconds, counts = timed(block_counts, messages, n, max_size)
+            top = [(tuple(ngram.split()), count) for ngram, count in counts.top(10)]
+            assert top == expected.most_common(10)
+            if max_size is None:
+                assert len(counts.keys) == len(expected)
+            memory = counts.keys.nbytes + counts.grams.nbytes + counts.counts.nbytes + counts.first.nbytes
+            label = f'{n}-grams, hashed' + (f' <= {max_size}' if max_size else '')
+            print(f"{label:>22} {seconds:6.2f}s {memory / 1e6:6.2f} MB {len(counts.keys):8d}")
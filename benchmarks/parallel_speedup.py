@@ -0,0 +1,41 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+sys.path.append('../')
+from engine import Analysis, METRICS
+from parallel import run_parallel
+from synthetic import write_export
+
+
+def benchmark(file_path: str, workers: int) -> float:
+    """
+    Measure the time taken to compute every metric of an export.
+
+    Args:
+    - file_path (str): The export to analyse.
+    - workers (int): Number of worker processes.
+
+    Returns:
+    - seconds (float): Wall-clock time of the analysis.
+    """
+    start = time.perf_counter()
+    run_parallel(Analysis(*METRICS), file_path, workers)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the speed-up of parallel analysis on a synthetic export.')
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = write_export(os.path.join(directory, 'result.json'), args.messages)
+        print(f"Export: {args.messages} messages, {os.path.getsize(file_path) / 1e6:.1f} MB")
+        baseline = None
+        for workers in args.workers:
+            seconds = benchmark(file_path, workers)
+            baseline = baseline or seconds
+            print(f"{workers:>3} workers: {seconds:7.2f} s  speed-up {baseline / seconds:5.2f}x")
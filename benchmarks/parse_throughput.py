@@ -0,0 +1,41 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+sys.path.append('../')
+from parsers import available_backends, parse_file
+from synthetic import write_export
+
+
+def benchmark(file_path: str, backend: str, repeat: int = 3) -> float:
+    """
+    Measure the parse throughput of a backend.
+
+    Args:
+    - file_path (str): The export to parse.
+    - backend (str): The backend name.
+    - repeat (int): Number of runs; the fastest one is reported.
+
+    Returns:
+    - throughput (float): Parsed megabytes per second.
+    """
+    size = os.path.getsize(file_path) / 1e6
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse_file(file_path, backend)
+        best = min(best, time.perf_counter() - start)
+    return size / best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare JSON parser backends on a synthetic export.')
+    parser.add_argument('--messages', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = write_export(os.path.join(directory, 'result.json'), args.messages)
+        print(f"Export: {args.messages} messages, {os.path.getsize(file_path) / 1e6:.1f} MB")
+        for backend in available_backends():
+            print(f"{backend:>10}: {benchmark(file_path, backend):8.1f} MB/s")
@@ -0,0 +1,67 @@
+import argparse
+import sys
+import time
+sys.path.append('../')
+import numpy as np
+from synthetic import make_export
+from table import ABSENT, MessageTable
+from threads import IdIndex, ReplyThreads, distributions
+
+
+def timed(function, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def per_message(messages: list) -> tuple[list, list]:
+    # Resolve every reply and walk up to its root, one message at a time.
+    ordinals = {}
+    for ordinal, message in enumerate(messages):
+        ordinals.setdefault(message.get('id'), ordinal)
+    parents = []
+    for ordinal, message in enumerate(messages):
+        parent = ordinals.get(message.get('reply_to_message_id'), ABSENT) if 'reply_to_message_id' in message else ABSENT
+        parents.append(parent if parent < ordinal else ABSENT)
+    roots, depths = [], []
+    for ordinal in range(len(messages)):
+        depth = 0
+        while parents[ordinal] != ABSENT:
+            ordinal = parents[ordinal]
+            depth += 1
+        roots.append(ordinal)
+        depths.append(depth)
+    return roots, depths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare vectorized reply threads with a per-message walk.')
+    parser.add_argument('--messages', type=int, default=1000000)
+    args = parser.parse_args()
+
+    data = make_export(args.messages)
+    table = MessageTable.build(data)
+    replies = int(np.count_nonzero(table.reply_to != ABSENT))
+    print(f"{args.messages} messages, {replies} replies")
+
+    seconds, index = timed(IdIndex, table.id)
+    print(f"{'id index':>24} {seconds * 1e3:8.1f}ms ({'dense' if index.dense is not None else 'sorted'})")
+    lookups = table.reply_to[table.reply_to != ABSENT]
+    seconds, _ = timed(index.ordinals, lookups)
+    print(f"{'resolve all replies':>24} {seconds * 1e3:8.1f}ms")
+
+    seconds, graph = timed(ReplyThreads, table.id, table.reply_to)
+    print(f"{'roots and depths':>24} {seconds * 1e3:8.1f}ms (max depth {int(graph.depth.max())})")
+    seconds, threads = timed(graph.threads)
+    print(f"{'thread metrics':>24} {seconds * 1e3:8.1f}ms ({len(threads['root'])} threads)")
+
+    seconds, (replies, latencies) = timed(graph.latencies, table.timestamp)
+    print(f"{'reply latencies':>24} {seconds * 1e3:8.1f}ms ({len(replies)} replies)")
+    repliers = table.sender[replies].astype(np.int64)
+    sent = repliers != ABSENT
+    seconds, statistics = timed(distributions, repliers[sent], latencies[sent], len(table.senders))
+    print(f"{'per-user distributions':>24} {seconds * 1e3:8.1f}ms")
+
+    baseline, (roots, depths) = timed(per_message, data['messages'])
+    assert graph.root.tolist() == roots and graph.depth.tolist() == depths
+    print(f"{'per-message walk':>24} {baseline * 1e3:8.1f}ms")
@@ -0,0 +1,67 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+sys.path.append('../')
+from store import import_export
+from stream import ChatStream
+from synthetic import write_export
+import tool
+
+QUERIES = [
+    ('get_senders', tool.get_senders),
+    ('get_repliers', tool.get_repliers),
+    ('count_replies', tool.count_replies),
+    ('get_most_active_hours', tool.get_most_active_hours),
+    ('get_most_active_months_by_year', tool.get_most_active_months_by_year),
+    ('get_user_activity', tool.get_user_activity),
+]
+
+
+def timed(function, *args, repeat: int = 1) -> tuple[float, object]:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def replies_in_month(messages: list, sender: str, month: str) -> int:
+    return sum(1 for message in messages
+               if message.get('from') == sender and message.get('date', '').startswith(month)
+               and 'reply_to_message_id' in message)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare SQLite queries with the in-memory analysis functions.')
+    parser.add_argument('--messages', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = write_export(os.path.join(directory, 'result.json'), args.messages)
+        db_path = os.path.join(directory, 'result.db')
+
+        seconds, store = timed(import_export, ChatStream(file_path), db_path)
+        print(f"Import: {args.messages} messages in {seconds:.2f}s "
+              f"({args.messages / seconds:,.0f} messages/s, {os.path.getsize(db_path) / 1e6:.1f} MB database)")
+        seconds, data = timed(tool.load_json, file_path)
+        print(f"load_json: {seconds:.2f}s")
+
+        print(f"{'':>32} {'in memory':>10} {'sqlite':>10}   (best of 3)")
+        for name, function in QUERIES:
+            memory_seconds, expected = timed(function, data, repeat=3)
+            sqlite_seconds, result = timed(function, store, repeat=3)
+            assert json.dumps(result, default=str) == json.dumps(expected, default=str), name
+            print(f"{name:>32} {memory_seconds * 1e3:8.1f}ms {sqlite_seconds * 1e3:8.1f}ms")
+
+        # An ad hoc question: how many replies did one user send in one month?
+        sender, month = data['messages'][0]['from'], data['messages'][len(data['messages']) // 2]['date'][:7]
+        memory_seconds, expected = timed(replies_in_month, data['messages'], sender, month, repeat=3)
+        year, month_number = map(int, month.split('-'))
+        end = f'{year + month_number // 12}-{month_number % 12 + 1:02d}-01'
+        sqlite_seconds, result = timed(lambda: tool.count_replies(store.filter(sender, f'{month}-01', end)), repeat=3)
+        assert result == expected
+        print(f"{'replies of one user in a month':>32} {memory_seconds * 1e3:8.1f}ms {sqlite_seconds * 1e3:8.1f}ms")
@@ -0,0 +1,102 @@
+import json
+import random
+from datetime import datetime, timedelta
+
+
+WORDS = ['selam', 'hello', 'the', 'meeting', 'tomorrow', 'ok', 'thanks', 'ሰላም', 'እንዴት', 'ነህ', 'link', 'python',
+         'group', 'please', 'check', 'this', 'yes', 'no', 'maybe', 'later']
+
+
+def make_message(rng: random.Random, message_id: int, date: datetime, users: list, channels: list) -> dict:
+    sender = rng.randrange(len(users))
+    text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 25)))
+    message = {
+        'id': message_id,
+        'type': 'message',
+        'date': date.strftime('%Y-%m-%dT%H:%M:%S'),
+        'date_unixtime': str(int(date.timestamp())),
+        'from': users[sender],
+        'from_id': f'user{sender}',
+    }
+    if message_id > 1 and rng.random() < 0.2:
+        message['reply_to_message_id'] = rng.randint(max(1, message_id - 200), message_id - 1)
+    if rng.random() < 0.08:
+        message['forwarded_from'] = rng.choice(channels)
+    if rng.random() < 0.05:
+        edited = date + timedelta(minutes=rng.randint(1, 60))
+        message['edited'] = edited.strftime('%Y-%m-%dT%H:%M:%S')
+        message['edited_unixtime'] = str(int(edited.timestamp()))
+    if rng.random() < 0.05:
+        message['photo'] = f'photos/photo_{message_id}@{date:%d-%m-%Y_%H-%M-%S}.jpg'
+        message['width'], message['height'] = 1280, 720
+    if rng.random() < 0.1:
+        message['text'] = [text + ' ', {'type': 'link', 'text': 'https://t.me/example'}]
+        message['text_entities'] = [{'type': 'plain', 'text': text + ' '}, {'type': 'link', 'text': 'https://t.me/example'}]
+    else:
+        message['text'] = text
+        message['text_entities'] = [{'type': 'plain', 'text': text}] if text else []
+    return message
+
+
+def make_export(messages_count: int, users_count: int = 500, seed: int = 0) -> dict:
+    """
+    Generate a synthetic Telegram group export.
+
+    Args:
+    - messages_count (int): Number of messages to generate.
+    - users_count (int): Number of distinct senders.
+    - seed (int): Seed of the random generator, for reproducible exports.
+
+    Returns:
+    - data (dict): The export, shaped like a `result.json` file.
+    """
+    rng = random.Random(seed)
+    users = [f'User {i}' for i in range(users_count)]
+    channels = [f'Channel {i}' for i in range(50)] + [None]
+    date = datetime(2020, 1, 1)
+    messages = []
+    for message_id in range(1, messages_count + 1):
+        date += timedelta(seconds=rng.randint(1, 600))
+        messages.append(make_message(rng, message_id, date, users, channels))
+    return {'name': 'Synthetic Group', 'type': 'private_supergroup', 'id': 1000000001, 'messages': messages}
+
+
+def write_export(file_path: str, messages_count: int, **options) -> str:
+    """
+    Write a synthetic export to disk, formatted like Telegram Desktop does.
+
+    Args:
+    - file_path (str): The path to write the JSON file to.
+    - messages_count (int): Number of messages to generate.
+
+    Returns:
+    - file_path (str): The path of the written file.
+    """
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(make_export(messages_count, **options), f, ensure_ascii=False, indent=1)
+    return file_path
+
+
+def make_account_export(chats_count: int, messages_count: int, seed: int = 0) -> dict:
+    """
+    Generate a synthetic full-account export.
+
+    Args:
+    - chats_count (int): Number of chats under `chats.list`.
+    - messages_count (int): Number of messages in each chat.
+    - seed (int): Seed of the random generator, for reproducible exports.
+
+    Returns:
+    - data (dict): The export, shaped like a full-account `result.json` file.
+    """
+    chats = []
+    for index in range(chats_count):
+        chat = make_export(messages_count, users_count=50, seed=seed + index)
+        chat.update({'name': f'Chat {index}', 'id': 1000000001 + index})
+        chats.append(chat)
+    return {
+        'about': 'Here is the data you requested.',
+        'personal_information': {'user_id': 42, 'first_name': 'Synthetic', 'last_name': 'User'},
+        'chats': {'about': 'This page lists all chats from this export.', 'list': chats},
+        'left_chats': {'about': 'This page lists all supergroups and channels you left.', 'list': []},
+    }
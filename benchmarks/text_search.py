@@ -0,0 +1,65 @@
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+sys.path.append('../')
+from search import build_index
+from stream import ChatStream
+from synthetic import write_export
+from tokenizer import flatten_text
+import tool
+
+WORD_PATTERN = re.compile(r'\w+')
+
+QUERIES = [
+    ('python', {}),
+    ('hello tomorrow', {}),
+    ('"check this"', {}),
+    ('"https t me example"', {}),
+    ('meeting OR python', {}),
+    ('thanks', {'start': '2021-01-01', 'end': '2021-07-01'}),
+]
+
+
+def timed(function, *args, repeat: int = 1, **kwargs) -> tuple[float, object]:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def scan(messages: list, words: list[str]) -> int:
+    # The Python loop the index replaces, for a query of words that must all occur.
+    found = 0
+    for message in messages:
+        if set(words) <= set(WORD_PATTERN.findall(flatten_text(message).lower())):
+            found += 1
+    return found
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure full-text index size, build time and query latency.')
+    parser.add_argument('--messages', type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = write_export(os.path.join(directory, 'result.json'), args.messages)
+        index_path = os.path.join(directory, 'result.index')
+        seconds, index = timed(build_index, ChatStream(file_path), index_path)
+        print(f"Build: {args.messages} messages in {seconds:.2f}s ({args.messages / seconds:,.0f} messages/s, "
+              f"{os.path.getsize(index_path) / 1e6:.1f} MB index, {os.path.getsize(file_path) / 1e6:.1f} MB export)")
+
+        print(f"{'query':>44} {'hits':>8} {'latency':>9}   (best of 5)")
+        for query, filters in QUERIES:
+            seconds, hits = timed(index.search, query, repeat=5, **filters)
+            label = query + ''.join(f' {name}={value}' for name, value in filters.items())
+            print(f"{label:>44} {len(hits):8d} {seconds * 1e3:7.2f}ms")
+
+        messages = tool.load_json(file_path)['messages']
+        seconds, expected = timed(scan, messages, ['hello', 'tomorrow'])
+        assert expected == len(index.search('hello tomorrow'))
+        print(f"{'hello tomorrow, Python loop':>44} {expected:8d} {seconds * 1e3:7.2f}ms")
@@ -0,0 +1,37 @@
+import argparse
+import random
+import sys
+import time
+sys.path.append('../')
+from ranking import top_items
+
+
+def full_sort(counts: dict, top_n: int | None) -> list:
+    ranked = sorted(counts.items(), key=lambda x: x[1], reverse=True)
+    return ranked if top_n is None else ranked[:top_n]
+
+
+def timed(function, *args) -> tuple[float, object]:
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare partial top-N selection with sorting every name.')
+    parser.add_argument('--names', type=int, default=200000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    # Long-tailed counts, so most names tie with many others.
+    counts = {f'User{index}': int(random.paretovariate(1.2)) for index in range(args.names)}
+    print(f"{args.names} names, {len(set(counts.values()))} distinct counts")
+    print(f"{'top_n':>6} {'full sort':>10} {'top_items':>10}   (best of 5)")
+    for top_n in (10, 100, 1000, None):
+        sort_seconds, expected = timed(full_sort, counts, top_n)
+        top_seconds, result = timed(top_items, counts, top_n)
+        assert result == expected
+        print(f"{str(top_n):>6} {sort_seconds * 1e3:8.1f}ms {top_seconds * 1e3:8.1f}ms")
@@ -0,0 +1,54 @@
+import argparse
+import sys
+import time
+import tracemalloc
+sys.path.append('../')
+from synthetic import make_export
+from table import MessageTable
+import tool
+
+
+def timed(function, *args, **kwargs) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def per_day_sets(messages: list) -> dict:
+    # The exact count: one set of senders per day.
+    senders = {}
+    for message in messages:
+        if message.get('date') and message.get('from_id') is not None:
+            senders.setdefault(message['date'][:10], set()).add(message['from_id'])
+    return senders
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare HyperLogLog sender counts with exact sets.')
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--senders', type=int, default=200000)
+    args = parser.parse_args()
+
+    data = make_export(args.messages)
+    for ordinal, message in enumerate(data['messages']):
+        if 'from_id' in message:
+            message['from_id'] = f'user{ordinal * 7919 % args.senders}'
+    table = MessageTable.build(data)
+
+    baseline, daily = timed(per_day_sets, data['messages'])
+    tracemalloc.start()
+    per_day_sets(data['messages'])
+    exact_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{'exact sets per day':>26} {baseline * 1e3:8.1f}ms {exact_memory / 1e6:8.1f} MB")
+    expected = {}
+    for day, senders in daily.items():
+        expected.setdefault(day[:7], set()).update(senders)
+
+    for error in (0.02, 0.01):
+        seconds, sketch = timed(tool.get_sender_sketch, table, error=error)
+        starts, counts = sketch.periods('month')
+        months = starts.astype('datetime64[D]').astype('datetime64[M]').astype(str).tolist()
+        errors = [abs(count / len(expected[month]) - 1) for month, count in zip(months, counts.tolist())]
+        print(f"{f'HyperLogLog, error {error}':>26} {seconds * 1e3:8.1f}ms {sketch.registers.nbytes / 1e6:8.1f} MB"
+              f"   mean error {sum(errors) / len(errors):.4f}, worst {max(errors):.4f} over {len(months)} months")
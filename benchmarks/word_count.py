@@ -0,0 +1,54 @@
+import argparse
+from collections import Counter
+import os
+import re
+import sys
+import time
+sys.path.append('../')
+from engine import Analysis
+from synthetic import make_export
+from tokenizer import count_words
+
+WORD_PATTERN = re.compile(r'\b\w+\b')
+
+
+def per_message(messages: list) -> Counter:
+    # The loop `get_most_common_words` used to run, restricted to plain texts.
+    counts = Counter()
+    for message in messages:
+        text = message.get('text', '')
+        if isinstance(text, str):
+            counts.update(WORD_PATTERN.findall(text.lower()))
+    return counts
+
+
+def timed(function, *args, **kwargs) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare block tokenization with per-message word counting.')
+    parser.add_argument('--messages', type=int, default=500000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    messages = [message for message in make_export(args.messages)['messages'] if isinstance(message.get('text'), str)]
+    words = sum(per_message(messages).values())
+    print(f"{len(messages)} plain-text messages, {words} words")
+
+    baseline, expected = timed(per_message, messages)
+    runs = [
+        ('count_words', *timed(count_words, messages)),
+        ('most_common_words metric', *timed(Analysis().add('most_common_words', top_n=None).scan, messages)),
+    ]
+    if args.workers > 1:
+        runs.append((f'count_words, {args.workers} workers', *timed(count_words, messages, workers=args.workers)))
+
+    print(f"{'per message':>28} {words / baseline / 1e6:6.2f}M words/s")
+    for name, seconds, result in runs:
+        if not isinstance(result, Counter):
+            result = Counter(dict(result['most_common_words'].get_state()['counts']))
+        assert result == expected and list(result) == list(expected), name
+        print(f"{name:>28} {words / seconds / 1e6:6.2f}M words/s {baseline / seconds:5.1f}x")
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+from table import COLUMNS, MessageTable
+
+
+# Bump whenever the layout of the cache file or of `MessageTable` changes.
+CACHE_VERSION = 2
+
+MAGIC = b'TGACACHE'
+PREAMBLE = struct.Struct('<8sIQ')
+ALIGNMENT = 64
+SAMPLE_SIZE = 1 << 20
+
+
+def cache_path(file_path: str) -> str:
+    """
+    Return the path of the cache sidecar for an export.
+
+    Args:
+    - file_path (str): The path to the JSON file.
+
+    Returns:
+    - cache_path (str): The path of the sidecar next to the export.
+    """
+    return file_path + '.cache'
+
+
+def fingerprint(file_path: str) -> dict:
+    """
+    Identify the current contents of an export cheaply.
+
+    The fingerprint combines the file size, its modification time and a BLAKE2 hash of
+    its first and last megabyte, so a rewritten export is detected without hashing
+    gigabytes of JSON on every run.
+
+    Args:
+    - file_path (str): The path to the JSON file.
+
+    Returns:
+    - fingerprint (dict): The size, mtime and sample hash of the file.
+    """
+    stat = os.stat(file_path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(SAMPLE_SIZE))
+        if stat.st_size > SAMPLE_SIZE:
+            f.seek(max(SAMPLE_SIZE, stat.st_size - SAMPLE_SIZE))
+            digest.update(f.read(SAMPLE_SIZE))
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': digest.hexdigest()}
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_arrays(path: str, magic: bytes, version: int, header: dict, arrays: dict):
+    """
+    Write a JSON header and numpy arrays to a binary file that can be memory-mapped back.
+
+    The file holds a preamble (magic, format version and header length), the JSON header,
+    to which the layout of each array is added, and the raw arrays, each aligned to
+    `ALIGNMENT` bytes. It is written to a temporary file and renamed into place.
+
+    Args:
+    - path (str): The path of the file.
+    - magic (bytes): Eight bytes identifying the kind of file.
+    - version (int): The format version.
+    - header (dict): JSON-serialisable metadata.
+    - arrays (dict): Dictionary mapping names to one-dimensional arrays.
+    """
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        offset = _aligned(offset)
+        layout[name] = [array.dtype.str, offset, len(array)]
+        offset += array.nbytes
+
+    header = json.dumps({**header, 'layout': layout}, ensure_ascii=False).encode('utf-8')
+    data_start = _aligned(PREAMBLE.size + len(header))
+
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temporary_path, 'wb') as f:
+            f.write(PREAMBLE.pack(magic, version, len(header)))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(data_start + layout[name][1])
+                f.write(np.ascontiguousarray(array).tobytes())
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def read_arrays(path: str, magic: bytes, version: int) -> tuple[dict, dict] | None:
+    """
+    Memory-map the arrays of a file written by `write_arrays`.
+
+    Args:
+    - path (str): The path of the file.
+    - magic (bytes): The expected magic.
+    - version (int): The expected format version.
+
+    Returns:
+    - header (dict): The JSON header, including the layout.
+    - arrays (dict): The arrays, mapped read-only from the file.
+    - None: If the file is missing, is of another kind, was written by another format version
+      or is shorter than its layout, as after an interrupted copy.
+    """
+    try:
+        with open(path, 'rb') as f:
+            file_magic, file_version, header_length = PREAMBLE.unpack(f.read(PREAMBLE.size))
+            if file_magic != magic or file_version != version:
+                return None
+            header = json.loads(f.read(header_length).decode('utf-8'))
+            size = os.fstat(f.fileno()).st_size
+    except (OSError, struct.error, ValueError):
+        return None
+    if header.get('version') != version:
+        return None
+
+    data_start = _aligned(PREAMBLE.size + header_length)
+    # Empty arrays are not mapped, and those written last lie past the end of the file.
+    if any(length and data_start + offset + length * np.dtype(dtype).itemsize > size
+           for dtype, offset, length in header['layout'].values()):
+        return None
+    arrays = {}
+    for name, (dtype, offset, length) in header['layout'].items():
+        if length == 0:
+            arrays[name] = np.empty(0, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=data_start + offset, shape=(length,))
+    return header, arrays
+
+
+def write_cache(table: MessageTable, path: str, source: dict):
+    """
+    Write a table to a binary cache file.
+
+    The file holds a JSON header (format version, source fingerprint, chat header,
+    interned string pools and the layout of each column) followed by the raw column
+    arrays and the text buffer. It is written to a temporary file and renamed into place.
+
+    Args:
+    - table (MessageTable): The table to write.
+    - path (str): The path of the cache file.
+    - source (dict): The fingerprint of the export the table was built from.
+    """
+    arrays = dict(table.columns())
+    arrays['text_data'] = np.frombuffer(table.text_data, dtype=np.uint8)
+    write_arrays(path, MAGIC, CACHE_VERSION, {
+        'version': CACHE_VERSION,
+        'source': source,
+        'header': table.header,
+        'pools': {'senders': table.senders, 'from_ids': table.from_ids, 'forward_sources': table.forward_sources},
+    }, arrays)
+
+
+def read_cache(path: str, source: dict | None = None) -> MessageTable | None:
+    """
+    Memory-map a table from a binary cache file.
+
+    Args:
+    - path (str): The path of the cache file.
+    - source (dict): The expected fingerprint of the export; the cache is rejected if it differs.
+
+    Returns:
+    - table (MessageTable): The table, with its columns mapped read-only from the file.
+    - None: If the file is missing, was written by another cache version or is stale.
+    """
+    loaded = read_arrays(path, MAGIC, CACHE_VERSION)
+    if loaded is None:
+        return None
+    header, arrays = loaded
+    if source is not None and header.get('source') != source:
+        return None
+    if any(name not in arrays for name in COLUMNS):
+        return None
+
+    pools = header['pools']
+    return MessageTable(header['header'], {name: arrays[name] for name in COLUMNS}, pools['senders'],
+                        pools['from_ids'], pools['forward_sources'], arrays['text_data'])
+
+
+def load_cached_table(file_path: str, build) -> MessageTable:
+    """
+    Return the table for an export, reusing its cache sidecar when it is still valid.
+
+    Args:
+    - file_path (str): The path to the JSON file.
+    - build (Callable): Called with `file_path` to build the table when the cache is stale or missing.
+
+    Returns:
+    - table (MessageTable): The table for the export.
+    """
+    source = fingerprint(file_path)
+    path = cache_path(file_path)
+    table = read_cache(path, source)
+    if table is not None:
+        return table
+
+    table = build(file_path)
+    try:
+        write_cache(table, path, source)
+    except OSError as e:
+        print(f"An error occurred while writing the cache file: {e}")
+    return table
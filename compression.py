@@ -0,0 +1,86 @@
+import bz2
+import gzip
+import io
+import lzma
+from typing import BinaryIO, TextIO
+import zlib
+
+
+MAGIC_BYTES = {
+    'gzip': b'\x1f\x8b',
+    'xz': b'\xfd7zXZ\x00',
+    'zstd': b'\x28\xb5\x2f\xfd',
+    'bz2': b'BZh',
+}
+
+# Each opener takes a path and returns a binary stream of the decompressed contents.
+OPENERS = {
+    'gzip': lambda path: gzip.open(path, 'rb'),
+    'xz': lambda path: lzma.open(path, 'rb'),
+    'bz2': lambda path: bz2.open(path, 'rb'),
+}
+
+# Errors raised while reading a missing, truncated or corrupt export, compressed or not, or
+# one compressed in a format whose module is not installed.
+READ_ERRORS = (OSError, EOFError, ValueError, lzma.LZMAError, zlib.error)
+
+try:
+    import zstandard
+    # Exports compressed with pzstd are made of several frames.
+    OPENERS['zstd'] = lambda path: io.BufferedReader(
+        zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True))
+    READ_ERRORS += (zstandard.ZstdError,)
+except ImportError:
+    pass
+
+
+def detect_compression(file_path: str) -> str | None:
+    """
+    Detect the compression format of a file from its first bytes.
+
+    Args:
+    - file_path (str): The path to the file.
+
+    Returns:
+    - compression (str): 'gzip', 'xz', 'zstd' or 'bz2'.
+    - None: If the file is not compressed.
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(max(len(magic) for magic in MAGIC_BYTES.values()))
+    for compression, magic in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def open_binary(file_path: str) -> BinaryIO:
+    """
+    Open an export for reading, decompressing it on the fly if it is compressed.
+
+    Args:
+    - file_path (str): The path to the file, compressed or not.
+
+    Returns:
+    - f (BinaryIO): A binary stream of the decompressed contents.
+    """
+    compression = detect_compression(file_path)
+    if compression is None:
+        return open(file_path, 'rb')
+    if compression not in OPENERS:
+        raise ValueError(f"{file_path} is {compression}-compressed, but the module to read it is not installed")
+    return OPENERS[compression](file_path)
+
+
+def open_text(file_path: str) -> TextIO:
+    """
+    Open an export as UTF-8 text, decompressing it on the fly if it is compressed.
+
+    Args:
+    - file_path (str): The path to the file, compressed or not.
+
+    Returns:
+    - f (TextIO): A text stream of the decompressed contents.
+    """
+    if detect_compression(file_path) is None:
+        return open(file_path, encoding='utf-8')
+    return io.TextIOWrapper(open_binary(file_path), encoding='utf-8')
@@ -0,0 +1,1456 @@
+from array import array
+from collections import Counter, defaultdict
+import json
+from typing import Any, Iterable
+
+import numpy as np
+
+from activity import ActivityCube
+from ngrams import NgramCounts
+from ranking import top_items, top_order
+from series import DailySeries, rolling_mean, rolling_sum
+from sketch import DailyDistinct, HeavyHitters, key_hash
+from store import MessageStore, TEXT_PLAIN, bucket_expression, bucket_starts
+from stream import iter_messages
+from table import ABSENT, Interner, MessageTable, TEXT_ABSENT
+from threads import LATENCY_LABELS, ReplyThreads, distributions
+from timeindex import window
+from tokenizer import BLOCK_SIZE, Tokenizer, flatten_text, message_words
+import timestamps as ts
+
+METRICS = {}
+
+
+def register(cls):
+    """
+    Register a metric class under its `name` so it can be requested from an `Analysis`.
+
+    Args:
+    - cls (type): The `Metric` subclass to register.
+
+    Returns:
+    - cls (type): The registered class, unchanged.
+    """
+    METRICS[cls.name] = cls
+    return cls
+
+
+class Metric:
+    """
+    An aggregation fed one message at a time during the single pass of `Analysis.run`.
+
+    Subclasses set `uses_timestamps` when they need message dates: the engine then builds
+    one shared timestamp column, and one of UTC times, during the pass and hands them to
+    `collect` once the pass is over. Metrics that only need those columns do not override `add`.
+
+    Metrics that can be computed from the columns of a `MessageTable` define
+    `load_table(table)`; when the engine runs on a table it calls that instead of `add`.
+    Likewise, metrics that can be answered with SQL queries on a `MessageStore` define
+    `load_store(store)`, which computes the whole state, dates included.
+
+    `merge` folds in the state of the same metric taken over the messages that follow,
+    so an export can be analysed in consecutive pieces and the pieces combined in order.
+    Merging is associative. `get_state` and `set_state` convert the accumulated state to
+    and from JSON-serialisable data, so pieces can be analysed on different machines.
+
+    Metrics without `load_table` also define `remove(message)`, the inverse of `add`, so
+    an edited message can be swapped for its new version without a rescan.
+    """
+
+    name = ''
+    uses_timestamps = False
+
+    def add(self, message: dict):
+        pass
+
+    def collect(self, timestamps: np.ndarray, utc: np.ndarray):
+        pass
+
+    def merge(self, other: 'Metric'):
+        raise NotImplementedError
+
+    def get_state(self) -> dict:
+        raise NotImplementedError
+
+    def set_state(self, state: dict):
+        raise NotImplementedError
+
+    def result(self) -> Any:
+        raise NotImplementedError
+
+
+def display_name(sender: Any) -> Any:
+    return sender if sender is not None else 'Deleted Account'
+
+
+class Count(Metric):
+    """
+    A number of matching messages.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def merge(self, other):
+        self.count += other.count
+
+    def get_state(self):
+        return {'count': self.count}
+
+    def set_state(self, state):
+        self.count = state['count']
+
+    def result(self):
+        return self.count
+
+
+class Tally(Metric):
+    """
+    Messages counted per name, in order of first occurrence.
+
+    Args:
+    - top_n (int): Number of names kept in the ranking. None keeps them all.
+    """
+
+    def __init__(self, top_n: int | None = None):
+        self.top_n = top_n
+        self.counts = defaultdict(int)
+
+    def merge(self, other):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def get_state(self):
+        # Pairs rather than an object: names may be None and their order breaks ties.
+        return {'counts': list(self.counts.items())}
+
+    def set_state(self, state):
+        self.counts = defaultdict(int, state['counts'])
+
+
+@register
+class MessagesCount(Count):
+    name = 'messages_count'
+
+    def add(self, message):
+        self.count += 1
+
+    def load_table(self, table):
+        self.count = len(table)
+
+    def load_store(self, store):
+        self.count = len(store)
+
+
+@register
+class Senders(Tally):
+    name = 'senders'
+
+    def add(self, message):
+        if 'from' in message:
+            self.counts[display_name(message['from'])] += 1
+
+    def load_table(self, table):
+        self.counts = table.sender_counts(table.sender != ABSENT)
+
+    def load_store(self, store):
+        self.counts = store.counts_by_name('sender', 'has_from = 1')
+
+    def result(self):
+        return [{'sender': sender, 'messages': count} for sender, count in top_items(self.counts, self.top_n)]
+
+
+@register
+class MostActiveUsers(Senders):
+    name = 'most_active_users'
+
+    def __init__(self, top_n: int | None = 10):
+        super().__init__(top_n)
+
+    def result(self):
+        return [{'user': user, 'message_count': count} for user, count in top_items(self.counts, self.top_n)]
+
+
+@register
+class ForwardedCount(Count):
+    name = 'forwarded_count'
+
+    def add(self, message):
+        if 'forwarded_from' in message:
+            self.count += 1
+
+    def load_table(self, table):
+        self.count = int(np.count_nonzero(table.forwarded_from != ABSENT))
+
+    def load_store(self, store):
+        self.count = store.count('has_forward = 1')
+
+
+@register
+class Forwarders(Tally):
+    name = 'forwarders'
+
+    def __init__(self, top_n: int | None = 100):
+        super().__init__(top_n)
+
+    def add(self, message):
+        if 'forwarded_from' in message:
+            self.counts[display_name(message['from'])] += 1
+
+    def load_table(self, table):
+        self.counts = table.sender_counts((table.forwarded_from != ABSENT) & (table.sender != ABSENT))
+
+    def load_store(self, store):
+        self.counts = store.counts_by_name('sender', 'has_forward = 1 AND has_from = 1')
+
+    def result(self):
+        return dict(top_items(self.counts, self.top_n))
+
+
+@register
+class ForwardSources(Tally):
+    name = 'forward_sources'
+
+    def __init__(self, top_n: int | None = 100):
+        super().__init__(top_n)
+
+    def add(self, message):
+        if 'forwarded_from' in message:
+            self.counts[display_name(message['forwarded_from'])] += 1
+
+    def load_table(self, table):
+        self.counts = table.forward_source_counts()
+
+    def load_store(self, store):
+        self.counts = store.counts_by_name('forwarded_from', 'has_forward = 1')
+
+    def result(self):
+        return dict(top_items(self.counts, self.top_n))
+
+
+@register
+class ReplyCount(Count):
+    name = 'reply_count'
+
+    def add(self, message):
+        if 'reply_to_message_id' in message:
+            self.count += 1
+
+    def load_table(self, table):
+        self.count = int(np.count_nonzero(table.reply_to != ABSENT))
+
+    def load_store(self, store):
+        self.count = store.count('reply_to_message_id IS NOT NULL')
+
+
+@register
+class Repliers(Tally):
+    name = 'repliers'
+
+    def __init__(self, top_n: int | None = 100):
+        super().__init__(top_n)
+
+    def add(self, message):
+        if 'reply_to_message_id' in message:
+            self.counts[display_name(message.get('from'))] += 1
+
+    def load_table(self, table):
+        self.counts = table.sender_counts(table.reply_to != ABSENT)
+
+    def load_store(self, store):
+        self.counts = store.counts_by_name('sender', 'reply_to_message_id IS NOT NULL')
+
+    def result(self):
+        return dict(top_items(self.counts, self.top_n))
+
+
+@register
+class EditedCount(Count):
+    name = 'edited_count'
+
+    def add(self, message):
+        if 'edited' in message:
+            self.count += 1
+
+    def load_table(self, table):
+        self.count = int(np.count_nonzero(table.edited != ts.MISSING))
+
+    def load_store(self, store):
+        self.count = store.count('edited IS NOT NULL')
+
+
+@register
+class Editors(Tally):
+    name = 'editors'
+
+    def __init__(self, top_n: int | None = 100):
+        super().__init__(top_n)
+
+    def add(self, message):
+        if 'edited' in message:
+            self.counts[display_name(message.get('from'))] += 1
+
+    def load_table(self, table):
+        self.counts = table.sender_counts(table.edited != ts.MISSING)
+
+    def load_store(self, store):
+        self.counts = store.counts_by_name('sender', 'edited IS NOT NULL')
+
+    def result(self):
+        return dict(top_items(self.counts, self.top_n))
+
+
+class SenderMetric(Metric):
+    """
+    Messages whose senders are told apart by integer codes, numbered in order of first appearance.
+
+    The senders are interned in `users`. Messages whose sender is None or empty are coded
+    `ABSENT` and left out.
+    """
+
+    def __init__(self):
+        self.interner = Interner()
+
+    @property
+    def users(self) -> list:
+        return self.interner.values
+
+    def code(self, user: Any) -> int:
+        return self.interner.code(user) if user else ABSENT
+
+    def lookup(self, users: list, absent: Any = None) -> np.ndarray:
+        """
+        Translate the codes of another pool of senders, such as `MessageTable.from_ids` or the
+        `users` of a metric being merged into this one.
+
+        Args:
+        - users (list): The senders of the pool, indexed by their code there.
+        - absent: The sender of the messages coded `ABSENT` in the pool. None leaves them `ABSENT`.
+
+        Returns:
+        - lookup (np.ndarray): The code of each sender of the pool, then that of `absent`, so
+          that the pool's codes index it, `ABSENT` picking the last entry.
+        """
+        return np.array([self.code(user) for user in users] + [self.code(absent)], dtype=np.int64)
+
+
+class ReplyGraph(SenderMetric):
+    """
+    The id, replied-to id and sender of every message, from which the reply threads are
+    built once all the messages are in, see `threads.ReplyThreads`.
+
+    Args:
+    - top_n (int): Number of entries kept in the rankings. None keeps them all.
+    """
+
+    def __init__(self, top_n: int | None = 10):
+        super().__init__()
+        self.top_n = top_n
+        self.ids = array('q')
+        self.reply_to = array('q')
+        self.senders = array('i')
+
+    def add(self, message):
+        self.ids.append(message.get('id', ABSENT))
+        self.reply_to.append(message.get('reply_to_message_id', ABSENT))
+        self.senders.append(self.code(display_name(message.get('from'))))
+
+    def load_table(self, table):
+        # Senders are coded in order of their first message, shifted by one so that
+        # messages missing the 'from' key map through index 0.
+        codes, first = np.unique(table.sender, return_index=True)
+        lookup = np.zeros(len(table.senders) + 1, dtype=np.int32)
+        for code in codes[np.argsort(first)].tolist():
+            lookup[code + 1] = self.code(display_name(table.senders[code] if code != ABSENT else None))
+        self.ids = table.id
+        self.reply_to = table.reply_to
+        self.senders = lookup[table.sender.astype(np.int64) + 1]
+
+    def load_store(self, store):
+        rows = store.select(f'COALESCE(id, {ABSENT}), COALESCE(reply_to_message_id, {ABSENT}), sender',
+                            tail='ORDER BY ordinal')
+        for message_id, reply_to, sender in rows:
+            self.ids.append(message_id)
+            self.reply_to.append(reply_to)
+            self.senders.append(self.code(display_name(sender)))
+
+    def merge(self, other):
+        lookup = self.lookup(other.users)
+        self.ids = np.concatenate([np.asarray(self.ids, dtype=np.int64), np.asarray(other.ids, dtype=np.int64)])
+        self.reply_to = np.concatenate([np.asarray(self.reply_to, dtype=np.int64),
+                                        np.asarray(other.reply_to, dtype=np.int64)])
+        self.senders = np.concatenate([np.asarray(self.senders, dtype=np.int32),
+                                       lookup[np.asarray(other.senders, dtype=np.int64)].astype(np.int32)])
+
+    def get_state(self):
+        return {
+            'users': self.users,
+            'ids': np.asarray(self.ids).tolist(),
+            'reply_to': np.asarray(self.reply_to).tolist(),
+            'senders': np.asarray(self.senders).tolist(),
+        }
+
+    def set_state(self, state):
+        self.interner = Interner(state['users'])
+        self.ids = np.array(state['ids'], dtype=np.int64)
+        self.reply_to = np.array(state['reply_to'], dtype=np.int64)
+        self.senders = np.array(state['senders'], dtype=np.int32)
+
+    def graph(self) -> ReplyThreads:
+        return ReplyThreads(np.asarray(self.ids, dtype=np.int64), np.asarray(self.reply_to, dtype=np.int64))
+
+    def sender(self, ordinal: int) -> Any:
+        return self.users[self.senders[ordinal]]
+
+
+@register
+class Threads(ReplyGraph):
+    name = 'reply_threads'
+
+    def result(self):
+        graph = self.graph()
+        threads = graph.threads()
+
+        def describe(index: int) -> dict:
+            root = int(threads['root'][index])
+            return {
+                'id': int(graph.ids[root]),
+                'sender': self.sender(root),
+                'size': int(threads['size'][index]),
+                'depth': int(threads['depth'][index]),
+                'fan_out': int(threads['fan_out'][index]),
+            }
+
+        return {
+            'threads': len(threads['root']),
+            'max_depth': int(threads['depth'].max()) if len(threads['root']) else 0,
+            'largest': [describe(index) for index in top_order(threads['size'], threads['root'], self.top_n).tolist()],
+            'deepest': [describe(index) for index in top_order(threads['depth'], threads['root'], self.top_n).tolist()],
+        }
+
+
+@register
+class MostRepliedMessages(ReplyGraph):
+    name = 'most_replied_messages'
+
+    def result(self):
+        graph = self.graph()
+        return [{'id': int(graph.ids[ordinal]), 'sender': self.sender(ordinal), 'replies': int(graph.replies[ordinal])}
+                for ordinal in graph.most_replied(self.top_n).tolist()]
+
+
+@register
+class MostRepliedUsers(ReplyGraph):
+    name = 'most_replied_users'
+
+    def result(self):
+        received = self.graph().replies_received(np.asarray(self.senders), len(self.users))
+        counts = {self.users[code]: int(received[code]) for code in np.flatnonzero(received).tolist()}
+        return dict(top_items(counts, self.top_n))
+
+
+@register
+class ReplyLatency(ReplyGraph):
+    """
+    How long users take to answer each other: the time between each reply and the message
+    it replies to, summarized overall, per replying user and per (replier, replied-to user)
+    pair. Replies to one's own messages are left out. Times are measured in UTC where the
+    export has it, so replies across a daylight saving time change are not off by an hour.
+    """
+
+    name = 'reply_latency'
+    uses_timestamps = True
+
+    def __init__(self, top_n: int | None = 10):
+        super().__init__(top_n)
+        self.timestamps = array('q')
+        self.utc = array('q')
+
+    def load_table(self, table):
+        super().load_table(table)
+        self.timestamps, self.utc = table.timestamp, table.utc
+
+    def load_store(self, store):
+        super().load_store(store)
+        rows = store.select(f'COALESCE(timestamp, {ts.MISSING}), COALESCE(utc, {ts.MISSING})', tail='ORDER BY ordinal')
+        self.timestamps, self.utc = (np.array(column, dtype=np.int64) for column in (list(zip(*rows)) or [(), ()]))
+
+    def collect(self, timestamps, utc):
+        self.timestamps, self.utc = timestamps, utc
+
+    def merge(self, other):
+        super().merge(other)
+        self.timestamps = np.concatenate([np.asarray(self.timestamps, dtype=np.int64),
+                                          np.asarray(other.timestamps, dtype=np.int64)])
+        self.utc = np.concatenate([np.asarray(self.utc, dtype=np.int64), np.asarray(other.utc, dtype=np.int64)])
+
+    def get_state(self):
+        return {**super().get_state(), 'timestamps': np.asarray(self.timestamps).tolist(),
+                'utc': np.asarray(self.utc).tolist()}
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.timestamps = np.array(state['timestamps'], dtype=np.int64)
+        self.utc = np.array(state['utc'], dtype=np.int64)
+
+    @staticmethod
+    def describe(statistics: dict, index: int) -> dict:
+        def seconds(value: float) -> float | None:
+            return None if np.isnan(value) else float(value)
+
+        return {
+            'replies': int(statistics['size'][index]),
+            'median': seconds(statistics['median'][index]),
+            'p90': seconds(statistics['p90'][index]),
+            'histogram': dict(zip(LATENCY_LABELS, statistics['histogram'][index].tolist())),
+        }
+
+    def result(self):
+        graph = self.graph()
+        replies, seconds = graph.latencies(self.timestamps, self.utc)
+        senders = np.asarray(self.senders, dtype=np.int64)
+        repliers, authors = senders[replies], senders[graph.parent[replies]]
+        others = repliers != authors
+        repliers, authors, seconds = repliers[others], authors[others], seconds[others]
+
+        overall = distributions(np.zeros(len(seconds), dtype=np.int64), seconds, 1)
+        users = distributions(repliers, seconds, len(self.users))
+        active = np.flatnonzero(users['size'])
+        pairs, first, inverse = np.unique(repliers * len(self.users) + authors, return_index=True, return_inverse=True)
+        pair_statistics = distributions(inverse, seconds, len(pairs))
+        pair_repliers, pair_authors = np.divmod(pairs, max(len(self.users), 1))
+        return {
+            'overall': self.describe(overall, 0),
+            'users': {self.users[code]: self.describe(users, code)
+                      for code in active[top_order(users['size'][active], active, self.top_n)].tolist()},
+            'pairs': [{'from': self.users[pair_repliers[index]], 'to': self.users[pair_authors[index]],
+                       **self.describe(pair_statistics, index)}
+                      for index in top_order(pair_statistics['size'], first, self.top_n).tolist()],
+        }
+
+
+@register
+class LongestMessages(Metric):
+    name = 'longest_messages'
+
+    def __init__(self):
+        self.messages = []
+        self.max_length = 0
+
+    def add(self, message):
+        text = message.get('text', '')
+        length = len(text)
+        if length > self.max_length:
+            self.messages = [{'text': text, 'sender': message.get('from', 'Unknown')}]
+            self.max_length = length
+        elif length == self.max_length:
+            self.messages.append({'text': text, 'sender': message.get('from', 'Unknown')})
+
+    def load_table(self, table):
+        if len(table) == 0:
+            return
+        self.max_length = max(int(table.text_length.max()), 0)
+        self.messages = []
+        for index in np.flatnonzero(table.text_length == self.max_length).tolist():
+            text = table.text(index) if table.text_kind[index] != TEXT_ABSENT else ''
+            sender = table.senders[table.sender[index]] if table.sender[index] != ABSENT else 'Unknown'
+            self.messages.append({'text': text, 'sender': sender})
+
+    def load_store(self, store):
+        max_length = store.select('MAX(text_length)').fetchone()[0]
+        if max_length is None:
+            return
+        self.max_length = max(max_length, 0)
+        self.messages = []
+        rows = store.select('text_kind, text, has_from, sender', f'text_length = {self.max_length}', 'ORDER BY ordinal')
+        for kind, text, has_from, sender in rows:
+            text = '' if text is None else text if kind == TEXT_PLAIN else json.loads(text)
+            self.messages.append({'text': text, 'sender': sender if has_from else 'Unknown'})
+
+    def merge(self, other):
+        if other.max_length > self.max_length:
+            self.messages, self.max_length = other.messages, other.max_length
+        elif other.max_length == self.max_length:
+            self.messages = self.messages + other.messages
+
+    def get_state(self):
+        return {'max_length': self.max_length, 'messages': self.messages}
+
+    def set_state(self, state):
+        self.max_length = state['max_length']
+        self.messages = state['messages']
+
+    def result(self):
+        return self.messages
+
+
+@register
+class MostCommonWords(Metric):
+    """
+    Word occurrences, with the texts of many messages tokenized together.
+
+    Args:
+    - top_n (int): Number of words kept in the ranking. None keeps them all.
+    - stopwords (list): Lowercase words left out of the ranking.
+    - min_length (int): Words shorter than this are left out of the ranking.
+    """
+
+    name = 'most_common_words'
+
+    def __init__(self, top_n: int | None = 10, stopwords: list | None = None, min_length: int = 1):
+        self.top_n = top_n
+        self.tokenizer = Tokenizer(stopwords, min_length)
+        self.counts = Counter()
+        self.pending = []
+
+    def add(self, message):
+        text = message.get('text')
+        self.pending.append(text if type(text) is str else flatten_text(message))
+        if len(self.pending) >= BLOCK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            Tokenizer.count(self.pending, self.counts)
+            self.pending = []
+
+    def remove(self, message: dict):
+        self.flush()
+        words = message_words(message)
+        self.counts.subtract(words)
+        for word in set(words):
+            if self.counts[word] <= 0:
+                del self.counts[word]
+
+    def merge(self, other):
+        self.flush()
+        other.flush()
+        self.counts.update(other.counts)
+
+    def get_state(self):
+        self.flush()
+        return {'counts': list(self.counts.items())}
+
+    def set_state(self, state):
+        self.counts = Counter(dict(state['counts']))
+        self.pending = []
+
+    def result(self):
+        self.flush()
+        ranked = top_items(self.tokenizer.filter(self.counts), self.top_n)
+        return [{'word': word, 'occurrence': count} for word, count in ranked]
+
+
+@register
+class Ngrams(Metric):
+    """
+    Occurrences of n-grams such as bigrams and trigrams, see `ngrams.NgramCounts`.
+
+    Args:
+    - n (int): Number of words per n-gram.
+    - top_n (int): Number of n-grams kept in the ranking. None keeps them all.
+    - stopwords (list): N-grams containing these lowercase words are left out of the ranking.
+    - min_length (int): N-grams containing shorter words are left out of the ranking.
+    - max_size (int): Maximum number of distinct n-grams kept, rare ones being pruned. None keeps them all.
+    - by_sender (bool): Rank the n-grams of each sender separately.
+    """
+
+    name = 'ngrams'
+
+    def __init__(self, n: int = 2, top_n: int | None = 10, stopwords: list | None = None, min_length: int = 1,
+                 max_size: int | None = None, by_sender: bool = False):
+        self.n = n
+        self.top_n = top_n
+        self.tokenizer = Tokenizer(stopwords, min_length)
+        self.max_size = max_size
+        self.by_sender = by_sender
+        # Counts and buffered texts per sender, or under None for the whole chat.
+        self.counts = {}
+        self.pending = {}
+        self.size = 0
+
+    def group(self, message: dict) -> Any:
+        return display_name(message['from']) if self.by_sender else None
+
+    def add(self, message):
+        if self.by_sender and 'from' not in message:
+            return
+        text = message.get('text')
+        self.pending.setdefault(self.group(message), []).append(text if type(text) is str else flatten_text(message))
+        self.size += 1
+        if self.size >= BLOCK_SIZE:
+            self.flush()
+
+    def flush(self):
+        for group, texts in self.pending.items():
+            if group not in self.counts:
+                self.counts[group] = NgramCounts(self.n, self.max_size)
+            self.counts[group].add(texts)
+        self.pending = {}
+        self.size = 0
+
+    def remove(self, message: dict):
+        self.flush()
+        if self.by_sender and 'from' not in message:
+            return
+        if self.group(message) in self.counts:
+            self.counts[self.group(message)].remove(flatten_text(message))
+
+    def merge(self, other):
+        self.flush()
+        other.flush()
+        for group, counts in other.counts.items():
+            if group in self.counts:
+                self.counts[group].merge(counts)
+            else:
+                self.counts[group] = counts
+
+    def get_state(self):
+        self.flush()
+        return {'counts': [[group, counts.get_state()] for group, counts in self.counts.items()]}
+
+    def set_state(self, state):
+        self.counts = {}
+        for group, counts_state in state['counts']:
+            self.counts[group] = NgramCounts(self.n, self.max_size)
+            self.counts[group].set_state(counts_state)
+        self.pending = {}
+        self.size = 0
+
+    def rank(self, counts: NgramCounts) -> list:
+        return [{'ngram': ngram, 'occurrence': count} for ngram, count in counts.top(self.top_n, self.tokenizer)]
+
+    def result(self):
+        self.flush()
+        if self.by_sender:
+            return {group: self.rank(counts) for group, counts in self.counts.items()}
+        return self.rank(self.counts[None]) if None in self.counts else []
+
+
+@register
+class Collocations(Ngrams):
+    """
+    N-grams whose words occur together more often than by chance, ranked by pointwise
+    mutual information.
+
+    Args:
+    - min_count (int): N-grams seen fewer times are left out, their PMI being unreliable.
+    """
+
+    name = 'collocations'
+
+    def __init__(self, n: int = 2, top_n: int | None = 10, stopwords: list | None = None, min_length: int = 1,
+                 max_size: int | None = None, by_sender: bool = False, min_count: int = 5):
+        super().__init__(n, top_n, stopwords, min_length, max_size, by_sender)
+        self.min_count = min_count
+
+    def rank(self, counts):
+        return [{'ngram': ngram, 'pmi': pmi, 'occurrence': count}
+                for ngram, pmi, count in counts.collocations(self.top_n, self.min_count, self.tokenizer)]
+
+
+class ApproximateTally(Metric):
+    """
+    Keys counted approximately in a fixed amount of memory, see `sketch.HeavyHitters`.
+
+    Keys are buffered and added to the sketch a block at a time.
+
+    Args:
+    - top_n (int): Number of keys kept in the ranking. None keeps every candidate.
+    - epsilon (float): Target error, as a fraction of the total count.
+    - delta (float): Probability of exceeding the error.
+    - memory (int): Maximum size of the sketch in bytes. None leaves it unbounded.
+    - capacity (int): Number of candidate keys remembered for the ranking.
+    """
+
+    # Field names of the key and its count in the ranking.
+    fields = ('key', 'count')
+
+    def __init__(self, top_n: int | None = 10, epsilon: float = 1e-4, delta: float = 0.01,
+                 memory: int | None = None, capacity: int = 1000):
+        self.top_n = top_n
+        self.sketch = HeavyHitters(epsilon, delta, memory, capacity)
+        self.pending = []
+
+    def keys(self, message: dict) -> list:
+        raise NotImplementedError
+
+    def add(self, message):
+        self.pending.extend(self.keys(message))
+        if len(self.pending) >= BLOCK_SIZE:
+            self.flush()
+
+    def block_counts(self) -> Counter:
+        return Counter(self.pending)
+
+    def flush(self):
+        if self.pending:
+            self.sketch.update(self.block_counts())
+            self.pending = []
+
+    def remove(self, message: dict):
+        self.flush()
+        self.sketch.update({key: -count for key, count in Counter(self.keys(message)).items()})
+
+    def merge(self, other):
+        self.flush()
+        other.flush()
+        self.sketch.merge(other.sketch)
+
+    def get_state(self):
+        self.flush()
+        return {'sketch': self.sketch.get_state()}
+
+    def set_state(self, state):
+        self.sketch.set_state(state['sketch'])
+        self.pending = []
+
+    def result(self):
+        self.flush()
+        key_field, count_field = self.fields
+        ranking = [{key_field: key, count_field: count} for key, count in self.sketch.top(self.top_n)]
+        return {'ranking': ranking, **self.sketch.error()}
+
+
+@register
+class ApproximateWords(ApproximateTally):
+    """
+    Approximate word occurrences, for corpora whose vocabulary does not fit in memory.
+
+    Args:
+    - stopwords (list): Lowercase words left out of the counts.
+    - min_length (int): Words shorter than this are left out of the counts.
+    """
+
+    name = 'approximate_words'
+    fields = ('word', 'occurrence')
+
+    def __init__(self, top_n: int | None = 10, epsilon: float = 1e-4, delta: float = 0.01,
+                 memory: int | None = None, capacity: int = 1000, stopwords: list | None = None,
+                 min_length: int = 1):
+        super().__init__(top_n, epsilon, delta, memory, capacity)
+        self.tokenizer = Tokenizer(stopwords, min_length)
+
+    def keys(self, message):
+        return [word for word in message_words(message) if self.tokenizer.keep(word)]
+
+    def add(self, message):
+        text = message.get('text')
+        self.pending.append(text if type(text) is str else flatten_text(message))
+        if len(self.pending) >= BLOCK_SIZE:
+            self.flush()
+
+    def block_counts(self):
+        counts = Counter()
+        Tokenizer.count(self.pending, counts)
+        return self.tokenizer.filter(counts)
+
+
+@register
+class ApproximateSenders(ApproximateTally):
+    name = 'approximate_senders'
+    fields = ('sender', 'messages')
+
+    def keys(self, message):
+        return [display_name(message['from'])] if 'from' in message else []
+
+
+@register
+class ApproximateForwardSources(ApproximateTally):
+    name = 'approximate_forward_sources'
+    fields = ('source', 'messages')
+
+    def keys(self, message):
+        return [display_name(message['forwarded_from'])] if 'forwarded_from' in message else []
+
+
+@register
+class AverageMessageLength(Metric):
+    name = 'average_message_length'
+
+    def __init__(self):
+        self.total_length = 0
+        self.total_messages = 0
+
+    def add(self, message):
+        self.total_length += len(message.get('text', ''))
+        self.total_messages += 1
+
+    def load_table(self, table):
+        self.total_length = int(table.text_length.sum())
+        self.total_messages = len(table)
+
+    def load_store(self, store):
+        self.total_length, self.total_messages = store.select('COALESCE(SUM(text_length), 0), COUNT(*)').fetchone()
+
+    def merge(self, other):
+        self.total_length += other.total_length
+        self.total_messages += other.total_messages
+
+    def get_state(self):
+        return {'total_length': self.total_length, 'total_messages': self.total_messages}
+
+    def set_state(self, state):
+        self.total_length = state['total_length']
+        self.total_messages = state['total_messages']
+
+    def result(self):
+        if self.total_messages == 0:
+            return 0
+        return self.total_length / self.total_messages
+
+
+@register
+class EachAverageMessageLength(Metric):
+    name = 'each_average_message_length'
+
+    def __init__(self):
+        self.lengths = defaultdict(int)
+        self.counts = defaultdict(int)
+
+    @staticmethod
+    def length(message: dict) -> int:
+        text = message.get('text', '')
+        return len(text) if isinstance(text, str) else sum(
+            len(part['text']) for part in text if isinstance(part, dict))
+
+    def add(self, message):
+        if 'from' in message:
+            self.lengths[message['from']] += self.length(message)
+            self.counts[message['from']] += 1
+
+    def remove(self, message: dict):
+        if 'from' in message:
+            user = message['from']
+            self.lengths[user] -= self.length(message)
+            self.counts[user] -= 1
+            if self.counts[user] == 0:
+                del self.lengths[user], self.counts[user]
+
+    def load_store(self, store):
+        rows = store.select('sender, SUM(parts_length), COUNT(*), MIN(ordinal) AS first', 'has_from = 1',
+                            'GROUP BY sender ORDER BY first')
+        for user, length, count, _ in rows:
+            self.lengths[user] = length
+            self.counts[user] = count
+
+    def merge(self, other):
+        for user, length in other.lengths.items():
+            self.lengths[user] += length
+            self.counts[user] += other.counts[user]
+
+    def get_state(self):
+        return {'users': [[user, length, self.counts[user]] for user, length in self.lengths.items()]}
+
+    def set_state(self, state):
+        self.lengths, self.counts = defaultdict(int), defaultdict(int)
+        for user, length, count in state['users']:
+            self.lengths[user] = length
+            self.counts[user] = count
+
+    def result(self):
+        return {user: self.lengths[user] / self.counts[user] for user in self.lengths}
+
+
+class DateHistogram(Metric):
+    """
+    Messages counted per calendar bucket, ranked like `Counter.most_common`.
+
+    Args:
+    - top_n (int): Number of buckets kept in the ranking. None keeps them all.
+    - tz (str | float): Time zone whose calendar the buckets follow, as accepted by `ts.localize`. None keeps
+      the export's local time.
+    """
+
+    uses_timestamps = True
+
+    def __init__(self, top_n: int | None = None, tz: str | float | None = None):
+        self.top_n = top_n
+        self.tz = tz
+        self.counts = None
+
+    def keys(self, timestamps: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def label(self, key: int) -> Any:
+        return int(key)
+
+    def collect(self, timestamps, utc):
+        local = ts.local_time(timestamps, utc, self.tz)
+        valid = local != ts.MISSING
+        self.counts = ts.KeyCounts.from_keys(self.keys(local[valid]), np.flatnonzero(valid), len(timestamps))
+
+    def load_store(self, store):
+        _, starts, counts, first = store.time_counts(tz=self.tz)
+        self.counts = ts.KeyCounts.from_counts(self.keys(starts), counts, first, len(store))
+
+    def merge(self, other):
+        self.counts = self.counts.merge(other.counts)
+
+    def get_state(self):
+        return {'counts': self.counts.get_state()}
+
+    def set_state(self, state):
+        self.counts = ts.KeyCounts.from_state(state['counts'])
+
+    def result(self):
+        return self.counts.most_common(self.label, self.top_n)
+
+
+@register
+class MostActiveHours(DateHistogram):
+    name = 'most_active_hours'
+
+    def keys(self, timestamps):
+        return ts.hours(timestamps)
+
+
+@register
+class MostActiveDays(DateHistogram):
+    name = 'most_active_days'
+
+    def keys(self, timestamps):
+        return ts.days(timestamps)
+
+    def label(self, key):
+        return ts.day_label(key)
+
+
+@register
+class MostActiveWeekdays(DateHistogram):
+    name = 'most_active_weekdays'
+
+    def keys(self, timestamps):
+        return ts.weekdays(timestamps)
+
+    def label(self, key):
+        return ts.weekday_label(key)
+
+
+@register
+class MostActiveMonths(DateHistogram):
+    name = 'most_active_months'
+
+    def keys(self, timestamps):
+        return ts.months(timestamps)
+
+    def label(self, key):
+        return ts.month_label(key)
+
+
+@register
+class MostActiveYear(DateHistogram):
+    name = 'most_active_year'
+
+    def keys(self, timestamps):
+        return ts.years(timestamps)
+
+    def label(self, key):
+        return ts.year_label(key)
+
+
+@register
+class MostActiveMonthsAllTime(DateHistogram):
+    name = 'most_active_months_all_time'
+
+    def keys(self, timestamps):
+        return ts.months(timestamps) % 12
+
+    def label(self, key):
+        return ts.month_name(key)
+
+    def result(self):
+        return [{'name': month, 'messages': count} for month, count in super().result()]
+
+
+@register
+class MostActiveMonthsByYear(DateHistogram):
+    name = 'most_active_months_by_year'
+
+    def __init__(self, tz: str | float | None = None):
+        # Every month is listed, in calendar order, so there is nothing to cut.
+        super().__init__(tz=tz)
+
+    def keys(self, timestamps):
+        return ts.months(timestamps)
+
+    def result(self):
+        months, counts = self.counts.first_seen()
+        active_months_by_year = {}
+        for month, count in zip(months.tolist(), counts.tolist()):
+            year = ts.year_label(month // 12)
+            active_months_by_year.setdefault(year, []).append({'name': ts.month_name(month), 'messages': count})
+        return active_months_by_year
+
+
+@register
+class UserActivity(SenderMetric):
+    name = 'user_activity'
+    uses_timestamps = True
+
+    # How the buckets of each time dimension are reported.
+    dimensions = {
+        'Hour': int,
+        'Day': ts.day_label,
+        'Weekday': ts.weekday_label,
+        'Month': ts.month_label,
+    }
+
+    def __init__(self, tz: str | float | None = None):
+        super().__init__()
+        self.tz = tz
+        self.senders = array('i')
+        self.cube = ActivityCube()
+
+    def add(self, message):
+        self.senders.append(self.code(message.get('from', 'Deleted Account')))
+
+    def load_table(self, table):
+        self.senders = self.lookup(table.senders, 'Deleted Account')[table.sender]
+
+    def load_store(self, store):
+        users, starts, counts, first = store.time_counts(
+            "CASE WHEN has_from THEN sender ELSE 'Deleted Account' END", "has_from = 0 OR sender != ''", self.tz)
+        senders = np.array([self.code(user) for user in users], dtype=np.int64)
+        self.cube = ActivityCube.from_counts(self.users, senders, starts, counts, first, len(store))
+
+    def collect(self, timestamps, utc):
+        self.cube = ActivityCube.from_messages(self.users, self.senders, ts.local_time(timestamps, utc, self.tz))
+        self.senders = array('i')
+
+    def merge(self, other):
+        self.cube.merge(other.cube)
+
+    def get_state(self):
+        return self.cube.get_state()
+
+    def set_state(self, state):
+        self.cube = ActivityCube.from_state(state)
+
+    def result(self):
+        cube = self.cube
+        best = {}
+        for time_dimension in self.dimensions:
+            codes, buckets, counts = cube.most_active(time_dimension)
+            best[time_dimension] = dict(zip(codes.tolist(), zip(buckets.tolist(), counts.tolist())))
+
+        totals, first = cube.totals(), cube.first_seen()
+        active = np.flatnonzero(totals)
+
+        formatted_user_activity = {}
+        for code in active[np.argsort(first[active], kind='stable')].tolist():
+            formatted_activity_info = {}
+            for time_dimension, label in self.dimensions.items():
+                most_active_time, most_active_count = best[time_dimension][code]
+                formatted_activity_info[time_dimension] = {
+                    'most_active': label(most_active_time),
+                    'messages': most_active_count
+                }
+            overall_activity = int(totals[code]) * len(self.dimensions)
+            formatted_activity_info['Overall'] = {
+                'most_active': 'N/A' if overall_activity == 0 else 'Overall',
+                'messages': overall_activity
+            }
+            formatted_user_activity[cube.users[code]] = formatted_activity_info
+        return formatted_user_activity
+
+
+@register
+class DailyActivity(SenderMetric):
+    """
+    Daily series of messages, replies, forwards and active senders, with rolling sums and means.
+
+    Senders are told apart by `from_id`. Daily, weekly and monthly active senders (DAU, WAU
+    and MAU) are the distinct senders over the trailing 1, 7 and 30 days of each day.
+
+    Args:
+    - window (int): Number of days of the rolling sums and means. Defaults to 7.
+    - tz (str | float): Time zone whose days are counted, as accepted by `ts.localize`. None keeps the
+      export's local time.
+    """
+
+    name = 'daily_activity'
+    uses_timestamps = True
+
+    def __init__(self, window: int = 7, tz: str | float | None = None):
+        super().__init__()
+        self.window = window
+        self.tz = tz
+        self.senders = array('i')
+        self.replies = bytearray()
+        self.forwards = bytearray()
+        self.series = DailySeries()
+
+    def add(self, message):
+        self.senders.append(self.code(message.get('from_id')))
+        self.replies.append('reply_to_message_id' in message)
+        self.forwards.append('forwarded_from' in message)
+
+    def load_table(self, table):
+        self.senders = self.lookup(table.from_ids)[table.from_id]
+        self.replies = table.reply_to != ABSENT
+        self.forwards = table.forwarded_from != ABSENT
+
+    def load_store(self, store):
+        # Counted per quarter hour, which converts exactly to the days of any time zone.
+        rows = store.select(f'{bucket_expression(self.tz)} AS bucket, from_id, COUNT(*), '
+                            'SUM(reply_to_message_id IS NOT NULL), SUM(has_forward)',
+                            'timestamp IS NOT NULL', 'GROUP BY bucket, from_id').fetchall()
+        buckets, from_ids, counts, replies, forwards = list(zip(*rows)) or [()] * 5
+        senders = [self.code(from_id) for from_id in from_ids]
+        days = ts.days(bucket_starts(buckets, self.tz))
+        self.series = DailySeries.from_counts(days, senders, np.array(counts), np.array(replies), np.array(forwards))
+
+    def collect(self, timestamps, utc):
+        local = ts.local_time(timestamps, utc, self.tz)
+        valid = local != ts.MISSING
+        senders = np.asarray(self.senders, dtype=np.int64)[valid]
+        replies = np.asarray(self.replies, dtype=bool)[valid]
+        forwards = np.asarray(self.forwards, dtype=bool)[valid]
+        days = ts.days(local[valid])
+        self.series = DailySeries.from_counts(days, senders, np.ones(len(days)), replies, forwards)
+        self.senders, self.replies, self.forwards = array('i'), bytearray(), bytearray()
+
+    def merge(self, other):
+        self.series = self.series.merge(other.series, self.lookup(other.users))
+
+    def get_state(self):
+        return {'users': self.users, 'series': self.series.get_state()}
+
+    def set_state(self, state):
+        self.interner = Interner(state['users'])
+        self.series = DailySeries.from_state(state['series'])
+
+    def result(self):
+        series = self.series
+        days = series.days().astype('datetime64[D]').astype(str).tolist()
+        dau, wau, mau = (series.active_senders(window) for window in (1, 7, 30))
+        result = {'days': days, 'messages': series.messages.tolist(), 'replies': series.replies.tolist(),
+                  'forwards': series.forwards.tolist(), 'dau': dau.tolist(), 'wau': wau.tolist(), 'mau': mau.tolist()}
+        # Every sender active on a day is active over the week and month that end with it.
+        for name, total in (('dau_wau', wau), ('dau_mau', mau)):
+            result[name] = np.divide(dau, total, out=np.zeros(len(dau)), where=total > 0).tolist()
+        result['rolling'] = {'window': self.window}
+        for name in ('messages', 'replies', 'forwards'):
+            values = getattr(series, name)
+            result['rolling'][f'{name}_sum'] = rolling_sum(values, self.window).tolist()
+            result['rolling'][f'{name}_mean'] = rolling_mean(values, self.window).tolist()
+        return result
+
+
+@register
+class UniqueSenders(SenderMetric):
+    """
+    Approximate numbers of distinct senders per day, week or month, in constant memory per day.
+
+    Senders are told apart by `from_id` and counted in a HyperLogLog sketch per day, which
+    merges across pieces of an export, shards and chats.
+
+    Args:
+    - period (str): 'day', 'week' or 'month'. Defaults to 'day'.
+    - error (float): Target relative standard error of the counts. Defaults to 0.02.
+    - tz (str | float): Time zone whose days are counted, as accepted by `ts.localize`. None keeps the
+      export's local time.
+    """
+
+    name = 'unique_senders'
+    uses_timestamps = True
+
+    def __init__(self, period: str = 'day', error: float = 0.02, tz: str | float | None = None):
+        super().__init__()
+        self.period = period
+        self.tz = tz
+        self.senders = array('i')
+        self.sketch = DailyDistinct(error)
+
+    def add(self, message):
+        self.senders.append(self.code(message.get('from_id')))
+
+    def load_table(self, table):
+        self.senders = self.lookup(table.from_ids)[table.from_id]
+
+    def load_store(self, store):
+        # Distinct per quarter hour, which converts exactly to the days of any time zone.
+        rows = store.select(f'DISTINCT {bucket_expression(self.tz)}, from_id',
+                            'timestamp IS NOT NULL AND from_id IS NOT NULL').fetchall()
+        buckets, from_ids = list(zip(*rows)) or [(), ()]
+        days = ts.days(bucket_starts(buckets, self.tz))
+        senders = np.array([self.code(from_id) for from_id in from_ids], dtype=np.int64)
+        self.sketch.add(days, self.hashes()[senders])
+
+    def hashes(self) -> np.ndarray:
+        # Each sender is hashed once, however many messages it sent.
+        return np.array([key_hash(user) for user in self.users], dtype=np.uint64)
+
+    def collect(self, timestamps, utc):
+        senders = np.asarray(self.senders, dtype=np.int64)
+        local = ts.local_time(timestamps, utc, self.tz)
+        valid = (senders >= 0) & (local != ts.MISSING)
+        self.sketch.add(ts.days(local[valid]), self.hashes()[senders[valid]])
+        self.senders = array('i')
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+
+    def get_state(self):
+        return {'sketch': self.sketch.get_state()}
+
+    def set_state(self, state):
+        self.sketch.set_state(state['sketch'])
+
+    def result(self):
+        starts, counts = self.sketch.periods(self.period)
+        labels = starts.astype('datetime64[D]').astype(str)
+        if self.period == 'month':
+            labels = starts.astype('datetime64[D]').astype('datetime64[M]').astype(str)
+        return {
+            'periods': [{'period': label, 'senders': round(count)}
+                        for label, count in zip(labels.tolist(), counts.tolist())],
+            'total': round(self.sketch.count()),
+            'error': self.sketch.error()
+        }
+
+
+def merge_states(states: Iterable[dict]) -> dict:
+    """
+    Combine metric states taken over consecutive pieces of an export.
+
+    Args:
+    - states (Iterable[dict]): Results of `Analysis.scan`, in message order.
+
+    Returns:
+    - merged (dict): Dictionary mapping each metric name to its state over all the pieces.
+    """
+    merged = None
+    for state in states:
+        if merged is None:
+            merged = state
+            continue
+        for name, metric in state.items():
+            merged[name].merge(metric)
+    return merged
+
+
+def finish(states: dict) -> dict:
+    """
+    Compute the results of metric states.
+
+    Args:
+    - states (dict): Dictionary mapping metric names to their states.
+
+    Returns:
+    - results (dict): Dictionary mapping each metric name to its result.
+    """
+    return {name: metric.result() for name, metric in states.items()}
+
+
+class Analysis:
+    """
+    A set of metrics computed together in a single pass over the messages.
+
+    Only the registered metrics do any work, and message dates are parsed into a single
+    timestamp column no matter how many time-based metrics are requested.
+
+    Args:
+    - names (str): Names of metrics to register with their default options.
+    """
+
+    def __init__(self, *names: str):
+        self.requested = {}
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str, **options) -> 'Analysis':
+        """
+        Register a metric.
+
+        Args:
+        - name (str): The metric name, one of `METRICS`.
+        - options: Keyword arguments for the metric, such as `top_n`.
+
+        Returns:
+        - analysis (Analysis): This analysis, for chaining.
+        """
+        if name not in METRICS:
+            raise ValueError(f"Unknown metric: {name}")
+        self.requested[name] = options
+        return self
+
+    def scan(self, data: Any, start: str | None = None, end: str | None = None) -> dict:
+        """
+        Accumulate every registered metric in one scan of the messages, without computing results.
+
+        Args:
+        - data: The JSON data, a `ChatStream`, a `MessageTable`, a `MessageStore`, or an
+          iterable of messages.
+        - start (str): Only scan messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+        - end (str): Only scan messages dated before this ISO 8601 date.
+
+        Returns:
+        - states (dict): Dictionary mapping each metric name to its `Metric`, ready to be
+          merged with the states of the following messages (see `merge_states`).
+        """
+        data = window(data, start, end)
+        metrics = {name: METRICS[name](**options) for name, options in self.requested.items()}
+        table = data if isinstance(data, MessageTable) else None
+        store = data if isinstance(data, MessageStore) else None
+        queried = [metric for metric in metrics.values() if store is not None and hasattr(metric, 'load_store')]
+        scanned = [metric for metric in metrics.values()
+                   if (table is None or not hasattr(metric, 'load_table')) and metric not in queried]
+        adders = [metric.add for metric in scanned if type(metric).add is not Metric.add]
+        column = None
+        if table is None and any(metric.uses_timestamps for metric in scanned):
+            column = ts.TimestampColumn()
+            adders.append(column.append)
+
+        if adders:
+            for message in iter_messages(data):
+                for add in adders:
+                    add(message)
+
+        timestamps = utc = None
+        if table is not None:
+            timestamps, utc = table.timestamp, table.utc
+        elif column is not None:
+            timestamps, utc = column.finish(), column.finish_utc()
+        for metric in metrics.values():
+            if metric in queried:
+                metric.load_store(store)
+                continue
+            if table is not None and hasattr(metric, 'load_table'):
+                metric.load_table(table)
+            if metric.uses_timestamps:
+                metric.collect(timestamps, utc)
+        return metrics
+
+    def run(self, data: Any, start: str | None = None, end: str | None = None) -> dict:
+        """
+        Compute every registered metric in one scan of the messages.
+
+        Args:
+        - data: The JSON data, a `ChatStream`, a `MessageTable`, a `MessageStore`, or an
+          iterable of messages.
+        - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+        - end (str): Only count messages dated before this ISO 8601 date.
+
+        Returns:
+        - results (dict): Dictionary mapping each metric name to its result, in the same
+          shape as the corresponding function in `tool.py`.
+        """
+        return finish(self.scan(data, start, end))
+
+
+def analyze(data: Any, *names: str, start: str | None = None, end: str | None = None) -> dict:
+    """
+    Compute the named metrics, with their default options, in a single pass over the messages.
+
+    Args:
+    - data: The JSON data, a `ChatStream`, or an iterable of messages.
+    - names (str): Names of the metrics to compute.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+
+    Returns:
+    - results (dict): Dictionary mapping each metric name to its result.
+    """
+    return Analysis(*names).run(data, start, end)
@@ -4,19 +4,21 @@ import sys
 sys.path.append('../')
 from tool import load_json, get_user_activity
 
-def create_user_activity_table(data: dict, output_file: str) -> str:
+def create_user_activity_table(data: dict, output_file: str, tz: str | float | None = None) -> str:
     """
     Create a table or Excel file from the user activity data.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
     - output_file (str): File path to save the table or Excel file.
+    - tz (str | float): Time zone to count in, such as 'Europe/Berlin', or an offset from UTC in hours.
+      Defaults to the export's local time.
 
     Returns:
     - output_file (str): File path of the saved Excel file.
     """
 
-    user_activity = get_user_activity(data)
+    user_activity = get_user_activity(data, tz=tz)
 
     
     rows = []
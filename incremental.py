@@ -0,0 +1,305 @@
+import json
+import mmap
+import os
+
+import numpy as np
+
+from cache import read_cache, write_cache
+from compression import detect_compression
+from engine import Analysis, METRICS, Metric, merge_states
+from parallel import message_layout, parse_messages
+from partials import dump_partial, load_partial
+from stream import ChatStream
+from table import MessageTable
+import timestamps as ts
+
+
+# Bump whenever the layout of the state files changes.
+STATE_VERSION = 1
+
+EDITED_KEY = b'"edited":'
+COUNT_BLOCK_SIZE = 64 << 20
+
+
+def scans_rows(name: str) -> bool:
+    """
+    Tell whether a metric has to see every message, rather than being computed from a `MessageTable`.
+
+    Args:
+    - name (str): The metric name.
+
+    Returns:
+    - scans_rows (bool): True for metrics that only support `add`, such as word counts.
+    """
+    metric = METRICS[name]
+    return metric.add is not Metric.add and not hasattr(metric, 'load_table')
+
+
+def split_analysis(analysis: Analysis) -> tuple[Analysis, Analysis]:
+    """
+    Split an analysis into the metrics kept as running states and those recomputed from the table.
+
+    Args:
+    - analysis (Analysis): The metrics to compute.
+
+    Returns:
+    - rows (Analysis): The metrics that scan rows.
+    - table (Analysis): The metrics computed from the columns of the table.
+    """
+    rows, table = Analysis(), Analysis()
+    for name, options in analysis.requested.items():
+        (rows if scans_rows(name) else table).add(name, **options)
+    return rows, table
+
+
+def state_paths(state_dir: str, chat_id: object) -> tuple[str, str]:
+    """
+    Return the paths of the state files of a chat.
+
+    Args:
+    - state_dir (str): The directory holding the states of all chats.
+    - chat_id: The `id` of the chat.
+
+    Returns:
+    - state_path (str): The JSON file with the watermark and the running metric states.
+    - table_path (str): The binary table of the messages folded in so far.
+    """
+    base = os.path.join(state_dir, str(chat_id))
+    return base + '.json', base + '.table'
+
+
+def watermark(table: MessageTable) -> dict:
+    """
+    Return the highest message id and timestamp folded into a table.
+
+    Args:
+    - table (MessageTable): The messages folded in so far.
+
+    Returns:
+    - watermark (dict): The highest `id` and `timestamp`, None for an empty table.
+    """
+    if len(table) == 0:
+        return {'id': None, 'timestamp': None}
+    return {'id': int(table.id.max()), 'timestamp': int(table.timestamp.max())}
+
+
+def read_state(state_dir: str, chat_id: object, rows: Analysis) -> tuple[MessageTable, dict] | None:
+    """
+    Read the persisted state of a chat.
+
+    Args:
+    - state_dir (str): The directory holding the states of all chats.
+    - chat_id: The `id` of the chat.
+    - rows (Analysis): The row-scanning metrics the state must hold.
+
+    Returns:
+    - table (MessageTable): The messages folded in so far.
+    - states (dict): The running states of the row-scanning metrics.
+    - None: If there is no usable state, for example because other metrics were requested.
+    """
+    state_path, table_path = state_paths(state_dir, chat_id)
+    try:
+        with open(state_path, encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('version') != STATE_VERSION:
+            return None
+        saved, states = load_partial(state['partial'])
+    except (OSError, ValueError, KeyError):
+        return None
+    if saved.requested != rows.requested:
+        return None
+    table = read_cache(table_path, state['watermark'])
+    if table is None:
+        return None
+    return table, states
+
+
+def write_state(state_dir: str, chat_id: object, table: MessageTable, rows: Analysis, states: dict):
+    """
+    Persist the state of a chat.
+
+    Args:
+    - state_dir (str): The directory holding the states of all chats.
+    - chat_id: The `id` of the chat.
+    - table (MessageTable): The messages folded in so far.
+    - rows (Analysis): The row-scanning metrics.
+    - states (dict): Their running states.
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    state_path, table_path = state_paths(state_dir, chat_id)
+    mark = watermark(table)
+    write_cache(table, table_path, mark)
+    temporary_path = f'{state_path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': STATE_VERSION, 'chat_id': chat_id, 'watermark': mark,
+                   'partial': dump_partial(rows, states)}, f, ensure_ascii=False)
+    os.replace(temporary_path, state_path)
+
+
+def _count(data: mmap.mmap, pattern: bytes, start: int, end: int) -> int:
+    count = 0
+    while start < end:
+        stop = min(start + COUNT_BLOCK_SIZE, end)
+        count += data[start:min(stop + len(pattern) - 1, end)].count(pattern)
+        start = stop
+    return count
+
+
+def read_changes(file_path: str, last_id: int | None) -> tuple[int, list, list]:
+    """
+    Find what a new export of a chat adds to the messages up to a watermark.
+
+    Messages past the watermark are parsed. Of the older messages, a pretty-printed export
+    only has those containing an `edited` field parsed: they are found with a byte search
+    and the rest are merely counted. Other exports, including compressed ones, are
+    streamed in full.
+
+    Args:
+    - file_path (str): The path to the JSON file.
+    - last_id (int): The highest message id already folded in, or None.
+
+    Returns:
+    - old_count (int): Number of messages up to the watermark.
+    - edited (list): Messages up to the watermark that have been edited at some point.
+    - new_messages (list): Messages past the watermark.
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size > 0 and detect_compression(file_path) is None:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                layout = message_layout(data)
+                if layout is not None:
+                    return _read_changes(data, *layout, last_id)
+
+    old_count, edited, new_messages = 0, [], []
+    for message in ChatStream(file_path).messages():
+        if last_id is not None and message.get('id', last_id + 1) <= last_id:
+            old_count += 1
+            if 'edited' in message:
+                edited.append(message)
+        else:
+            new_messages.append(message)
+    return old_count, edited, new_messages
+
+
+def _read_changes(data: mmap.mmap, boundary: bytes, start: int, end: int, last_id: int | None) -> tuple:
+    def message_end(position):
+        following = data.find(boundary, position + 1, end)
+        return end if following == -1 else following
+
+    def message_at(position):
+        return parse_messages(data[position:message_end(position)])[0]
+
+    # Message ids increase through the export: bisect for the first one past the watermark.
+    split = end
+    if last_id is None:
+        split = start
+    else:
+        low, high = start, end
+        while low < high:
+            middle = (low + high) // 2
+            position = data.find(boundary, middle, high)
+            if position == -1:
+                high = middle
+            elif message_at(position).get('id', last_id + 1) > last_id:
+                split = high = position
+            else:
+                low = position + 1
+
+    edited = []
+    position = data.find(EDITED_KEY, start, split)
+    while position != -1:
+        message_start = data.rfind(boundary, start, position)
+        edited.append(message_at(message_start))
+        position = data.find(EDITED_KEY, message_end(message_start), split)
+
+    return _count(data, boundary, start, split), edited, parse_messages(data[split:end]) if split < end else []
+
+
+def apply_changes(table: MessageTable, states: dict, rows: Analysis,
+                  file_path: str) -> tuple[MessageTable, dict] | None:
+    """
+    Fold a new export of a chat into its persisted state.
+
+    New messages are appended to the table and added to the running states. Edited
+    messages replace their previous version in the table, and the running states swap
+    the previous version for the new one with `remove` and `add`.
+
+    Args:
+    - table (MessageTable): The messages folded in so far.
+    - states (dict): The running states of the row-scanning metrics.
+    - rows (Analysis): The row-scanning metrics.
+    - file_path (str): The path to the new JSON file.
+
+    Returns:
+    - table (MessageTable): The updated table.
+    - states (dict): The updated running states.
+    - None: If the export cannot be folded in as a delta, for example because messages
+      were deleted since the previous export or ids are not increasing.
+    """
+    ids = table.id
+    if len(ids) > 1 and not np.all(ids[1:] > ids[:-1]):
+        return None
+    old_count, candidates, new_messages = read_changes(file_path, watermark(table)['id'])
+    if old_count != len(table):
+        return None
+
+    positions, edited = [], []
+    for message in candidates:
+        position = int(np.searchsorted(ids, message.get('id')))
+        if position == len(ids) or ids[position] != message['id'] or (positions and position <= positions[-1]):
+            return None
+        if ts.parse_dates([message['edited']])[0] != table.edited[position] or \
+                len(message.get('text', '')) != table.text_length[position]:
+            positions.append(position)
+            edited.append(message)
+
+    if edited:
+        previous = [next(table.rows(start=position, stop=position + 1)) for position in positions]
+        for metric in states.values():
+            for old, new in zip(previous, edited):
+                metric.add(new)
+                metric.remove(old)
+        table = table.replace_rows(np.array(positions, dtype=np.int64), MessageTable.build(edited))
+    if new_messages:
+        table = table.append(MessageTable.build(new_messages))
+        states = merge_states([states, rows.scan(new_messages)])
+    return table, states
+
+
+def update_analysis(analysis: Analysis, file_path: str, state_dir: str) -> dict:
+    """
+    Compute an analysis of an export, reusing the state saved for earlier exports of the same chat.
+
+    The state of each chat, keyed by its `id`, holds a `MessageTable` of the messages
+    folded in so far, the running states of the metrics that need to see every message
+    (such as word counts) and a watermark: the highest message id and timestamp folded in.
+    A new export only has the messages past the watermark aggregated, plus the edited
+    messages among the older ones; the other metrics are recomputed from the table's
+    columns. Results are the same as a from-scratch run, except that words first
+    introduced by an edit may be ranked after others with the same count.
+
+    Args:
+    - analysis (Analysis): The metrics to compute.
+    - file_path (str): The path to the JSON file.
+    - state_dir (str): The directory holding the states of all chats.
+
+    Returns:
+    - results (dict): Dictionary mapping each metric name to its result.
+    """
+    chat = ChatStream(file_path)
+    chat_id = chat.header.get('id')
+    rows, columns = split_analysis(analysis)
+
+    updated = None
+    previous = read_state(state_dir, chat_id, rows)
+    if previous is not None:
+        updated = apply_changes(*previous, rows, file_path)
+    if updated is None:
+        table = MessageTable.build(chat)
+        updated = table, rows.scan(table)
+    table, states = updated
+    table.header = chat.header
+    write_state(state_dir, chat_id, table, rows, states)
+
+    states.update(columns.scan(table))
+    return {name: states[name].result() for name in analysis.requested}
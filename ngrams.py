@@ -0,0 +1,295 @@
+import re
+import numpy as np
+
+from ranking import top_order
+from tokenizer import SEPARATOR, Tokenizer
+
+# Words, and the line breaks between them: an n-gram never spans two lines, and texts
+# are joined with a line break so it never spans two messages either.
+NGRAM_PATTERN = re.compile(r'\w+|\n')
+
+# Word id of a line break.
+BREAK = 0
+
+# Multipliers of the splitmix64 finalizer, which mixes the word ids of an n-gram into its key.
+MIX = (np.uint64(0xbf58476d1ce4e5b9), np.uint64(0x94d049bb133111eb))
+
+
+def gram_keys(grams: np.ndarray) -> np.ndarray:
+    """
+    Hash n-grams to 64-bit keys.
+
+    Each word id is added to the key of the words before it, which is then mixed, so every
+    word and its position change all the bits of the key. Two distinct n-grams share a key
+    with probability 2**-64, one chance in a million among six million n-grams.
+
+    Args:
+    - grams (np.ndarray): An array of shape (count, n) of word ids.
+
+    Returns:
+    - keys (np.ndarray): The int64 key of each n-gram.
+    """
+    keys = np.zeros(len(grams), dtype=np.uint64)
+    for column in np.asarray(grams).T:
+        keys += column.astype(np.uint64)
+        keys ^= keys >> np.uint64(30)
+        keys *= MIX[0]
+        keys ^= keys >> np.uint64(27)
+        keys *= MIX[1]
+        keys ^= keys >> np.uint64(31)
+    return keys.view(np.int64)
+
+
+class NgramCounts:
+    """
+    Occurrences of the n-grams of many texts, counted a block of texts at a time.
+
+    Words are numbered in order of first occurrence, and an n-gram is counted under a 64-bit
+    hash of the ids of its words (see `gram_keys`), whatever the size of the vocabulary. The
+    counts are sorted numpy arrays of these keys, with the word ids of each counted n-gram
+    alongside to spell out its phrase: about 24 + 4n bytes per n-gram instead of a dictionary
+    of tuples of strings. Each block is added with a vectorized `np.unique`.
+
+    With `max_size`, rare n-grams are pruned whenever there are more than that many:
+    the least frequent are dropped until at most half of them are left, along with the
+    words no remaining n-gram uses, so the vocabulary stays bounded too. An n-gram that
+    was pruned and occurs again is counted from zero, so counts below the largest pruned
+    one (`pruned_below`) may be too low, as may the word counts behind their PMI; the
+    frequent n-grams are unaffected.
+
+    Args:
+    - n (int): Number of words per n-gram, 2 for bigrams and 3 for trigrams.
+    - max_size (int): Maximum number of distinct n-grams kept. None keeps them all.
+    """
+
+    def __init__(self, n: int = 2, max_size: int | None = None):
+        if n < 2:
+            raise ValueError(f"An n-gram has at least 2 words, not {n}")
+        self.n = n
+        self.max_size = max_size
+        self.vocabulary = {SEPARATOR: BREAK}
+        # Occurrences of each word, indexed by word id.
+        self.words = np.zeros(1, dtype=np.int64)
+        # N-gram keys in ascending order, their word ids, their counts and the position of their first word.
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.grams = np.zeros((0, n), dtype=np.int32)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.first = np.zeros(0, dtype=np.int64)
+        # Number of tokens seen, which positions the n-grams of the next block.
+        self.position = 0
+        self.pruned_below = 0
+
+    def _ids(self, words: list[str]) -> np.ndarray:
+        vocabulary = self.vocabulary
+        # Number the new words once per distinct word, then look every word up in C.
+        for word in dict.fromkeys(words):
+            if word not in vocabulary:
+                vocabulary[word] = len(vocabulary)
+        ids = np.fromiter(map(vocabulary.__getitem__, words), dtype=np.int64, count=len(words))
+        if len(vocabulary) > len(self.words):
+            self.words = np.concatenate([self.words, np.zeros(len(vocabulary) - len(self.words), dtype=np.int64)])
+        return ids
+
+    def _grams(self, ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Word ids of the n-grams without a line break, and the position of each.
+        if len(ids) < self.n:
+            return np.zeros((0, self.n), dtype=np.int64), np.zeros(0, dtype=np.int64)
+        windows = np.lib.stride_tricks.sliding_window_view(ids, self.n)
+        positions = np.flatnonzero((windows != BREAK).all(axis=1))
+        return windows[positions], positions
+
+    def _combine(self, keys: np.ndarray, counts: np.ndarray, first: np.ndarray, grams: np.ndarray):
+        keys = np.concatenate([self.keys, keys])
+        counts = np.concatenate([self.counts, counts])
+        first = np.concatenate([self.first, first])
+        grams = np.concatenate([self.grams, grams.astype(np.int32)])
+        if len(keys) == 0:
+            return
+        order = np.argsort(keys, kind='stable')
+        keys, counts, first = keys[order], counts[order], first[order]
+        starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+        self.keys = keys[starts]
+        self.grams = grams[order[starts]]
+        self.counts = np.add.reduceat(counts, starts)
+        self.first = np.minimum.reduceat(first, starts)
+        if self.max_size is not None and len(self.keys) > self.max_size:
+            self.prune()
+
+    def add(self, texts: list[str]):
+        """
+        Add the n-grams of a block of texts.
+
+        Args:
+        - texts (list[str]): The texts.
+        """
+        ids = self._ids(NGRAM_PATTERN.findall(SEPARATOR.join(texts).lower()))
+        self.words += np.bincount(ids, minlength=len(self.words))
+        grams, positions = self._grams(ids)
+        keys, index, counts = np.unique(gram_keys(grams), return_index=True, return_counts=True)
+        self._combine(keys, counts, self.position + positions[index], grams[index])
+        # The break that joins this block to the next one.
+        self.position += len(ids) + 1
+
+    def remove(self, text: str):
+        """
+        Subtract the n-grams of a text added earlier.
+
+        Args:
+        - text (str): The text.
+        """
+        ids = np.fromiter((self.vocabulary.get(word, BREAK) for word in NGRAM_PATTERN.findall(text.lower())),
+                          dtype=np.int64)
+        np.subtract.at(self.words, ids, 1)
+        grams, _ = self._grams(ids)
+        keys, counts = np.unique(gram_keys(grams), return_counts=True)
+        index = np.searchsorted(self.keys, keys)
+        found = index < len(self.keys)
+        found[found] = self.keys[index[found]] == keys[found]
+        self.counts[index[found]] -= counts[found]
+        self._keep(self.counts > 0)
+
+    def _keep(self, kept: np.ndarray):
+        self.keys, self.grams, self.counts, self.first = \
+            self.keys[kept], self.grams[kept], self.counts[kept], self.first[kept]
+
+    def prune(self, min_count: int | None = None):
+        """
+        Drop rare n-grams.
+
+        Args:
+        - min_count (int): N-grams seen fewer times are dropped. Defaults to the count that
+          leaves at most half of `max_size`.
+        """
+        if min_count is None:
+            keep = self.max_size // 2
+            if keep <= 0 or len(self.counts) <= keep:
+                return
+            min_count = np.partition(self.counts, len(self.counts) - keep)[len(self.counts) - keep]
+            if np.count_nonzero(self.counts >= min_count) > keep:
+                min_count += 1
+        kept = self.counts >= min_count
+        if not kept.all():
+            self.pruned_below = max(self.pruned_below, int(self.counts[~kept].max()) + 1)
+        self._keep(kept)
+        self._prune_vocabulary()
+
+    def _prune_vocabulary(self):
+        # Drop the words no kept n-gram uses, renumbering the others in the same order.
+        used = np.zeros(len(self.words), dtype=bool)
+        used[BREAK] = True
+        used[self.grams.ravel()] = True
+        if used.all():
+            return
+        ids = np.cumsum(used) - 1
+        self.vocabulary = {word: int(ids[index]) for word, index in self.vocabulary.items() if used[index]}
+        self.words = self.words[used]
+        # Keys hash the word ids, so they change with them.
+        self.grams = ids[self.grams].astype(np.int32)
+        self.keys = gram_keys(self.grams)
+        order = np.argsort(self.keys)
+        self.keys, self.grams, self.counts, self.first = \
+            self.keys[order], self.grams[order], self.counts[order], self.first[order]
+
+    def merge(self, other: 'NgramCounts'):
+        """
+        Add the counts taken over the texts that follow.
+
+        Args:
+        - other (NgramCounts): Counts of n-grams of the same length.
+        """
+        if other.n != self.n:
+            raise ValueError(f"Cannot merge {other.n}-grams into {self.n}-grams")
+        mapping = self._ids(list(other.vocabulary))
+        self.words[mapping] += other.words
+        grams = mapping[other.grams]
+        self._combine(gram_keys(grams), other.counts, other.first + self.position, grams)
+        self.position += other.position
+        self.pruned_below = max(self.pruned_below, other.pruned_below)
+
+    def _phrases(self, index: np.ndarray) -> list[str]:
+        words = list(self.vocabulary)
+        return [' '.join(words[word] for word in row) for row in self.grams[index].tolist()]
+
+    def _kept(self, tokenizer: Tokenizer | None) -> np.ndarray:
+        # N-grams whose every word is kept by the tokenizer.
+        if tokenizer is None or (not tokenizer.stopwords and tokenizer.min_length <= 1):
+            return np.ones(len(self.keys), dtype=bool)
+        keep = np.fromiter((tokenizer.keep(word) for word in self.vocabulary), dtype=bool, count=len(self.vocabulary))
+        return keep[self.grams].all(axis=1)
+
+    def top(self, top_n: int | None = None, tokenizer: Tokenizer | None = None) -> list[tuple[str, int]]:
+        """
+        Rank n-grams by occurrences, ties broken by first occurrence.
+
+        Args:
+        - top_n (int): Number of n-grams to return. None returns all of them.
+        - tokenizer (Tokenizer): Leaves out n-grams containing its stopwords or short words.
+
+        Returns:
+        - ranked (list[tuple[str, int]]): (n-gram, occurrences) pairs, words separated by a space.
+        """
+        candidates = np.flatnonzero(self._kept(tokenizer))
+        index = candidates[top_order(self.counts[candidates], self.first[candidates], top_n)]
+        return list(zip(self._phrases(index), self.counts[index].tolist()))
+
+    def pmi(self) -> np.ndarray:
+        """
+        Compute the pointwise mutual information of every n-gram.
+
+        PMI is `log2(p(w1 ... wn) / (p(w1) * ... * p(wn)))`: how many times more often the
+        words occur together than they would by chance.
+
+        Returns:
+        - pmi (np.ndarray): The PMI of each n-gram, in the order of `keys`.
+        """
+        words = self.words.copy()
+        words[BREAK] = 0
+        total_words = max(int(words.sum()), 1)
+        total_grams = max(int(self.counts.sum()), 1)
+        probabilities = np.log2(np.maximum(words, 1) / total_words)
+        return np.log2(self.counts / total_grams) - probabilities[self.grams].sum(axis=1)
+
+    def collocations(self, top_n: int | None = None, min_count: int = 5,
+                     tokenizer: Tokenizer | None = None) -> list[tuple[str, float, int]]:
+        """
+        Rank n-grams by PMI, leaving out rare ones whose PMI is unreliable.
+
+        Args:
+        - top_n (int): Number of n-grams to return. None returns all of them.
+        - min_count (int): N-grams seen fewer times are left out.
+        - tokenizer (Tokenizer): Leaves out n-grams containing its stopwords or short words.
+
+        Returns:
+        - ranked (list[tuple[str, float, int]]): (n-gram, PMI, occurrences), highest PMI first.
+        """
+        candidates = np.flatnonzero(self._kept(tokenizer) & (self.counts >= min_count))
+        scores = self.pmi()[candidates]
+        # Rank by PMI, ties broken by occurrences and then first occurrence.
+        order = np.lexsort((self.first[candidates], -self.counts[candidates], -scores))[:top_n]
+        index = candidates[order]
+        return list(zip(self._phrases(index), scores[order].tolist(), self.counts[index].tolist()))
+
+    def get_state(self) -> dict:
+        return {
+            'n': self.n,
+            'max_size': self.max_size,
+            'vocabulary': list(self.vocabulary),
+            'words': self.words.tolist(),
+            'grams': self.grams.tolist(),
+            'counts': self.counts.tolist(),
+            'first': self.first.tolist(),
+            'position': self.position,
+            'pruned_below': self.pruned_below,
+        }
+
+    def set_state(self, state: dict):
+        self.__init__(state['n'], state['max_size'])
+        self.vocabulary = {word: index for index, word in enumerate(state['vocabulary'])}
+        self.words = np.array(state['words'], dtype=np.int64)
+        self.grams = np.array(state['grams'], dtype=np.int32).reshape(-1, self.n)
+        self.keys = gram_keys(self.grams)
+        self.counts = np.array(state['counts'], dtype=np.int64)
+        self.first = np.array(state['first'], dtype=np.int64)
+        self.position = state['position']
+        self.pruned_below = state['pruned_below']
+
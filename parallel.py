@@ -0,0 +1,222 @@
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+import mmap
+import os
+import re
+from typing import Any, Callable, Iterable, Iterator
+
+from compression import detect_compression
+from engine import Analysis, finish, merge_states
+from parsers import get_backend
+from stream import ChatStream
+
+
+# Telegram exports are pretty-printed, so every message starts on its own line at the same
+# indentation and the array can be cut at those lines without parsing it.
+HEADER_LIMIT = 1 << 20
+WHITESPACE = b' \t\r\n'
+
+
+def array_layout(data: Any, key: bytes, start: int = 0, limit: int | None = None,
+                 indent: bytes | None = None) -> tuple[bytes, int, int] | None:
+    """
+    Locate an array of objects in the bytes of a pretty-printed JSON document.
+
+    Args:
+    - data (bytes | mmap.mmap): The contents of the JSON file.
+    - key (bytes): The key holding the array, such as b'messages'.
+    - start (int): Offset to search for the key from.
+    - limit (int): Offset the key must be found before; the end of the data when omitted.
+    - indent (bytes): The indentation of the key's line; any when omitted.
+
+    Returns:
+    - boundary (bytes): The bytes every element starts with: a newline, its indentation and '{'.
+    - start (int): Offset of the first element.
+    - end (int): Offset just past the last element.
+    - None: If the document is not pretty-printed or the array is empty.
+    """
+    key_indent = rb'([ \t]*)' if indent is None else b'(' + re.escape(indent) + b')'
+    pattern = re.compile(rb'\n' + key_indent + rb'"' + re.escape(key) + rb'"[ \t]*:[ \t]*\[')
+    match = pattern.search(data, start, len(data) if limit is None else limit)
+    if match is None:
+        return None
+    first = match.end()
+    while first < len(data) and data[first] in WHITESPACE:
+        first += 1
+    line_start = data.rfind(b'\n', match.end(), first)
+    if first >= len(data) or data[first:first + 1] != b'{' or line_start == -1:
+        return None
+    # Nested values are indented deeper, so the array closes at the first ']' at the key's indentation.
+    end = data.find(b'\n' + match.group(1) + b']', first)
+    if end == -1:
+        return None
+    return data[line_start:first + 1], line_start, end
+
+
+def message_layout(data: Any) -> tuple[bytes, int, int] | None:
+    """
+    Locate the messages array in the bytes of a pretty-printed export.
+
+    Args:
+    - data (bytes | mmap.mmap): The contents of the JSON file.
+
+    Returns:
+    - boundary (bytes): The bytes every message starts with: a newline, its indentation and '{'.
+    - start (int): Offset of the first message.
+    - end (int): Offset just past the last message.
+    - None: If the export is not pretty-printed or has no messages.
+    """
+    # Only the top-level key counts: a full-account export nests messages inside each chat.
+    first_key = data.find(b'"', 0, HEADER_LIMIT)
+    if first_key == -1:
+        return None
+    indent = data[data.rfind(b'\n', 0, first_key) + 1:first_key]
+    return array_layout(data, b'messages', limit=HEADER_LIMIT, indent=indent)
+
+
+def boundaries(data: Any, boundary: bytes, start: int, end: int) -> list:
+    """
+    Return the byte ranges of the elements of an array located with `array_layout`.
+
+    Args:
+    - data (bytes | mmap.mmap): The contents of the JSON file.
+    - boundary (bytes): The bytes every element starts with.
+    - start (int): Offset of the first element.
+    - end (int): Offset just past the last element.
+
+    Returns:
+    - ranges (list): (start, end) byte offsets of each element, in order.
+    """
+    ranges = []
+    while start < end:
+        following = data.find(boundary, start + 1, end)
+        following = end if following == -1 else following
+        ranges.append((start, following))
+        start = following
+    return ranges
+
+
+def imap_bounded(executor: Executor, function: Callable, arguments: Iterable[tuple],
+                 in_flight: int) -> Iterator[Any]:
+    """
+    Like `executor.map`, but with at most `in_flight` calls submitted and not yet consumed.
+
+    Arguments are drawn lazily, so a long stream of large arguments is never held in memory.
+
+    Args:
+    - executor (Executor): The executor to run the calls in.
+    - function (Callable): The function to call.
+    - arguments (Iterable[tuple]): The positional arguments of each call.
+    - in_flight (int): Maximum number of pending calls.
+
+    Returns:
+    - results (Iterator[Any]): The results, in the order of the arguments.
+    """
+    pending = deque()
+    for call_arguments in arguments:
+        pending.append(executor.submit(function, *call_arguments))
+        if len(pending) >= in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def parse_messages(chunk: bytes, backend: str = 'auto') -> list:
+    """
+    Parse a run of consecutive messages cut out of a pretty-printed export.
+
+    Args:
+    - chunk (bytes): The bytes of whole messages, with their separating commas.
+    - backend (str): The JSON parser to use, or 'auto'.
+
+    Returns:
+    - messages (list): The parsed messages.
+    """
+    return get_backend(backend)(b'[' + chunk.strip(WHITESPACE).rstrip(b',') + b']')
+
+
+def split_messages(file_path: str, chunk_size: int = 32 << 20, min_ranges: int = 1) -> list | None:
+    """
+    Split the messages array of an export into byte ranges holding whole messages.
+
+    Args:
+    - file_path (str): The path to the JSON file.
+    - chunk_size (int): Approximate size of each range in bytes.
+    - min_ranges (int): Minimum number of ranges to cut, such as the number of workers.
+
+    Returns:
+    - ranges (list): (start, end) byte offsets of consecutive runs of messages, in order.
+    - None: If the export is compressed, is not pretty-printed or has no messages.
+    """
+    if detect_compression(file_path) is not None:
+        return None
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            layout = message_layout(data)
+            if layout is None:
+                return None
+            boundary, start, end = layout
+            step = max(1, min(chunk_size, -(-(end - start) // max(1, min_ranges))))
+            ranges = []
+            while start < end:
+                cut = data.find(boundary, min(start + step, end), end)
+                cut = end if cut == -1 else cut
+                ranges.append((start, cut))
+                start = cut
+            return ranges
+
+
+def scan_range(analysis: Analysis, file_path: str, start: int, end: int, backend: str = 'auto') -> dict:
+    """
+    Parse the messages in a byte range of an export and accumulate the analysis over them.
+
+    Args:
+    - analysis (Analysis): The metrics to compute.
+    - file_path (str): The path to the JSON file.
+    - start (int): Offset of the first message of the range.
+    - end (int): Offset just past the last message of the range.
+    - backend (str): The JSON parser to use, or 'auto'.
+
+    Returns:
+    - states (dict): The metric states over the range, as returned by `Analysis.scan`.
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        chunk = f.read(end - start)
+    return analysis.scan(parse_messages(chunk, backend))
+
+
+def run_parallel(analysis: Analysis, file_path: str, workers: int | None = None, chunk_size: int = 32 << 20,
+                 backend: str = 'auto') -> dict:
+    """
+    Compute an analysis of an export with several processes.
+
+    The messages array is cut into byte ranges at message boundaries; each worker parses
+    and scans whole ranges, and the partial states are merged in export order, so the
+    results are identical to `Analysis.run` on the whole export. Exports that are
+    compressed or not pretty-printed cannot be cut without parsing them and are streamed
+    in this process.
+
+    Args:
+    - analysis (Analysis): The metrics to compute.
+    - file_path (str): The path to the JSON file.
+    - workers (int): Number of worker processes. Defaults to the number of CPUs.
+    - chunk_size (int): Approximate size of the byte range parsed at a time by a worker.
+    - backend (str): The JSON parser used by the workers, or 'auto'.
+
+    Returns:
+    - results (dict): Dictionary mapping each metric name to its result.
+    """
+    get_backend(backend)
+    workers = workers or os.cpu_count() or 1
+    ranges = split_messages(file_path, chunk_size, workers)
+    if ranges is None:
+        return analysis.run(ChatStream(file_path))
+
+    arguments = ([analysis] * len(ranges), [file_path] * len(ranges), *zip(*ranges), [backend] * len(ranges))
+    if workers == 1:
+        return finish(merge_states(map(scan_range, *arguments)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return finish(merge_states(executor.map(scan_range, *arguments)))
@@ -0,0 +1,86 @@
+import json
+from typing import Any, Callable
+
+from compression import open_binary
+
+
+# Fastest first; 'auto' picks the first backend that is installed.
+PREFERENCE = ['orjson', 'simdjson', 'ujson', 'json']
+
+BACKENDS = {}
+
+
+def register_backend(name: str, loads: Callable[[bytes], Any]):
+    """
+    Register a JSON parser backend.
+
+    Args:
+    - name (str): The name used to select the backend in `load_json`.
+    - loads (Callable[[bytes], Any]): Parses a UTF-8 encoded document into Python objects.
+    """
+    BACKENDS[name] = loads
+
+
+register_backend('json', lambda raw: json.loads(raw.decode('utf-8')))
+
+try:
+    import orjson
+    register_backend('orjson', orjson.loads)
+except ImportError:
+    pass
+
+try:
+    import simdjson
+    register_backend('simdjson', lambda raw: simdjson.Parser().parse(raw, recursive=True))
+except ImportError:
+    pass
+
+try:
+    import ujson
+    register_backend('ujson', ujson.loads)
+except ImportError:
+    pass
+
+
+def available_backends() -> list:
+    """
+    List the installed parser backends, fastest first.
+
+    Returns:
+    - backends (list): Names of the registered backends.
+    """
+    preferred = [name for name in PREFERENCE if name in BACKENDS]
+    return preferred + [name for name in BACKENDS if name not in preferred]
+
+
+def get_backend(backend: str = 'auto') -> Callable[[bytes], Any]:
+    """
+    Return the parse function of a backend.
+
+    Args:
+    - backend (str): A registered backend name, or 'auto' for the fastest installed one.
+
+    Returns:
+    - loads (Callable[[bytes], Any]): The backend's parse function.
+    """
+    if backend == 'auto':
+        backend = available_backends()[0]
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown or unavailable JSON backend: {backend}. Available: {available_backends()}")
+    return BACKENDS[backend]
+
+
+def parse_file(file_path: str, backend: str = 'auto') -> Any:
+    """
+    Parse a JSON file with the selected backend.
+
+    Args:
+    - file_path (str): The path to the JSON file, possibly compressed (see `compression`).
+    - backend (str): A registered backend name, or 'auto'.
+
+    Returns:
+    - data (Any): The parsed document.
+    """
+    loads = get_backend(backend)
+    with open_binary(file_path) as f:
+        return loads(f.read())
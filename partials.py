@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import sys
+from typing import Iterable
+
+from engine import Analysis, METRICS, finish, merge_states
+from parallel import scan_range, split_messages
+from stream import ChatStream
+
+
+# Bump whenever the state of a metric changes shape.
+PARTIAL_VERSION = 3
+PARTIAL_FORMAT = 'telegram-analyzer-partial'
+
+
+def scan_shard(analysis: Analysis, file_path: str, shard: int = 0, shards: int = 1) -> dict:
+    """
+    Accumulate an analysis over one shard of an export.
+
+    The messages array is cut into `shards` byte ranges of about the same size; shard
+    `shard` covers the messages of one of them. With a single shard the whole export is
+    streamed, so the export may be compressed or not pretty-printed.
+
+    Args:
+    - analysis (Analysis): The metrics to compute.
+    - file_path (str): The path to the JSON file.
+    - shard (int): Index of the shard to scan, from 0 to `shards - 1`.
+    - shards (int): Number of shards the export is cut into.
+
+    Returns:
+    - states (dict): The metric states over the shard, as returned by `Analysis.scan`.
+    """
+    if not 0 <= shard < shards:
+        raise ValueError(f"Shard {shard} is out of range for {shards} shards")
+    if shards == 1:
+        return analysis.scan(ChatStream(file_path))
+    ranges = split_messages(file_path, os.path.getsize(file_path), shards)
+    if ranges is None:
+        raise ValueError(f"{file_path} is compressed or not pretty-printed and cannot be sharded")
+    if shard >= len(ranges):
+        return analysis.scan([])
+    return scan_range(analysis, file_path, *ranges[shard])
+
+
+def dump_partial(analysis: Analysis, states: dict) -> dict:
+    """
+    Convert metric states to JSON-serialisable data.
+
+    Args:
+    - analysis (Analysis): The analysis the states were computed with.
+    - states (dict): The metric states, as returned by `Analysis.scan`.
+
+    Returns:
+    - partial (dict): The format version and, for each metric, its options and state.
+    """
+    return {
+        'format': PARTIAL_FORMAT,
+        'version': PARTIAL_VERSION,
+        'metrics': {name: {'options': analysis.requested[name], 'state': metric.get_state()}
+                    for name, metric in states.items()},
+    }
+
+
+def load_partial(partial: dict) -> tuple[Analysis, dict]:
+    """
+    Rebuild metric states from the data returned by `dump_partial`.
+
+    Args:
+    - partial (dict): The serialised partial state.
+
+    Returns:
+    - analysis (Analysis): The analysis the states were computed with.
+    - states (dict): Dictionary mapping each metric name to its `Metric`.
+    """
+    if partial.get('format') != PARTIAL_FORMAT or partial.get('version') != PARTIAL_VERSION:
+        raise ValueError(f"Unsupported partial state format: {partial.get('format')} {partial.get('version')}")
+    analysis, states = Analysis(), {}
+    for name, entry in partial['metrics'].items():
+        analysis.add(name, **entry['options'])
+        states[name] = METRICS[name](**entry['options'])
+        states[name].set_state(entry['state'])
+    return analysis, states
+
+
+def write_partial(analysis: Analysis, states: dict, path: str):
+    """
+    Write metric states to a partial state file.
+
+    Args:
+    - analysis (Analysis): The analysis the states were computed with.
+    - states (dict): The metric states, as returned by `Analysis.scan`.
+    - path (str): The path of the file to write.
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dump_partial(analysis, states), f, ensure_ascii=False)
+
+
+def read_partial(path: str) -> tuple[Analysis, dict]:
+    """
+    Read metric states from a partial state file.
+
+    Args:
+    - path (str): The path of the file written by `write_partial`.
+
+    Returns:
+    - analysis (Analysis): The analysis the states were computed with.
+    - states (dict): Dictionary mapping each metric name to its `Metric`.
+    """
+    with open(path, encoding='utf-8') as f:
+        return load_partial(json.load(f))
+
+
+def reduce_partials(paths: Iterable[str]) -> tuple[Analysis, dict]:
+    """
+    Merge partial state files in the given order.
+
+    Shards of one export must be given in export order for the ranking ties to match a
+    single-process run. Since merging is associative, reduced files can themselves be
+    reduced further.
+
+    Args:
+    - paths (Iterable[str]): Paths of files written by `write_partial`.
+
+    Returns:
+    - analysis (Analysis): The analysis shared by all the files.
+    - states (dict): Dictionary mapping each metric name to its merged `Metric`.
+    """
+    analysis, partials = None, []
+    for path in paths:
+        partial_analysis, states = read_partial(path)
+        if analysis is None:
+            analysis = partial_analysis
+        elif partial_analysis.requested != analysis.requested:
+            raise ValueError(f"{path} was computed with different metrics or options")
+        partials.append(states)
+    if analysis is None:
+        raise ValueError("No partial state files to reduce")
+    return analysis, merge_states(partials)
+
+
+def main(argv: list | None = None):
+    parser = argparse.ArgumentParser(description='Compute and combine partial analyses of Telegram exports.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    scan = commands.add_parser('scan', help='Write the partial state of one export, or of one shard of it.')
+    scan.add_argument('export')
+    scan.add_argument('-o', '--output', required=True)
+    scan.add_argument('--metrics', nargs='+', default=list(METRICS), choices=list(METRICS))
+    scan.add_argument('--shard', type=int, default=0)
+    scan.add_argument('--shards', type=int, default=1)
+
+    reduce = commands.add_parser('reduce', help='Combine partial states into final results.')
+    reduce.add_argument('partials', nargs='+')
+    reduce.add_argument('-o', '--output', help='Write the results here instead of standard output.')
+    reduce.add_argument('--partial', action='store_true',
+                        help='Write the merged partial state instead of the final results.')
+
+    args = parser.parse_args(argv)
+    if args.command == 'scan':
+        analysis = Analysis(*args.metrics)
+        write_partial(analysis, scan_shard(analysis, args.export, args.shard, args.shards), args.output)
+        return
+
+    analysis, states = reduce_partials(args.partials)
+    output = dump_partial(analysis, states) if args.partial else finish(states)
+    f = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        json.dump(output, f, ensure_ascii=False, indent=1)
+    finally:
+        if args.output:
+            f.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+from operator import itemgetter
+from typing import Any
+
+import numpy as np
+
+
+def top_order(counts: np.ndarray, first: np.ndarray, top_n: int | None = None) -> np.ndarray:
+    """
+    Find the `top_n` largest counts, ranked by descending count with ties broken by first occurrence.
+
+    Only the candidates that can make the cut are sorted: `np.partition` finds the count
+    of the `top_n`-th entry in linear time, and only the entries at or above it are ranked.
+
+    Args:
+    - counts (np.ndarray): The counts.
+    - first (np.ndarray): Position of the first occurrence of each entry; smaller ranks first among ties.
+    - top_n (int): Number of entries to keep. None keeps them all.
+
+    Returns:
+    - order (np.ndarray): Indices of the kept entries, highest ranked first.
+    """
+    if top_n is not None and 0 < top_n < len(counts):
+        threshold = np.partition(counts, len(counts) - top_n)[len(counts) - top_n]
+        candidates = np.flatnonzero(counts >= threshold)
+    else:
+        candidates = np.arange(len(counts))
+    order = candidates[np.lexsort((first[candidates], -counts[candidates]))]
+    return order[:top_n]
+
+
+def top_items(counts: dict, top_n: int | None = None) -> list[tuple[Any, int]]:
+    """
+    Rank the items of a dictionary by descending count, like `Counter.most_common`.
+
+    Ties are broken by insertion order, so a dictionary filled in message order ranks
+    names with the same count by their first message. With `top_n`, only the candidates
+    found by `top_order` are ranked; without it, a stable sort of every item is faster.
+
+    Args:
+    - counts (dict): Dictionary mapping names to counts.
+    - top_n (int): Number of items to keep. None keeps them all.
+
+    Returns:
+    - ranked (list[tuple[Any, int]]): (name, count) pairs, most common first.
+    """
+    if top_n is None:
+        return sorted(counts.items(), key=itemgetter(1), reverse=True)
+    names = list(counts)
+    values = np.fromiter(counts.values(), dtype=np.int64, count=len(names))
+    return [(names[index], counts[names[index]])
+            for index in top_order(values, np.arange(len(names)), top_n).tolist()]
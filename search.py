@@ -0,0 +1,412 @@
+from array import array
+import re
+from typing import Any
+
+import numpy as np
+
+from cache import read_arrays, write_arrays
+from stream import iter_messages
+from table import ABSENT, Interner
+from tokenizer import BLOCK_SIZE, WORD_PATTERN, flatten_text
+import timestamps as ts
+
+# Bump whenever the layout of the index file changes.
+INDEX_VERSION = 1
+
+MAGIC = b'TGAINDEX'
+
+# Texts of a block are joined with a NUL, which no word contains, so the words of each
+# message can be told apart after a single regex call over the whole block.
+BOUNDARY = '\x00'
+TOKEN_PATTERN = re.compile(r'\w+|\x00')
+
+# A quoted phrase, or a single term or operator.
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def encode_varints(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Encode non-negative integers as variable-length bytes, 7 bits per byte.
+
+    Each byte holds 7 bits of the value, least significant first, with the high bit set on
+    every byte but the last, so small values such as the gaps between sorted ordinals take
+    a single byte.
+
+    Args:
+    - values (np.ndarray): Non-negative integers.
+
+    Returns:
+    - data (np.ndarray): The encoded bytes, as uint8.
+    - lengths (np.ndarray): Number of bytes of each value.
+    """
+    values = values.astype(np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        lengths += values >= np.uint64(1 << shift)
+    starts = np.cumsum(lengths) - lengths
+    owners = np.repeat(np.arange(len(values)), lengths)
+    digits = np.arange(int(lengths.sum())) - np.repeat(starts, lengths)
+    data = ((values[owners] >> (7 * digits).astype(np.uint64)) & np.uint64(0x7F)).astype(np.uint8)
+    data[digits < lengths[owners] - 1] |= 0x80
+    return data, lengths
+
+
+def decode_varints(data: np.ndarray) -> np.ndarray:
+    """
+    Decode bytes written by `encode_varints`.
+
+    Args:
+    - data (np.ndarray): The encoded bytes.
+
+    Returns:
+    - values (np.ndarray): The integers, as int64.
+    """
+    data = np.asarray(data)
+    if not (data >= 0x80).any():
+        return data.astype(np.int64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    digits = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    parts = (data & 0x7F).astype(np.uint64) << (7 * digits).astype(np.uint64)
+    return np.add.reduceat(parts, starts).astype(np.int64)
+
+
+def parse_query(query: str) -> list[list[list[str]]]:
+    """
+    Parse a search query into alternatives of phrases that must all occur.
+
+    Terms separated by spaces must all occur; `OR` separates alternatives and binds less
+    tightly, and double quotes group words into a phrase that must occur in that order.
+    A term such as "don't" that splits into several words is searched as a phrase.
+
+    Args:
+    - query (str): The query, such as `python "machine learning" OR rust`.
+
+    Returns:
+    - alternatives (list[list[list[str]]]): For each alternative, its phrases as lists of lowercase words.
+    """
+    alternatives = [[]]
+    for phrase, term in QUERY_PATTERN.findall(query):
+        if term == 'OR':
+            alternatives.append([])
+            continue
+        words = WORD_PATTERN.findall((phrase or term).lower())
+        if words:
+            alternatives[-1].append(words)
+    return [phrases for phrases in alternatives if phrases]
+
+
+def _distinct(values: np.ndarray) -> np.ndarray:
+    # The distinct values of a sorted array.
+    if len(values) == 0:
+        return values
+    return values[np.concatenate([[True], values[1:] != values[:-1]])]
+
+
+def _union(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    # The distinct values of two sorted arrays; a stable sort merges the two runs.
+    return _distinct(np.sort(np.concatenate([first, second]), kind='stable'))
+
+
+def _intersect(small: np.ndarray, large: np.ndarray) -> np.ndarray:
+    # The values of a sorted array found in another one, by binary search of the larger.
+    if len(small) == 0 or len(large) == 0:
+        return small[:0]
+    index = np.minimum(np.searchsorted(large, small), len(large) - 1)
+    return small[large[index] == small]
+
+
+class TextIndex:
+    """
+    An inverted index from words to the messages containing them, read from a file built by `build_index`.
+
+    Every occurrence of a word is a posting: the ordinal of its message (its position in
+    the export) and the position of the word in the message. The postings of each word are
+    sorted and stored as two streams of variable-length integers: the gaps between
+    ordinals, and the positions. Words are kept in UTF-8 byte order and looked up by binary
+    search, and the file is memory-mapped, so a query only reads the postings of its words.
+
+    Args:
+    - header (dict): The JSON header of the file.
+    - arrays (dict): The arrays of the file.
+    """
+
+    def __init__(self, header: dict, arrays: dict):
+        self.header = header
+        self.senders = header['senders']
+        self.sender_codes = {sender: code for code, sender in enumerate(self.senders)}
+        self.terms = arrays['terms']
+        self.term_offsets = arrays['term_offsets']
+        self.occurrences = arrays['occurrences']
+        self.ordinal_data = arrays['ordinal_data']
+        self.ordinal_offsets = arrays['ordinal_offsets']
+        self.position_data = arrays['position_data']
+        self.position_offsets = arrays['position_offsets']
+        self.ids = arrays['ids']
+        self.sender_column = arrays['senders']
+        self.timestamps = arrays['timestamps']
+
+    @classmethod
+    def open(cls, path: str) -> 'TextIndex':
+        """
+        Memory-map an index file.
+
+        Args:
+        - path (str): The path of the index.
+
+        Returns:
+        - index (TextIndex): The index.
+
+        Raises:
+        - ValueError: If the file is missing or is not an index of this version.
+        """
+        loaded = read_arrays(path, MAGIC, INDEX_VERSION)
+        if loaded is None:
+            raise ValueError(f"{path} is not a text index of version {INDEX_VERSION}")
+        return cls(*loaded)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def lookup(self, word: str) -> int:
+        """
+        Find a word by binary search.
+
+        Args:
+        - word (str): A lowercase word.
+
+        Returns:
+        - term (int): The index of the word, or `ABSENT` if no message contains it.
+        """
+        key = word.encode('utf-8')
+        low, high = 0, len(self.term_offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.terms[self.term_offsets[middle]:self.term_offsets[middle + 1]].tobytes() < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.term_offsets) - 1 and \
+                self.terms[self.term_offsets[low]:self.term_offsets[low + 1]].tobytes() == key:
+            return low
+        return ABSENT
+
+    def postings(self, term: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Decode the postings of a word.
+
+        Args:
+        - term (int): The index of the word, as returned by `lookup`.
+
+        Returns:
+        - ordinals (np.ndarray): The ordinal of the message of each occurrence, ascending.
+        - positions (np.ndarray): The position of each occurrence in its message.
+        """
+        positions = decode_varints(self.position_data[self.position_offsets[term]:self.position_offsets[term + 1]])
+        return self.ordinals(term), positions
+
+    def ordinals(self, term: int) -> np.ndarray:
+        """
+        Decode the message ordinals of the postings of a word, without their positions.
+
+        Args:
+        - term (int): The index of the word, as returned by `lookup`.
+
+        Returns:
+        - ordinals (np.ndarray): The ordinal of the message of each occurrence, ascending.
+        """
+        return np.cumsum(decode_varints(self.ordinal_data[self.ordinal_offsets[term]:self.ordinal_offsets[term + 1]]))
+
+    def phrase(self, words: list[str]) -> np.ndarray:
+        """
+        Find the messages containing words one after the other.
+
+        Args:
+        - words (list[str]): Lowercase words.
+
+        Returns:
+        - ordinals (np.ndarray): Ordinals of the matching messages, ascending.
+        """
+        terms = [self.lookup(word) for word in words]
+        if ABSENT in terms:
+            return np.zeros(0, dtype=np.int64)
+        if len(terms) == 1:
+            return _distinct(self.ordinals(terms[0]))
+        # An occurrence of the i-th word at position p starts the phrase at p - i: the
+        # phrase occurs where every word agrees on the (ordinal, start) pair.
+        matches = None
+        for offset in sorted(range(len(terms)), key=lambda offset: self.occurrences[terms[offset]]):
+            ordinals, positions = self.postings(terms[offset])
+            starts = positions - offset
+            keys = (ordinals[starts >= 0] << 32) | starts[starts >= 0]
+            matches = keys if matches is None else _intersect(matches, keys)
+        return _distinct(matches >> 32)
+
+    def search(self, query: str, sender: str | None = None, start: str | None = None,
+               end: str | None = None) -> np.ndarray:
+        """
+        Find the messages matching a query, see `parse_query`.
+
+        Args:
+        - query (str): The query.
+        - sender (str): Only keep messages whose `from` is this name.
+        - start (str): Only keep messages dated at or after this ISO 8601 date, such as '2023-03-01'.
+        - end (str): Only keep messages dated before this ISO 8601 date.
+
+        Returns:
+        - ordinals (np.ndarray): Ordinals of the matching messages, ascending.
+        """
+        matches = np.zeros(0, dtype=np.int64)
+        for phrases in parse_query(query):
+            # The rarest phrases first, so the intersections shrink quickly.
+            found = None
+            for words in sorted(phrases, key=lambda words: min(self.occurrences[term] if term != ABSENT else 0
+                                                             for term in map(self.lookup, words))):
+                ordinals = self.phrase(words)
+                found = ordinals if found is None else _intersect(found, ordinals)
+                if len(found) == 0:
+                    break
+            matches = _union(matches, found)
+
+        keep = np.ones(len(matches), dtype=bool)
+        if sender is not None:
+            keep &= self.sender_column[matches] == self.sender_codes.get(sender, len(self.senders))
+        timestamps = self.timestamps[matches]
+        if start is not None:
+            keep &= timestamps >= ts.parse_dates([start])[0]
+        if end is not None:
+            keep &= (timestamps < ts.parse_dates([end])[0]) & (timestamps != ts.MISSING)
+        return matches[keep]
+
+    def hits(self, ordinals: np.ndarray) -> list[dict]:
+        """
+        Describe matching messages.
+
+        Args:
+        - ordinals (np.ndarray): Ordinals returned by `search`.
+
+        Returns:
+        - hits (list[dict]): The ordinal, id, sender and date of each message.
+        """
+        hits = []
+        for ordinal, message_id, code, timestamp in zip(ordinals.tolist(), self.ids[ordinals].tolist(),
+                                                        self.sender_column[ordinals].tolist(),
+                                                        self.timestamps[ordinals].tolist()):
+            hits.append({
+                'ordinal': ordinal,
+                'id': message_id,
+                'from': self.senders[code] if code != ABSENT else None,
+                'date': str(np.datetime64(timestamp, 's')) if timestamp != ts.MISSING else None,
+            })
+        return hits
+
+
+def _tokenize_block(texts: list[str], vocabulary: dict, first_ordinal: int) -> tuple[np.ndarray, ...]:
+    joined = BOUNDARY.join(texts)
+    if joined.count(BOUNDARY) != len(texts) - 1:
+        joined = BOUNDARY.join(text.replace(BOUNDARY, ' ') for text in texts)
+    tokens = TOKEN_PATTERN.findall(joined.lower())
+    for token in dict.fromkeys(tokens):
+        if token not in vocabulary:
+            vocabulary[token] = len(vocabulary)
+    ids = np.fromiter(map(vocabulary.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+    boundaries = ids == 0
+    indices = np.arange(len(ids))
+    # Position of each token after the last boundary before it.
+    positions = indices - np.maximum.accumulate(np.where(boundaries, indices, -1)) - 1
+    ordinals = first_ordinal + np.cumsum(boundaries)
+    words = ~boundaries
+    return ids[words].astype(np.int32), ordinals[words].astype(np.int32), positions[words].astype(np.int32)
+
+
+def build_index(data: Any, path: str, block_size: int = BLOCK_SIZE) -> TextIndex:
+    """
+    Build the inverted index of the texts of an export and write it to a file.
+
+    Texts are tokenized like `get_most_common_words` does, a block at a time. Once the
+    number of occurrences of every word is known, the postings of each block are moved to
+    their place in the index and the block is freed, so all the postings are never held
+    twice or sorted together. Besides the postings, the file holds the id, sender and date
+    of every message, so searches can be filtered and described without the export.
+
+    Args:
+    - data: The messages, in any form accepted by `stream.iter_messages`.
+    - path (str): The path of the index file to write.
+    - block_size (int): Number of texts tokenized together.
+
+    Returns:
+    - index (TextIndex): The index, memory-mapped from the written file.
+    """
+    vocabulary = {BOUNDARY: 0}
+    senders = Interner()
+    ids, sender_codes = array('q'), array('i')
+    dates = ts.TimestampColumn(block_size)
+    blocks, texts = [], []
+
+    for message in iter_messages(data):
+        ids.append(message.get('id', ABSENT))
+        sender_codes.append(senders.code(message['from']) if 'from' in message else ABSENT)
+        dates.append(message)
+        text = message.get('text')
+        texts.append(text if type(text) is str else flatten_text(message))
+        if len(texts) >= block_size:
+            blocks.append(_tokenize_block(texts, vocabulary, len(ids) - len(texts)))
+            texts = []
+    if texts:
+        blocks.append(_tokenize_block(texts, vocabulary, len(ids) - len(texts)))
+
+    # Number the words in UTF-8 byte order, which is the order `lookup` searches in.
+    encoded = [word.encode('utf-8') for word in vocabulary]
+    order = sorted(range(1, len(encoded)), key=encoded.__getitem__)
+    rank = np.zeros(len(encoded), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+
+    occurrences = np.zeros(len(order), dtype=np.int64)
+    for terms, _, _ in blocks:
+        unique, counts = np.unique(rank[terms], return_counts=True)
+        occurrences[unique] += counts
+    first = np.cumsum(occurrences) - occurrences
+
+    # Blocks are moved in message order, and a stable sort keeps the postings of each word
+    # within a block in message order too, so every word's postings end up in message order.
+    filled = first.copy()
+    ordinals = np.empty(int(occurrences.sum()), dtype=np.int32)
+    positions = np.empty(len(ordinals), dtype=np.int32)
+    for index in range(len(blocks)):
+        terms, block_ordinals, block_positions = blocks[index]
+        blocks[index] = None
+        terms = rank[terms]
+        sort = np.argsort(terms, kind='stable')
+        terms = terms[sort]
+        unique, starts, counts = np.unique(terms, return_index=True, return_counts=True)
+        destinations = filled[terms] + np.arange(len(terms)) - np.repeat(starts, counts)
+        ordinals[destinations] = block_ordinals[sort]
+        positions[destinations] = block_positions[sort]
+        filled[unique] += counts
+
+    gaps = np.diff(ordinals.astype(np.int64), prepend=0)
+    gaps[first[occurrences > 0]] = ordinals[first[occurrences > 0]]
+
+    def streams(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        data, lengths = encode_varints(values)
+        ends = np.cumsum(lengths)[np.cumsum(occurrences) - 1] if len(values) else np.zeros(0, dtype=np.int64)
+        return data, np.concatenate([[0], ends]).astype(np.int64)
+
+    ordinal_data, ordinal_offsets = streams(gaps)
+    position_data, position_offsets = streams(positions)
+    term_data = b''.join(encoded[index] for index in order)
+    term_offsets = np.concatenate([[0], np.cumsum([len(encoded[index]) for index in order])]).astype(np.int64)
+
+    write_arrays(path, MAGIC, INDEX_VERSION, {'version': INDEX_VERSION, 'senders': senders.values}, {
+        'terms': np.frombuffer(term_data, dtype=np.uint8),
+        'term_offsets': term_offsets,
+        'occurrences': occurrences.astype(np.int64),
+        'ordinal_data': ordinal_data,
+        'ordinal_offsets': ordinal_offsets,
+        'position_data': position_data,
+        'position_offsets': position_offsets,
+        'ids': np.array(ids, dtype=np.int64),
+        'senders': np.array(sender_codes, dtype=np.int32),
+        'timestamps': dates.finish(),
+    })
+    return TextIndex.open(path)
@@ -0,0 +1,193 @@
+import numpy as np
+
+# Each (sender, day) pair is kept under one integer key: sender << DAY_BITS | day.
+DAY_BITS = 32
+DAY_MASK = (1 << DAY_BITS) - 1
+
+
+def rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Sum each value with the values of the days before it, over a trailing window.
+
+    Computed as the difference of two cumulative sums, so the cost does not depend on the window.
+
+    Args:
+    - values (np.ndarray): One value per day.
+    - window (int): Number of days summed, the current one included. The first days sum fewer.
+
+    Returns:
+    - sums (np.ndarray): The sum over the window ending at each day.
+    """
+    totals = np.concatenate(([0], np.cumsum(values)))
+    ends = np.arange(1, len(values) + 1)
+    return totals[ends] - totals[np.maximum(ends - window, 0)]
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Average each value with the values of the days before it, over a trailing window.
+
+    Args:
+    - values (np.ndarray): One value per day.
+    - window (int): Number of days averaged, the current one included. The first days average fewer.
+
+    Returns:
+    - means (np.ndarray): The mean over the window ending at each day.
+    """
+    return rolling_sum(values, window) / np.minimum(np.arange(1, len(values) + 1), window)
+
+
+def distinct_in_window(senders: np.ndarray, days: np.ndarray, length: int, window: int) -> np.ndarray:
+    """
+    Count the distinct senders active over a trailing window ending at each day.
+
+    A sender active on days a1 < a2 < ... counts for the windows ending from a1 until
+    a1 + window or a2, whichever comes first, then from a2 on, and so on. These intervals
+    are disjoint, so adding +1 at each start and -1 at each end and taking a cumulative sum
+    gives every window's count in time linear in the number of (sender, day) pairs and days.
+
+    Args:
+    - senders (np.ndarray): The sender of each distinct (sender, day) pair, sorted by sender then day.
+    - days (np.ndarray): The day of each pair, from 0 to `length - 1`.
+    - length (int): Number of days.
+    - window (int): Number of days per window, the current one included.
+
+    Returns:
+    - active (np.ndarray): The number of distinct senders in the window ending at each day.
+    """
+    following = np.full(len(days), length, dtype=np.int64)
+    same = senders[1:] == senders[:-1]
+    following[:-1][same] = days[1:][same]
+    ends = np.minimum(days + window, following)
+    changes = np.bincount(days, minlength=length + 1) - np.bincount(np.minimum(ends, length), minlength=length + 1)
+    return np.cumsum(changes[:length])
+
+
+class DailySeries:
+    """
+    Dense daily counts of messages, replies and forwards, and the senders active on each day.
+
+    Days are numbered since 1970-01-01. The counts are arrays over every day from the first
+    to the last dated message, days without messages included, and senders are kept as the
+    sorted set of distinct (sender, day) pairs, from which the distinct senders over any
+    window follow in one pass.
+
+    Args:
+    - first_day (int): The day of the first element of the arrays.
+    - messages (np.ndarray): Number of messages per day.
+    - replies (np.ndarray): Number of replies per day.
+    - forwards (np.ndarray): Number of forwarded messages per day.
+    - active (np.ndarray): Sorted keys of the distinct (sender, day) pairs, `sender << DAY_BITS | day`.
+    """
+
+    def __init__(self, first_day: int = 0, messages: np.ndarray | None = None, replies: np.ndarray | None = None,
+                 forwards: np.ndarray | None = None, active: np.ndarray | None = None):
+        empty = np.zeros(0, dtype=np.int64)
+        self.first_day = first_day
+        self.messages = messages if messages is not None else empty
+        self.replies = replies if replies is not None else empty
+        self.forwards = forwards if forwards is not None else empty
+        self.active = active if active is not None else empty
+
+    @classmethod
+    def from_counts(cls, days: np.ndarray, senders: np.ndarray, messages: np.ndarray, replies: np.ndarray,
+                    forwards: np.ndarray) -> 'DailySeries':
+        """
+        Build the series from counts per day and sender, one message per count or more.
+
+        Args:
+        - days (np.ndarray): The day of each count.
+        - senders (np.ndarray): The sender code of each count, negative where the messages have no sender.
+        - messages (np.ndarray): The number of messages of each count.
+        - replies (np.ndarray): The number of them that are replies.
+        - forwards (np.ndarray): The number of them that are forwarded.
+
+        Returns:
+        - series (DailySeries): The series.
+        """
+        days = np.asarray(days, dtype=np.int64)
+        if len(days) == 0:
+            return cls()
+        first_day = int(days.min())
+        offsets = days - first_day
+        length = int(offsets.max()) + 1
+        senders = np.asarray(senders, dtype=np.int64)
+        sent = senders >= 0
+
+        def per_day(values):
+            return np.bincount(offsets, weights=values, minlength=length).astype(np.int64)
+
+        # Sorting and dropping repeats is much faster than `np.unique` on a million keys.
+        pairs = np.sort(senders[sent] << DAY_BITS | days[sent])
+        pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+        return cls(first_day, per_day(messages), per_day(replies), per_day(forwards), pairs)
+
+    def merge(self, other: 'DailySeries', lookup: np.ndarray) -> 'DailySeries':
+        """
+        Combine with the series of other messages.
+
+        Args:
+        - other (DailySeries): The other series.
+        - lookup (np.ndarray): The code, in this series, of each sender code of `other`.
+
+        Returns:
+        - merged (DailySeries): The series over both.
+        """
+        renamed = lookup[other.active >> DAY_BITS] << DAY_BITS | (other.active & DAY_MASK)
+        if len(other.messages) == 0:
+            return self
+        if len(self.messages) == 0:
+            return DailySeries(other.first_day, other.messages, other.replies, other.forwards, np.unique(renamed))
+        first_day = min(self.first_day, other.first_day)
+        length = max(self.first_day + len(self.messages), other.first_day + len(other.messages)) - first_day
+        merged = []
+        for mine, theirs in ((self.messages, other.messages), (self.replies, other.replies),
+                             (self.forwards, other.forwards)):
+            values = np.zeros(length, dtype=np.int64)
+            values[self.first_day - first_day:self.first_day - first_day + len(mine)] += mine
+            values[other.first_day - first_day:other.first_day - first_day + len(theirs)] += theirs
+            merged.append(values)
+        return DailySeries(first_day, *merged, np.union1d(self.active, renamed))
+
+    def days(self) -> np.ndarray:
+        """
+        Return the day number of each element of the arrays.
+        """
+        return np.arange(self.first_day, self.first_day + len(self.messages))
+
+    def active_senders(self, window: int = 1) -> np.ndarray:
+        """
+        Count the distinct senders over a trailing window ending at each day.
+
+        Args:
+        - window (int): Number of days per window: 1 for daily, 7 for weekly and 30 for monthly active senders.
+
+        Returns:
+        - active (np.ndarray): The number of distinct senders of each window.
+        """
+        senders, days = self.active >> DAY_BITS, (self.active & DAY_MASK) - self.first_day
+        return distinct_in_window(senders, days, len(self.messages), window)
+
+    def get_state(self) -> dict:
+        """
+        Return the series as JSON-serialisable data.
+
+        Returns:
+        - state (dict): The first day, the daily counts and the (sender, day) pairs.
+        """
+        return {'first_day': self.first_day, 'messages': self.messages.tolist(), 'replies': self.replies.tolist(),
+                'forwards': self.forwards.tolist(), 'active': self.active.tolist()}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'DailySeries':
+        """
+        Rebuild a series from the data returned by `get_state`.
+
+        Args:
+        - state (dict): The serialised series.
+
+        Returns:
+        - series (DailySeries): The series.
+        """
+        return cls(state['first_day'], *(np.array(state[name], dtype=np.int64)
+                                         for name in ('messages', 'replies', 'forwards', 'active')))
@@ -0,0 +1,368 @@
+import base64
+from hashlib import blake2b
+import math
+from typing import Any
+
+import numpy as np
+
+from ranking import top_order
+
+
+def key_hash(key: Any) -> int:
+    """
+    Hash a key to 64 bits, identically in every process.
+
+    Python's `hash` of a string changes between processes, which would make sketches
+    built by different workers impossible to merge.
+
+    Args:
+    - key: A word or a name.
+
+    Returns:
+    - hash (int): The 64-bit hash.
+    """
+    data = key.encode('utf-8') if isinstance(key, str) else repr(key).encode('utf-8')
+    return int.from_bytes(blake2b(data, digest_size=8).digest(), 'little')
+
+
+class HeavyHitters:
+    """
+    Approximate counts of the most frequent keys in a fixed amount of memory.
+
+    Counts are kept in a Count-Min sketch: `depth` rows of `width` counters, each key
+    adding to one counter per row, its estimate being the smallest of them. An estimate
+    is never below the true count and, with probability `1 - delta`, exceeds it by at
+    most `epsilon` times the total count, where `epsilon = e / width`.
+
+    Alongside the sketch, at most `capacity` candidate keys with the highest estimates
+    are remembered, which is what the ranking is drawn from.
+
+    The width is `e / epsilon`, reduced if needed to fit the sketch in `memory` bytes; the
+    achieved `epsilon` is then larger than asked for, and is what `error` reports.
+
+    Args:
+    - epsilon (float): Target error, as a fraction of the total count.
+    - delta (float): Probability of exceeding the error.
+    - memory (int): Maximum size of the sketch in bytes. None leaves it unbounded.
+    - capacity (int): Number of candidate keys kept for the ranking.
+    """
+
+    def __init__(self, epsilon: float = 1e-4, delta: float = 0.01, memory: int | None = None,
+                 capacity: int = 1000):
+        depth = max(1, math.ceil(math.log(1 / delta)))
+        width = math.ceil(math.e / epsilon)
+        if memory is not None:
+            width = min(width, memory // (depth * np.dtype(np.int64).itemsize))
+        if width < 1:
+            raise ValueError(f"A sketch with {depth} rows does not fit in {memory} bytes")
+        self.delta = delta
+        self.capacity = capacity
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+        # Candidate keys and their hashes, in order of first occurrence.
+        self.candidates = {}
+        self.threshold = 0
+
+    @property
+    def depth(self) -> int:
+        return self.table.shape[0]
+
+    @property
+    def width(self) -> int:
+        return self.table.shape[1]
+
+    def _cells(self, hashes: np.ndarray) -> np.ndarray:
+        # One counter per row from two 32-bit halves of the hash (Kirsch-Mitzenmacher).
+        low, high = hashes & 0xFFFFFFFF, hashes >> np.uint64(32)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((low[None, :] + rows * high[None, :]) % np.uint64(self.width)).astype(np.int64)
+
+    def estimates(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Estimate the counts of keys from their hashes.
+
+        Args:
+        - hashes (np.ndarray): The keys' hashes, as returned by `key_hash`.
+
+        Returns:
+        - estimates (np.ndarray): An upper bound of each key's count.
+        """
+        if len(hashes) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return self.table[np.arange(self.depth)[:, None], self._cells(hashes)].min(axis=0)
+
+    def update(self, counts: dict):
+        """
+        Add the exact counts of a block of keys.
+
+        Args:
+        - counts (dict): Dictionary mapping keys to how many times they occurred in the block.
+        """
+        if not counts:
+            return
+        keys = list(counts)
+        hashes = np.fromiter((key_hash(key) for key in keys), dtype=np.uint64, count=len(keys))
+        values = np.fromiter(counts.values(), dtype=np.int64, count=len(keys))
+        cells = self._cells(hashes) + (np.arange(self.depth) * self.width)[:, None]
+        np.add.at(self.table.reshape(-1), cells.reshape(-1), np.tile(values, self.depth))
+        self.total += int(values.sum())
+
+        estimates = self.estimates(hashes)
+        for index in np.flatnonzero(estimates >= max(self.threshold, 1)).tolist():
+            self.candidates.setdefault(keys[index], int(hashes[index]))
+        if len(self.candidates) > 2 * self.capacity:
+            self._prune()
+
+    def _prune(self):
+        keys = list(self.candidates)
+        estimates = self.estimates(np.array(list(self.candidates.values()), dtype=np.uint64))
+        kept = np.sort(top_order(estimates, np.arange(len(keys)), self.capacity))
+        self.candidates = {keys[index]: self.candidates[keys[index]] for index in kept.tolist()}
+        self.threshold = int(estimates[kept].min()) if len(kept) == self.capacity else 0
+
+    def merge(self, other: 'HeavyHitters'):
+        """
+        Add the counts of another sketch of the same shape.
+
+        Args:
+        - other (HeavyHitters): Counts taken over other messages.
+        """
+        if self.table.shape != other.table.shape:
+            raise ValueError(f"Cannot merge a {other.table.shape} sketch into a {self.table.shape} one")
+        self.table += other.table
+        self.total += other.total
+        for key, hashed in other.candidates.items():
+            self.candidates.setdefault(key, hashed)
+        self.threshold = 0
+        self._prune()
+
+    def top(self, top_n: int | None = None) -> list[tuple[Any, int]]:
+        """
+        Rank the candidate keys by estimated count, ties broken by first occurrence.
+
+        Args:
+        - top_n (int): Number of keys to return. None returns every candidate.
+
+        Returns:
+        - ranked (list[tuple[Any, int]]): (key, estimated count) pairs, highest first.
+        """
+        keys = list(self.candidates)
+        estimates = self.estimates(np.array(list(self.candidates.values()), dtype=np.uint64))
+        order = top_order(estimates, np.arange(len(keys)), top_n)
+        return [(keys[index], int(estimates[index])) for index in order.tolist()]
+
+    def error(self) -> dict:
+        """
+        Report the error guaranteed for the estimates.
+
+        Returns:
+        - error (dict): `epsilon`, the achieved error as a fraction of the total count;
+          `error_bound`, the corresponding number of occurrences an estimate may exceed
+          its true count by; `confidence`, the probability that it does not; `total`; and
+          `memory_bytes`, the size of the sketch.
+        """
+        epsilon = math.e / self.width
+        return {
+            'epsilon': epsilon,
+            'error_bound': math.ceil(epsilon * self.total),
+            'confidence': 1 - self.delta,
+            'total': self.total,
+            'memory_bytes': self.table.nbytes,
+        }
+
+    def get_state(self) -> dict:
+        return {
+            'delta': self.delta,
+            'capacity': self.capacity,
+            'shape': list(self.table.shape),
+            # The table can be megabytes; base64 keeps it compact in JSON partials.
+            'table': base64.b64encode(self.table.tobytes()).decode('ascii'),
+            'total': self.total,
+            'candidates': list(self.candidates.items()),
+            'threshold': self.threshold,
+        }
+
+    def set_state(self, state: dict):
+        self.delta = state['delta']
+        self.capacity = state['capacity']
+        self.table = np.frombuffer(base64.b64decode(state['table']), dtype=np.int64).reshape(state['shape']).copy()
+        self.total = state['total']
+        self.candidates = {key: hashed for key, hashed in state['candidates']}
+        self.threshold = state['threshold']
+
+
+def register_ranks(hashes: np.ndarray, precision: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Split 64-bit hashes into a HyperLogLog register index and rank.
+
+    The first `precision` bits pick the register; the rank is the position of the first set
+    bit among the others, found from float exponents so no Python loop is involved.
+
+    Args:
+    - hashes (np.ndarray): The uint64 hashes of the keys.
+    - precision (int): Number of index bits.
+
+    Returns:
+    - index (np.ndarray): The register of each hash.
+    - rank (np.ndarray): The rank of each hash, from 1 to `65 - precision`.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+    # Converted in two halves, each exact in a float64.
+    high = (rest >> np.uint64(32)).astype(np.float64)
+    low = (rest & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    bits = np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1])
+    return index, (64 - precision - bits + 1).astype(np.uint8)
+
+
+def estimate_distinct(registers: np.ndarray) -> np.ndarray:
+    """
+    Estimate the number of distinct keys from HyperLogLog registers.
+
+    Args:
+    - registers (np.ndarray): A (..., m) array of registers; every row is estimated.
+
+    Returns:
+    - estimates (np.ndarray): The estimated number of distinct keys of each row.
+    """
+    m = registers.shape[-1]
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=-1)
+    zeros = np.count_nonzero(registers == 0, axis=-1)
+    # Below 2.5 m, counting the empty registers (linear counting) is more accurate.
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+class DailyDistinct:
+    """
+    Approximate numbers of distinct keys, such as senders, per day, mergeable over any days.
+
+    Each day holds a HyperLogLog sketch: `2 ** precision` one-byte registers, whatever the
+    number of keys. The sketch of several days, weeks, shards or chats is the element-wise
+    maximum of theirs, so distinct counts over any period or date range come from the daily
+    sketches without the keys. Estimates have a relative standard error of
+    `1.04 / sqrt(2 ** precision)`.
+
+    Args:
+    - error (float): Target relative standard error; sets the precision. Defaults to 0.02.
+    """
+
+    # How each period groups day numbers, and the first day of each group.
+    periods_by = {
+        'day': (lambda days: days, lambda keys: keys),
+        'week': (lambda days: (days + 3) // 7, lambda keys: keys * 7 - 3),
+        'month': (lambda days: days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64),
+                  lambda keys: keys.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)),
+    }
+
+    def __init__(self, error: float = 0.02):
+        self.precision = min(18, max(4, math.ceil(2 * math.log2(1.04 / error))))
+        self.days = np.zeros(0, dtype=np.int64)
+        self.registers = np.zeros((0, 1 << self.precision), dtype=np.uint8)
+
+    def error(self) -> float:
+        """
+        Return the relative standard error of the estimates.
+        """
+        return 1.04 / math.sqrt(1 << self.precision)
+
+    def _rows(self, days: np.ndarray) -> np.ndarray:
+        # Rows of the given days, adding empty registers for new ones.
+        new = np.setdiff1d(days, self.days)
+        if len(new):
+            merged = np.union1d(self.days, new)
+            registers = np.zeros((len(merged), self.registers.shape[1]), dtype=np.uint8)
+            registers[np.searchsorted(merged, self.days)] = self.registers
+            self.days, self.registers = merged, registers
+        return np.searchsorted(self.days, days)
+
+    def add(self, days: np.ndarray, hashes: np.ndarray):
+        """
+        Record keys seen on some days.
+
+        Args:
+        - days (np.ndarray): The day number of each key, since 1970-01-01.
+        - hashes (np.ndarray): The 64-bit hash of each key, from `key_hash`.
+        """
+        days = np.asarray(days, dtype=np.int64)
+        if len(days) == 0:
+            return
+        distinct, inverse = np.unique(days, return_inverse=True)
+        rows = self._rows(distinct)[inverse]
+        index, rank = register_ranks(hashes, self.precision)
+        np.maximum.at(self.registers.reshape(-1), rows * self.registers.shape[1] + index, rank)
+
+    def merge(self, other: 'DailyDistinct'):
+        """
+        Fold in the sketches of other keys, such as those of another shard or chat.
+
+        Args:
+        - other (DailyDistinct): Sketches with the same precision.
+
+        Raises:
+        - ValueError: If the precisions differ.
+        """
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge sketches of precision {self.precision} and {other.precision}")
+        rows = self._rows(other.days)
+        self.registers[rows] = np.maximum(self.registers[rows], other.registers)
+
+    def count(self, start: int | str | None = None, end: int | str | None = None) -> float:
+        """
+        Estimate the number of distinct keys over a range of days.
+
+        Args:
+        - start (int | str): First day of the range, as a day number or an ISO 8601 date such as
+          '2023-07-01'. None starts with the first day.
+        - end (int | str): Day just past the range. None ends with the last day.
+
+        Returns:
+        - count (float): The estimated number of distinct keys.
+        """
+        start, end = (np.datetime64(day).astype('datetime64[D]').astype(np.int64) if isinstance(day, str) else day
+                      for day in (start, end))
+        low = 0 if start is None else int(np.searchsorted(self.days, start))
+        high = len(self.days) if end is None else int(np.searchsorted(self.days, end))
+        if high <= low:
+            return 0.0
+        return float(estimate_distinct(self.registers[low:high].max(axis=0)))
+
+    def periods(self, period: str = 'day') -> tuple[np.ndarray, np.ndarray]:
+        """
+        Estimate the number of distinct keys per day, week or month.
+
+        Args:
+        - period (str): 'day', 'week' (starting on Monday) or 'month'.
+
+        Returns:
+        - starts (np.ndarray): The first day number of each period with keys.
+        - counts (np.ndarray): The estimated number of distinct keys in each period.
+
+        Raises:
+        - ValueError: If the period is unknown.
+        """
+        if period not in self.periods_by:
+            raise ValueError(f"Unknown period {period!r}; expected one of {', '.join(self.periods_by)}")
+        group, first_day = self.periods_by[period]
+        keys = group(self.days)
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        if len(starts) == 0:
+            return self.days, np.zeros(0)
+        registers = np.maximum.reduceat(self.registers, starts, axis=0)
+        return first_day(keys[starts]), estimate_distinct(registers)
+
+    def get_state(self) -> dict:
+        return {
+            'precision': self.precision,
+            'days': self.days.tolist(),
+            # One row of registers per day; base64 keeps them compact in JSON partials.
+            'registers': base64.b64encode(self.registers.tobytes()).decode('ascii'),
+        }
+
+    def set_state(self, state: dict):
+        self.precision = state['precision']
+        self.days = np.array(state['days'], dtype=np.int64)
+        registers = np.frombuffer(base64.b64decode(state['registers']), dtype=np.uint8)
+        self.registers = registers.reshape(len(self.days), 1 << self.precision).copy()
@@ -0,0 +1,361 @@
+from contextlib import closing
+import copy
+import json
+import os
+import sqlite3
+from typing import Any, Iterator
+
+import numpy as np
+
+from stream import iter_messages
+import timestamps as ts
+
+
+# Bump whenever the schema changes.
+STORE_VERSION = 2
+
+TEXT_ABSENT = -1
+TEXT_PLAIN = 0
+TEXT_RICH = 1
+
+SCHEMA = '''
+CREATE TABLE chat (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE messages (
+    ordinal INTEGER PRIMARY KEY,
+    id INTEGER,
+    timestamp INTEGER,
+    utc INTEGER,
+    has_from INTEGER NOT NULL,
+    sender TEXT,
+    from_id TEXT,
+    reply_to_message_id INTEGER,
+    has_forward INTEGER NOT NULL,
+    forwarded_from TEXT,
+    edited INTEGER,
+    text_kind INTEGER NOT NULL,
+    text TEXT,
+    text_length INTEGER NOT NULL,
+    parts_length INTEGER NOT NULL
+);
+'''
+
+INDEXES = '''
+CREATE INDEX messages_timestamp ON messages (timestamp);
+CREATE INDEX messages_sender ON messages (sender, has_from, timestamp);
+CREATE INDEX messages_reply_to ON messages (reply_to_message_id);
+CREATE INDEX messages_forwarded_from ON messages (forwarded_from);
+'''
+
+INSERT = 'INSERT INTO messages VALUES (' + ', '.join('?' * 15) + ')'
+
+# Messages are counted per quarter hour of their timestamp: every hour, day, month and
+# year is made of whole quarter hours, so these counts give all the calendar histograms.
+# UTC offsets are whole quarter hours too, so they convert exactly to any time zone.
+BUCKET_SECONDS = 900
+
+
+def bucket_expression(tz: str | float | None = None) -> str:
+    """
+    Return the SQL expression of the quarter hour each message is counted in.
+
+    Without a time zone, that is the quarter hour of its timestamp. With one, it is that of
+    its UTC time, and, for messages without one, the bitwise complement of the quarter hour
+    of their timestamp, so `bucket_starts` tells the two apart.
+
+    Args:
+    - tz (str | float): The time zone the counts will be converted to, as accepted by `ts.localize`.
+
+    Returns:
+    - expression (str): The SQL expression.
+    """
+    if tz is None:
+        return f'timestamp / {BUCKET_SECONDS}'
+    return f'CASE WHEN utc IS NULL THEN ~(timestamp / {BUCKET_SECONDS}) ELSE utc / {BUCKET_SECONDS} END'
+
+
+def bucket_starts(buckets: Any, tz: str | float | None = None) -> np.ndarray:
+    """
+    Return the local time at which each quarter hour selected with `bucket_expression` starts.
+
+    Args:
+    - buckets: The selected quarter hours.
+    - tz (str | float): The time zone passed to `bucket_expression`.
+
+    Returns:
+    - starts (np.ndarray): The timestamps, on the wall clock of `tz` or of the export.
+    """
+    buckets = np.asarray(buckets, dtype=np.int64)
+    if tz is None:
+        return buckets * BUCKET_SECONDS
+    starts = ~buckets * BUCKET_SECONDS
+    utc = buckets >= 0
+    starts[utc] = ts.localize(buckets[utc] * BUCKET_SECONDS, tz)
+    return starts
+
+
+def _row(ordinal: int, message: dict) -> tuple:
+    text = message.get('text')
+    if 'text' not in message:
+        text_kind, stored_text, parts_length = TEXT_ABSENT, None, 0
+    elif isinstance(text, str):
+        text_kind, stored_text, parts_length = TEXT_PLAIN, text, len(text)
+    else:
+        text_kind, stored_text = TEXT_RICH, json.dumps(text, ensure_ascii=False)
+        parts_length = sum(len(part['text']) for part in text if isinstance(part, dict))
+    return (ordinal, message.get('id'), None, None, int('from' in message), message.get('from'), message.get('from_id'),
+            message.get('reply_to_message_id'), int('forwarded_from' in message), message.get('forwarded_from'),
+            None, text_kind, stored_text, len(text) if text is not None else 0, parts_length)
+
+
+def _with_timestamps(rows: list, dates: ts.TimestampColumn, edits: ts.TimestampColumn) -> list:
+    timestamps, utc, edited = dates.finish().tolist(), dates.finish_utc().tolist(), edits.finish().tolist()
+    return [row[:2] + (None if timestamp == ts.MISSING else timestamp, None if unixtime == ts.MISSING else unixtime) +
+            row[4:10] + (None if edit == ts.MISSING else edit,) + row[11:]
+            for row, timestamp, unixtime, edit in zip(rows, timestamps, utc, edited)]
+
+
+def import_export(data: Any, db_path: str, batch_size: int = 10000) -> 'MessageStore':
+    """
+    Bulk-load an export into a SQLite database.
+
+    Messages are inserted in batches with `executemany` inside a single transaction, and
+    the indexes on timestamp, sender, `reply_to_message_id` and `forwarded_from` are built
+    once all rows are in. The database is written to a temporary file and renamed into place.
+
+    Args:
+    - data: The JSON data, a `ChatStream`, or an iterable of messages.
+    - db_path (str): The path of the database file to create.
+    - batch_size (int): Number of messages inserted per `executemany` call.
+
+    Returns:
+    - store (MessageStore): The imported messages.
+    """
+    header = {key: value for key, value in data.items() if key != 'messages'} if isinstance(data, dict) \
+        else dict(getattr(data, 'header', {}))
+    temporary_path = f'{db_path}.{os.getpid()}.tmp'
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+    try:
+        # Closed before the rename, which fails on Windows while the file is open.
+        with closing(sqlite3.connect(temporary_path)) as connection:
+            connection.execute('PRAGMA journal_mode = OFF')
+            connection.execute('PRAGMA synchronous = OFF')
+            with connection:
+                connection.executescript(SCHEMA)
+                connection.executemany('INSERT INTO chat VALUES (?, ?)',
+                                       [(key, json.dumps(value, ensure_ascii=False)) for key, value in header.items()])
+                connection.execute('INSERT INTO chat VALUES (?, ?)', ('_store_version', json.dumps(STORE_VERSION)))
+                rows, dates, edits = [], ts.TimestampColumn(batch_size), ts.TimestampColumn(batch_size)
+                for ordinal, message in enumerate(iter_messages(data)):
+                    rows.append(_row(ordinal, message))
+                    dates.append(message)
+                    edits.append_date(message.get('edited'))
+                    if len(rows) >= batch_size:
+                        connection.executemany(INSERT, _with_timestamps(rows, dates, edits))
+                        rows, dates, edits = [], ts.TimestampColumn(batch_size), ts.TimestampColumn(batch_size)
+                if rows:
+                    connection.executemany(INSERT, _with_timestamps(rows, dates, edits))
+                connection.executescript(INDEXES)
+        os.replace(temporary_path, db_path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+    return MessageStore(db_path)
+
+
+class MessageStore:
+    """
+    An export imported into a SQLite database with `import_export`.
+
+    A `MessageStore` can be passed to every analysis function in `tool.py`. Counts,
+    rankings and histograms are answered with indexed `GROUP BY` queries; the few metrics
+    that need every message text (such as word counts) read the rows back.
+
+    `filter` narrows a store to a sender and/or a date range, so ad hoc questions such as
+    "reply counts for user X in March 2023" only touch the matching rows. Views share the
+    connection of the store they were filtered from; `close` it, or use the store as a
+    context manager, once done.
+
+    Args:
+    - db_path (str): The path of the database file.
+    - where (str): SQL condition selecting the messages of this view.
+    - params (tuple): Parameters of `where`.
+    """
+
+    def __init__(self, db_path: str, where: str = '1', params: tuple = ()):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"No such database: '{db_path}'")
+        self.db_path = db_path
+        self.where = where
+        self.params = params
+        self.connection = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        try:
+            self.header = {key: json.loads(value)
+                           for key, value in self.connection.execute('SELECT key, value FROM chat')}
+            if self.header.pop('_store_version', None) != STORE_VERSION:
+                raise ValueError(f"{db_path} was written by another version of the message store")
+        except (ValueError, sqlite3.Error):
+            self.connection.close()
+            raise
+
+    def close(self):
+        """
+        Close the database connection, shared by this store and every view filtered from it.
+        """
+        self.connection.close()
+
+    def __enter__(self) -> 'MessageStore':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def filter(self, sender: str | None = None, start: str | None = None, end: str | None = None) -> 'MessageStore':
+        """
+        Return a view of the messages of one sender and/or within a date range.
+
+        The view queries the database through this store's connection rather than opening its own.
+
+        Args:
+        - sender (str): Only keep messages whose `from` is this name.
+        - start (str): Only keep messages dated at or after this ISO 8601 date, such as '2023-03-01'.
+        - end (str): Only keep messages dated before this ISO 8601 date.
+
+        Returns:
+        - store (MessageStore): The narrowed view.
+        """
+        conditions, params = [self.where], list(self.params)
+        if sender is not None:
+            conditions.append('sender = ?')
+            params.append(sender)
+        for bound, operator in ((start, '>='), (end, '<')):
+            if bound is not None:
+                conditions.append(f'timestamp {operator} ?')
+                params.append(int(ts.parse_dates([bound])[0]))
+        view = copy.copy(self)
+        view.where = ' AND '.join(f'({condition})' for condition in conditions)
+        view.params = tuple(params)
+        return view
+
+    def select(self, expressions: str, condition: str = '1', tail: str = '') -> sqlite3.Cursor:
+        """
+        Run a query over the messages of this view.
+
+        Args:
+        - expressions (str): The expressions to select.
+        - condition (str): An extra SQL condition on the messages.
+        - tail (str): `GROUP BY` / `ORDER BY` clauses.
+
+        Returns:
+        - cursor (sqlite3.Cursor): The result rows.
+        """
+        return self.connection.execute(
+            f'SELECT {expressions} FROM messages WHERE ({self.where}) AND ({condition}) {tail}', self.params)
+
+    def count(self, condition: str = '1') -> int:
+        return self.select('COUNT(*)', condition).fetchone()[0]
+
+    def counts_by_name(self, column: str, condition: str = '1') -> dict:
+        """
+        Count messages per value of a column, in order of first occurrence.
+
+        NULL values are reported as 'Deleted Account', matching how the ranking functions
+        in `tool.py` name senders.
+
+        Args:
+        - column (str): The column to group by, such as 'sender'.
+        - condition (str): SQL condition selecting the messages to count.
+
+        Returns:
+        - counts (dict): Dictionary mapping each name to its number of messages.
+        """
+        # The unary plus stops SQLite from grouping by walking the column's index, which
+        # costs one random row lookup per message; scanning and sorting is much faster.
+        rows = self.select(f'{column}, COUNT(*), MIN(ordinal)', condition, f'GROUP BY +{column}').fetchall()
+        counts = {}
+        for name, count, _ in sorted(rows, key=lambda row: row[2]):
+            name = name if name is not None else 'Deleted Account'
+            counts[name] = counts.get(name, 0) + count
+        return counts
+
+    def time_counts(self, group: str | None = None, condition: str = '1',
+                    tz: str | float | None = None) -> tuple[list, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Count dated messages per quarter hour, and optionally per value of an expression.
+
+        Args:
+        - group (str): SQL expression to group by as well, such as 'sender'.
+        - condition (str): SQL condition selecting the messages to count.
+        - tz (str | float): Time zone to convert the quarter hours to, as accepted by `ts.localize`.
+          None keeps the export's wall clock.
+
+        Returns:
+        - groups (list): The value of `group` for each count; empty without `group`.
+        - starts (np.ndarray): The timestamp at which the quarter hour of each count starts. The same
+          quarter hour may be counted twice with `tz`: once for messages with a UTC time and once without.
+        - counts (np.ndarray): The number of messages of each count.
+        - first (np.ndarray): The ordinal of the first message of each count.
+        """
+        grouped = f'{group} AS grouped, ' if group is not None else ''
+        rows = self.select(f'{grouped}{bucket_expression(tz)} AS bucket, COUNT(*), MIN(ordinal)',
+                           f'timestamp IS NOT NULL AND ({condition})',
+                           f"GROUP BY {'grouped, ' if group is not None else ''}bucket").fetchall()
+        columns = list(zip(*rows)) or [()] * (4 if group is not None else 3)
+        groups = list(columns.pop(0)) if group is not None else []
+        starts, counts, first = (np.array(column, dtype=np.int64) for column in columns)
+        return groups, bucket_starts(starts, tz), counts, first
+
+    def rows(self, block_size: int = 65536, condition: str = '1', tail: str = 'ORDER BY ordinal') -> Iterator[dict]:
+        """
+        Rebuild the messages as dictionaries holding the fields kept in the store.
+
+        Args:
+        - block_size (int): Number of rows fetched and whose dates are formatted at a time.
+        - condition (str): An extra SQL condition on the messages.
+        - tail (str): The `ORDER BY` / `LIMIT` clauses. Defaults to export order.
+
+        Returns:
+        - messages (Iterator[dict]): The messages, in export order unless `tail` orders them otherwise.
+        """
+        cursor = self.select('id, timestamp, utc, has_from, sender, from_id, reply_to_message_id, has_forward, '
+                             'forwarded_from, edited, text_kind, text', condition, tail)
+        while True:
+            block = cursor.fetchmany(block_size)
+            if not block:
+                return
+            dates = np.array([row[1] if row[1] is not None else ts.MISSING for row in block], dtype=np.int64)
+            edits = np.array([row[9] if row[9] is not None else ts.MISSING for row in block], dtype=np.int64)
+            dates = dates.astype('datetime64[s]').astype(str).tolist()
+            edits = edits.astype('datetime64[s]').astype(str).tolist()
+            for row, date, edit in zip(block, dates, edits):
+                id, timestamp, utc, has_from, sender, from_id, reply_to, has_forward, forwarded_from, edited = row[:10]
+                kind, text = row[10:]
+                message = {'id': id}
+                if timestamp is not None:
+                    message['date'] = date
+                if utc is not None:
+                    message['date_unixtime'] = str(utc)
+                if has_from:
+                    message['from'] = sender
+                if from_id is not None:
+                    message['from_id'] = from_id
+                if reply_to is not None:
+                    message['reply_to_message_id'] = reply_to
+                if has_forward:
+                    message['forwarded_from'] = forwarded_from
+                if edited is not None:
+                    message['edited'] = edit
+                if kind != TEXT_ABSENT:
+                    message['text'] = text if kind == TEXT_PLAIN else json.loads(text)
+                yield message
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == 'messages':
+            return self.rows()
+        return self.header.get(key, default)
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __iter__(self) -> Iterator[dict]:
+        return self.rows()
@@ -0,0 +1,258 @@
+import json
+from typing import Any, Iterable, Iterator, TextIO
+
+from compression import open_text
+
+
+WHITESPACE = ' \t\n\r'
+
+
+class JsonStreamReader:
+    """
+    Incremental reader for a JSON document read from a text stream.
+
+    Only the part of the document currently being decoded is kept in memory, so arrays
+    with millions of elements can be walked one element at a time.
+
+    Args:
+    - f (TextIO): The text stream to read from.
+    - chunk_size (int): Number of characters read from the stream at a time.
+    """
+
+    def __init__(self, f: TextIO, chunk_size: int = 1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and return the next character without consuming it.
+
+        Returns:
+        - char (str): The next character, or an empty string at the end of the stream.
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char: str):
+        """
+        Consume the next non-whitespace character, which must be `char`.
+
+        Args:
+        - char (str): The expected character.
+        """
+        found = self.peek()
+        if found != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.buffer, self.pos)
+        self.pos += 1
+
+    def read_value(self) -> Any:
+        """
+        Decode the next complete JSON value.
+
+        Returns:
+        - value (Any): The decoded value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof or not self._fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may continue in the next chunk.
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def iter_object(self) -> Iterator[str]:
+        """
+        Walk the members of the next JSON object.
+
+        Each key is yielded before its value is read; the caller must consume the value
+        (with `read_value`, `iter_array` or `iter_object`) before resuming the iterator.
+
+        Returns:
+        - keys (Iterator[str]): The member keys in document order.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect('}')
+            return
+
+    def iter_array(self) -> Iterator[Any]:
+        """
+        Decode the elements of the next JSON array one at a time.
+
+        Returns:
+        - values (Iterator[Any]): The decoded elements in document order.
+        """
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.read_value()
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect(']')
+            return
+
+
+class ChatStream:
+    """
+    A Telegram chat export whose messages are streamed from disk on demand.
+
+    The chat header fields (`name`, `type`, `id`, ...) are parsed when the stream is
+    created; each iteration over the messages re-reads the file, so memory use does not
+    grow with the size of the export. A `ChatStream` can be passed to every analysis
+    function in `tool.py` in place of the dictionary returned by `load_json`.
+
+    Compressed exports (`result.json.gz`, `.xz`, `.zst`, `.bz2`) are decompressed on the
+    fly while they are read.
+
+    Args:
+    - file_path (str): The path to the JSON file, possibly compressed.
+    - chunk_size (int): Number of characters read from the file at a time.
+    """
+
+    def __init__(self, file_path: str, chunk_size: int = 1 << 20):
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.header = self._read_header()
+
+    def _open(self) -> TextIO:
+        return open_text(self.file_path)
+
+    def _read_header(self) -> dict:
+        header = {}
+        with self._open() as f:
+            reader = JsonStreamReader(f, self.chunk_size)
+            for key in reader.iter_object():
+                if key == 'messages':
+                    break
+                header[key] = reader.read_value()
+        return header
+
+    def messages(self) -> Iterator[dict]:
+        """
+        Yield the messages of the chat one by one.
+
+        Returns:
+        - messages (Iterator[dict]): The messages in export order.
+        """
+        with self._open() as f:
+            reader = JsonStreamReader(f, self.chunk_size)
+            for key in reader.iter_object():
+                if key == 'messages':
+                    yield from reader.iter_array()
+                    return
+                reader.read_value()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == 'messages':
+            return self.messages()
+        return self.header.get(key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'messages':
+            return self.messages()
+        return self.header[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key == 'messages' or key in self.header
+
+    def __iter__(self) -> Iterator[dict]:
+        return self.messages()
+
+
+def is_account_export(file_path: str) -> bool:
+    """
+    Tell whether a file is a full-account export rather than a single-chat export.
+
+    Full-account exports hold their chats under `chats.list` instead of a top-level
+    `messages` array. Only the top-level keys before either of them are read.
+
+    Args:
+    - file_path (str): The path to the JSON file.
+
+    Returns:
+    - is_account_export (bool): True if the file has a `chats` section.
+    """
+    with open_text(file_path) as f:
+        reader = JsonStreamReader(f)
+        for key in reader.iter_object():
+            if key in ('chats', 'messages'):
+                return key == 'chats'
+            reader.read_value()
+    return False
+
+
+def iter_chats(file_path: str, chunk_size: int = 1 << 20) -> Iterator[dict]:
+    """
+    Yield the chats of a full-account export one at a time.
+
+    Only the chat being yielded is held in memory.
+
+    Args:
+    - file_path (str): The path to the JSON file.
+    - chunk_size (int): Number of characters read from the file at a time.
+
+    Returns:
+    - chats (Iterator[dict]): The chats under `chats.list`, each shaped like a single-chat export.
+    """
+    with open_text(file_path) as f:
+        reader = JsonStreamReader(f, chunk_size)
+        for key in reader.iter_object():
+            if key != 'chats':
+                reader.read_value()
+                continue
+            for section in reader.iter_object():
+                if section == 'list':
+                    yield from reader.iter_array()
+                else:
+                    reader.read_value()
+            return
+
+
+def iter_messages(data: Any) -> Iterable[dict]:
+    """
+    Return the messages of an export, whatever form it was loaded in.
+
+    Args:
+    - data: The dictionary returned by `load_json`, a `ChatStream`, a `MessageTable`, or
+      any iterable of message dictionaries (for example `ChatStream.messages()`).
+
+    Returns:
+    - messages (Iterable[dict]): The messages of the export.
+    """
+    if hasattr(data, 'get'):
+        return data.get('messages', [])
+    return data
@@ -0,0 +1,358 @@
+from array import array
+import json
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+
+from stream import iter_messages
+import timestamps as ts
+
+
+# Codes used in the integer columns when a message does not have the field.
+ABSENT = -1
+
+TEXT_ABSENT = -1
+TEXT_PLAIN = 0
+TEXT_RICH = 1
+
+COLUMNS = ('id', 'timestamp', 'utc', 'sender', 'from_id', 'reply_to', 'forwarded_from', 'edited', 'text_kind',
+           'text_length', 'text_offsets')
+
+
+class Interner:
+    """
+    Assigns consecutive integer codes to values in order of first appearance.
+
+    Args:
+    - values (Iterable): Values to intern up front, such as a pool read back from disk.
+    """
+
+    def __init__(self, values: Iterable = ()):
+        self.values = []
+        self.codes = {}
+        for value in values:
+            self.code(value)
+
+    def code(self, value: Any) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+def counts_by_name(codes: np.ndarray, values: list) -> dict:
+    """
+    Count interned codes and report them by display name in order of first occurrence.
+
+    `ABSENT` codes and None values are reported as 'Deleted Account', matching how the
+    ranking functions in `tool.py` name senders.
+
+    Args:
+    - codes (np.ndarray): Interned codes, possibly `ABSENT`.
+    - values (list): The interned values indexed by code.
+
+    Returns:
+    - counts (dict): Dictionary mapping each name to its number of occurrences.
+    """
+    shifted = codes.astype(np.int64) + 1
+    names = ['Deleted Account'] + [value if value is not None else 'Deleted Account' for value in values]
+    counts = np.bincount(shifted, minlength=len(names))
+    first = np.full(len(names), len(shifted), dtype=np.int64)
+    np.minimum.at(first, shifted, np.arange(len(shifted)))
+    present = np.flatnonzero(counts)
+    by_name = {}
+    for code in present[np.argsort(first[present], kind='stable')].tolist():
+        name = names[code]
+        by_name[name] = by_name.get(name, 0) + int(counts[code])
+    return by_name
+
+
+class MessageTable:
+    """
+    A compact, column-oriented copy of the message fields the analysis functions use.
+
+    Each message is reduced to its id, timestamp, UTC time (`date_unixtime`), sender, `from_id`,
+    `reply_to_message_id`, `forwarded_from`, edit timestamp and text; every other key is dropped. Senders,
+    `from_id` values and forward sources are interned to integer codes, and all texts share
+    one UTF-8 buffer. A `MessageTable` can be passed to every analysis function in `tool.py`.
+
+    Use `MessageTable.build` to create one from an export.
+    """
+
+    def __init__(self, header: dict, columns: dict, senders: list, from_ids: list, forward_sources: list,
+                 text_data: Any):
+        self.header = header
+        self.id = columns['id']
+        self.timestamp = columns['timestamp']
+        self.utc = columns['utc']
+        self.sender = columns['sender']
+        self.from_id = columns['from_id']
+        self.reply_to = columns['reply_to']
+        self.forwarded_from = columns['forwarded_from']
+        self.edited = columns['edited']
+        self.text_kind = columns['text_kind']
+        self.text_length = columns['text_length']
+        self.text_offsets = columns['text_offsets']
+        self.senders = senders
+        self.from_ids = from_ids
+        self.forward_sources = forward_sources
+        self.text_data = text_data
+        # The date index, built by `timeindex.time_index` on first use.
+        self.date_index = None
+
+    @classmethod
+    def build(cls, data: Any) -> 'MessageTable':
+        """
+        Build a table from an export.
+
+        Args:
+        - data: The JSON data, a `ChatStream`, or an iterable of messages.
+
+        Returns:
+        - table (MessageTable): The messages in columnar form.
+        """
+        header = {key: value for key, value in data.items() if key != 'messages'} if isinstance(data, dict) \
+            else dict(getattr(data, 'header', {}))
+        ids, senders_column, from_ids_column = array('q'), array('i'), array('i')
+        reply_to, forwarded_from, text_kind, text_length = array('q'), array('i'), array('b'), array('i')
+        text_offsets = array('q', [0])
+        dates = ts.TimestampColumn()
+        edits = ts.TimestampColumn()
+        senders, from_ids, forward_sources = Interner(), Interner(), Interner()
+        text_data = bytearray()
+
+        for message in iter_messages(data):
+            ids.append(message.get('id', ABSENT))
+            dates.append(message)
+            edits.append_date(message.get('edited'))
+            senders_column.append(senders.code(message['from']) if 'from' in message else ABSENT)
+            from_ids_column.append(from_ids.code(message['from_id']) if 'from_id' in message else ABSENT)
+            reply_to.append(message.get('reply_to_message_id', ABSENT))
+            forwarded_from.append(
+                forward_sources.code(message['forwarded_from']) if 'forwarded_from' in message else ABSENT)
+            if 'text' not in message:
+                text_kind.append(TEXT_ABSENT)
+                text_length.append(0)
+            else:
+                text = message['text']
+                text_length.append(len(text))
+                if isinstance(text, str):
+                    text_kind.append(TEXT_PLAIN)
+                    text_data += text.encode('utf-8')
+                else:
+                    text_kind.append(TEXT_RICH)
+                    text_data += json.dumps(text, ensure_ascii=False).encode('utf-8')
+            text_offsets.append(len(text_data))
+
+        columns = {
+            'id': np.array(ids, dtype=np.int64),
+            'timestamp': dates.finish(),
+            'utc': dates.finish_utc(),
+            'sender': np.array(senders_column, dtype=np.int32),
+            'from_id': np.array(from_ids_column, dtype=np.int32),
+            'reply_to': np.array(reply_to, dtype=np.int64),
+            'forwarded_from': np.array(forwarded_from, dtype=np.int32),
+            'edited': edits.finish(),
+            'text_kind': np.array(text_kind, dtype=np.int8),
+            'text_length': np.array(text_length, dtype=np.int32),
+            'text_offsets': np.array(text_offsets, dtype=np.int64),
+        }
+        return cls(header, columns, senders.values, from_ids.values, forward_sources.values, bytes(text_data))
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def columns(self) -> dict:
+        """
+        Return the table's columns by name.
+
+        Returns:
+        - columns (dict): Dictionary mapping each name in `COLUMNS` to its array.
+        """
+        return {name: getattr(self, name) for name in COLUMNS}
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate memory used by the table's columns and text buffer, in bytes.
+        """
+        return sum(column.nbytes for column in self.columns().values()) + len(self.text_data)
+
+    def text(self, index: int) -> Any:
+        """
+        Return the `text` of a message as it appeared in the export.
+
+        Args:
+        - index (int): Position of the message in the table.
+
+        Returns:
+        - text (str | list | None): The message text, or None if the message had no text.
+        """
+        kind = self.text_kind[index]
+        if kind == TEXT_ABSENT:
+            return None
+        raw = bytes(self.text_data[self.text_offsets[index]:self.text_offsets[index + 1]]).decode('utf-8')
+        return raw if kind == TEXT_PLAIN else json.loads(raw)
+
+    def rows(self, block_size: int = 65536, start: int = 0, stop: int | None = None) -> Iterator[dict]:
+        """
+        Rebuild the messages as dictionaries holding the fields kept in the table.
+
+        Args:
+        - block_size (int): Number of rows whose dates are formatted at a time.
+        - start (int): Position of the first row to rebuild.
+        - stop (int): Position just past the last row to rebuild; the end of the table when omitted.
+
+        Returns:
+        - messages (Iterator[dict]): The messages in export order.
+        """
+        stop = len(self) if stop is None else stop
+        for block_start in range(start, stop, block_size):
+            block = slice(block_start, min(block_start + block_size, stop))
+            dates = self.timestamp[block].astype('datetime64[s]').astype(str).tolist()
+            edits = self.edited[block].astype('datetime64[s]').astype(str).tolist()
+            columns = zip(range(block.start, block.stop), self.id[block].tolist(), self.timestamp[block].tolist(),
+                          dates, self.utc[block].tolist(), self.sender[block].tolist(), self.from_id[block].tolist(),
+                          self.reply_to[block].tolist(), self.forwarded_from[block].tolist(),
+                          self.edited[block].tolist(), edits, self.text_kind[block].tolist())
+            for index, id, timestamp, date, utc, sender, from_id, reply_to, forward, edited, edit, kind in columns:
+                message = {'id': id}
+                if timestamp != ts.MISSING:
+                    message['date'] = date
+                if utc != ts.MISSING:
+                    message['date_unixtime'] = str(utc)
+                if sender != ABSENT:
+                    message['from'] = self.senders[sender]
+                if from_id != ABSENT:
+                    message['from_id'] = self.from_ids[from_id]
+                if reply_to != ABSENT:
+                    message['reply_to_message_id'] = reply_to
+                if forward != ABSENT:
+                    message['forwarded_from'] = self.forward_sources[forward]
+                if edited != ts.MISSING:
+                    message['edited'] = edit
+                if kind != TEXT_ABSENT:
+                    message['text'] = self.text(index)
+                yield message
+
+    def take(self, positions: np.ndarray | slice) -> 'MessageTable':
+        """
+        Return a new table holding some of the rows of this table.
+
+        A slice keeps the columns as views of this table's; positions gather them.
+
+        Args:
+        - positions (np.ndarray | slice): Ascending positions of the rows to keep, or a slice of them.
+
+        Returns:
+        - table (MessageTable): The selected rows, with this table's header and pools.
+        """
+        columns = {name: getattr(self, name)[positions] for name in COLUMNS if name != 'text_offsets'}
+        if isinstance(positions, slice):
+            start, stop, _ = positions.indices(len(self))
+            stop = max(start, stop)
+            columns['text_offsets'] = self.text_offsets[start:stop + 1] - self.text_offsets[start]
+            text_data = self.text_data[self.text_offsets[start]:self.text_offsets[stop]]
+        else:
+            starts = self.text_offsets[positions]
+            lengths = self.text_offsets[np.asarray(positions) + 1] - starts
+            offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+            # Index of every kept byte in this table's buffer, gathered in one call.
+            gather = np.arange(offsets[-1]) + np.repeat(starts - offsets[:-1], lengths)
+            columns['text_offsets'] = offsets
+            text_data = np.frombuffer(self.text_data, dtype=np.uint8)[gather].tobytes()
+        return MessageTable(self.header, columns, self.senders, self.from_ids, self.forward_sources, text_data)
+
+    def _adopt(self, other: 'MessageTable') -> tuple[dict, list, list, list]:
+        # Translate the interned codes of `other` into pools that extend this table's own.
+        columns = other.columns()
+        pools = []
+        for name, values, other_values in (('sender', self.senders, other.senders),
+                                           ('from_id', self.from_ids, other.from_ids),
+                                           ('forwarded_from', self.forward_sources, other.forward_sources)):
+            interner = Interner(values)
+            lookup = np.array([ABSENT] + [interner.code(value) for value in other_values], dtype=np.int32)
+            columns[name] = lookup[columns[name].astype(np.int64) + 1]
+            pools.append(interner.values)
+        return columns, *pools
+
+    def append(self, other: 'MessageTable') -> 'MessageTable':
+        """
+        Return a new table holding the rows of this table followed by those of `other`.
+
+        Args:
+        - other (MessageTable): The rows to append.
+
+        Returns:
+        - table (MessageTable): The combined table, with this table's header.
+        """
+        columns, senders, from_ids, forward_sources = self._adopt(other)
+        combined = {name: np.concatenate((getattr(self, name), columns[name])) for name in COLUMNS
+                    if name != 'text_offsets'}
+        combined['text_offsets'] = np.concatenate((self.text_offsets, other.text_offsets[1:] + self.text_offsets[-1]))
+        return MessageTable(self.header, combined, senders, from_ids, forward_sources,
+                            bytes(self.text_data) + bytes(other.text_data))
+
+    def replace_rows(self, positions: np.ndarray, other: 'MessageTable') -> 'MessageTable':
+        """
+        Return a new table in which some rows are replaced by the rows of `other`.
+
+        Args:
+        - positions (np.ndarray): Ascending positions of the rows to replace, one per row of `other`.
+        - other (MessageTable): The replacement rows, in the same order.
+
+        Returns:
+        - table (MessageTable): The updated table, with this table's header.
+        """
+        columns, senders, from_ids, forward_sources = self._adopt(other)
+        replaced = {}
+        for name in COLUMNS:
+            if name != 'text_offsets':
+                replaced[name] = np.array(getattr(self, name))
+                replaced[name][positions] = columns[name]
+
+        lengths = np.diff(self.text_offsets)
+        lengths[positions] = np.diff(other.text_offsets)
+        replaced['text_offsets'] = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        pieces, previous = [], 0
+        for index, position in enumerate(np.asarray(positions).tolist()):
+            pieces.append(self.text_data[previous:self.text_offsets[position]])
+            pieces.append(other.text_data[other.text_offsets[index]:other.text_offsets[index + 1]])
+            previous = self.text_offsets[position + 1]
+        pieces.append(self.text_data[previous:])
+        return MessageTable(self.header, replaced, senders, from_ids, forward_sources,
+                            b''.join(bytes(piece) for piece in pieces))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == 'messages':
+            return self.rows()
+        return self.header.get(key, default)
+
+    def __iter__(self) -> Iterator[dict]:
+        return self.rows()
+
+    def sender_counts(self, mask: np.ndarray | None = None) -> dict:
+        """
+        Count messages per sender name, in order of first occurrence.
+
+        Args:
+        - mask (np.ndarray): Boolean row selection; all rows when omitted.
+
+        Returns:
+        - counts (dict): Dictionary mapping sender names to message counts.
+        """
+        codes = self.sender if mask is None else self.sender[mask]
+        return counts_by_name(codes, self.senders)
+
+    def forward_source_counts(self) -> dict:
+        """
+        Count forwarded messages per forward source, in order of first occurrence.
+
+        Returns:
+        - counts (dict): Dictionary mapping forward sources to message counts.
+        """
+        return counts_by_name(self.forwarded_from[self.forwarded_from != ABSENT], self.forward_sources)
@@ -0,0 +1,222 @@
+import numpy as np
+
+from ranking import top_order
+from table import ABSENT
+from timestamps import MISSING
+
+# Ids are looked up in a dense array over their range unless it would hold more than
+# this many slots per message, as happens when ids have large gaps.
+DENSE_FACTOR = 4
+
+# Lower bounds, in seconds, of the buckets of reply latency histograms, and their labels.
+LATENCY_EDGES = np.array([0, 60, 300, 900, 3600, 6 * 3600, 86400])
+LATENCY_LABELS = ['<1m', '1-5m', '5-15m', '15m-1h', '1-6h', '6-24h', '>1d']
+
+
+class IdIndex:
+    """
+    Maps message ids to ordinals, the positions of the messages in the export.
+
+    The index is a dense array over the range of ids, answering a lookup with one memory
+    access, or, when the ids are too sparse for that, the ids sorted once and looked up by
+    binary search. Either way, whole arrays of ids are looked up in one vectorized call.
+    If an id occurs more than once, it maps to its first message.
+
+    Args:
+    - ids (np.ndarray): The id of each message, `ABSENT` where a message has none.
+    """
+
+    def __init__(self, ids: np.ndarray):
+        ids = np.asarray(ids, dtype=np.int64)
+        ordinals = np.flatnonzero(ids != ABSENT)
+        valid = ids[ordinals]
+        self.dense = None
+        if len(valid) == 0:
+            self.low = 0
+            self.dense = np.zeros(0, dtype=np.int64)
+            return
+        self.low = int(valid.min())
+        span = int(valid.max()) - self.low + 1
+        if span <= DENSE_FACTOR * len(ids):
+            self.dense = np.full(span, ABSENT, dtype=np.int64)
+            # Written backwards so that the first message with an id wins.
+            self.dense[valid[::-1] - self.low] = ordinals[::-1]
+        else:
+            order = np.argsort(valid, kind='stable')
+            self.sorted_ids = valid[order]
+            self.sorted_ordinals = ordinals[order]
+
+    def ordinals(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Look up ids.
+
+        Args:
+        - ids (np.ndarray): Message ids.
+
+        Returns:
+        - ordinals (np.ndarray): The ordinal of the message with each id, `ABSENT` where there is none.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.dense is not None:
+            offsets = ids - self.low
+            found = (offsets >= 0) & (offsets < len(self.dense))
+            ordinals = np.full(len(ids), ABSENT, dtype=np.int64)
+            ordinals[found] = self.dense[offsets[found]]
+            return ordinals
+        index = np.minimum(np.searchsorted(self.sorted_ids, ids), len(self.sorted_ids) - 1)
+        return np.where(self.sorted_ids[index] == ids, self.sorted_ordinals[index], ABSENT)
+
+
+class ReplyThreads:
+    """
+    The reply graph of an export: which message each reply answers, and the threads they form.
+
+    A thread is a message that was replied to, every reply to it, every reply to those
+    replies, and so on. Its root is the message that is not itself a reply, or whose
+    replied-to message is not in the export. Depths and roots are found by pointer
+    doubling: every message jumps to its ancestor twice as far up at each step, so the
+    whole graph is resolved in a number of vectorized passes logarithmic in the deepest
+    thread.
+
+    Args:
+    - ids (np.ndarray): The id of each message, `ABSENT` where a message has none.
+    - reply_to (np.ndarray): The `reply_to_message_id` of each message, `ABSENT` where it is not a reply.
+    """
+
+    def __init__(self, ids: np.ndarray, reply_to: np.ndarray):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.index = IdIndex(self.ids)
+        ordinals = np.arange(len(self.ids))
+        parent = np.full(len(self.ids), ABSENT, dtype=np.int64)
+        replies = np.flatnonzero(np.asarray(reply_to) != ABSENT)
+        parent[replies] = self.index.ordinals(np.asarray(reply_to, dtype=np.int64)[replies])
+        # A reply always follows the message it answers; anything else is a broken
+        # reference, and dropping it guarantees that the graph has no cycles.
+        parent[parent >= ordinals] = ABSENT
+        self.parent = parent
+
+        jump = np.where(parent != ABSENT, parent, ordinals)
+        depth = (parent != ABSENT).astype(np.int64)
+        while True:
+            ahead = jump[jump]
+            if np.array_equal(ahead, jump):
+                break
+            depth = depth + depth[jump]
+            jump = ahead
+        # Number of replies between each message and its root, and the root itself.
+        self.depth = depth
+        self.root = jump
+        # Number of direct replies to each message.
+        self.replies = np.bincount(parent[parent != ABSENT], minlength=len(parent))
+
+    def threads(self) -> dict:
+        """
+        Measure every thread with at least one reply.
+
+        Returns:
+        - threads (dict): Arrays over the threads, in the order of their roots: `root`, the
+          ordinal of the root message; `size`, the number of messages; `depth`, the length of
+          the longest chain of replies; and `fan_out`, the most direct replies any one of
+          its messages received.
+        """
+        size = np.bincount(self.root, minlength=len(self.root))
+        roots = np.flatnonzero(size > 1)
+        depth = np.zeros(len(self.root), dtype=np.int64)
+        np.maximum.at(depth, self.root, self.depth)
+        fan_out = np.zeros(len(self.root), dtype=np.int64)
+        np.maximum.at(fan_out, self.root, self.replies)
+        return {'root': roots, 'size': size[roots], 'depth': depth[roots], 'fan_out': fan_out[roots]}
+
+    def most_replied(self, top_n: int | None = None) -> np.ndarray:
+        """
+        Rank the messages by number of direct replies, ties broken by message order.
+
+        Args:
+        - top_n (int): Number of messages to return. None returns every message with a reply.
+
+        Returns:
+        - ordinals (np.ndarray): Ordinals of the most replied-to messages, most replies first.
+        """
+        replied = np.flatnonzero(self.replies)
+        return replied[top_order(self.replies[replied], replied, top_n)]
+
+    def replies_received(self, senders: np.ndarray, count: int) -> np.ndarray:
+        """
+        Count the replies each sender's messages received.
+
+        Args:
+        - senders (np.ndarray): The sender code of each message, from 0 to `count - 1`.
+        - count (int): Number of senders.
+
+        Returns:
+        - replies (np.ndarray): The number of replies received by each sender.
+        """
+        return np.bincount(np.asarray(senders)[self.parent[self.parent != ABSENT]], minlength=count)
+
+    def latencies(self, timestamps: np.ndarray, utc: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Measure how long after its replied-to message each reply was sent.
+
+        Replies whose replied-to message is not in the export, or either of which has no
+        date, are left out. A reply and its message that both have a UTC time are measured
+        on it, which does not jump at daylight saving time changes; others on the wall clock.
+
+        Args:
+        - timestamps (np.ndarray): The timestamp of each message, `ts.MISSING` where it has none.
+        - utc (np.ndarray): The UTC time (`date_unixtime`) of each message, `ts.MISSING` where it has none.
+
+        Returns:
+        - replies (np.ndarray): Ordinals of the measured replies.
+        - seconds (np.ndarray): The latency of each, in seconds.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        replies = np.flatnonzero(self.parent != ABSENT)
+        parents = self.parent[replies]
+        dated = (timestamps[replies] != MISSING) & (timestamps[parents] != MISSING)
+        replies, parents = replies[dated], parents[dated]
+        seconds = timestamps[replies] - timestamps[parents]
+        if utc is not None:
+            utc = np.asarray(utc, dtype=np.int64)
+            both = (utc[replies] != MISSING) & (utc[parents] != MISSING)
+            seconds = np.where(both, utc[replies] - utc[parents], seconds)
+        # Wall clocks set back can date a reply slightly before its message.
+        return replies, np.maximum(seconds, 0)
+
+
+def distributions(groups: np.ndarray, values: np.ndarray, count: int) -> dict:
+    """
+    Summarize the distribution of values within each group, without a loop over the groups.
+
+    The values are sorted by group and value once; each group's median and 90th percentile
+    are then read at computed offsets, interpolated linearly like `np.percentile`.
+
+    Args:
+    - groups (np.ndarray): The group of each value, from 0 to `count - 1`.
+    - values (np.ndarray): The values, such as latencies in seconds.
+    - count (int): Number of groups.
+
+    Returns:
+    - distributions (dict): Arrays over the groups: `size`, the number of values; `median`;
+      `p90`; and `histogram`, a (count, len(LATENCY_LABELS)) array of values per bucket of
+      `LATENCY_EDGES`. Statistics of empty groups are NaN.
+    """
+    groups = np.asarray(groups, dtype=np.int64)
+    values = np.asarray(values, dtype=np.int64)
+    order = np.lexsort((values, groups))
+    sorted_values = values[order].astype(np.float64)
+    size = np.bincount(groups, minlength=count)
+    starts = np.cumsum(size) - size
+    statistics = {'size': size}
+    for name, quantile in (('median', 0.5), ('p90', 0.9)):
+        result = np.full(count, np.nan)
+        filled = np.flatnonzero(size)
+        position = quantile * (size[filled] - 1)
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        below, above = sorted_values[starts[filled] + low], sorted_values[starts[filled] + high]
+        result[filled] = below + (above - below) * (position - low)
+        statistics[name] = result
+    buckets = np.searchsorted(LATENCY_EDGES, values, side='right') - 1
+    histogram = np.bincount(groups * len(LATENCY_LABELS) + buckets, minlength=count * len(LATENCY_LABELS))
+    statistics['histogram'] = histogram.reshape(count, len(LATENCY_LABELS))
+    return statistics
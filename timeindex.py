@@ -0,0 +1,229 @@
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+
+from store import MessageStore
+from stream import iter_messages
+from table import MessageTable
+import timestamps as ts
+
+
+class TimeIndex:
+    """
+    The positions of dated messages, sorted by date, so a date range is found by binary search.
+
+    Exports list messages in chronological order, in which case the index is the identity and
+    every date range is a contiguous run of messages. Otherwise the positions are sorted once,
+    stably, so messages with the same date keep their export order.
+
+    Args:
+    - timestamps (np.ndarray): The timestamp of each message, `ts.MISSING` where it has none.
+    """
+
+    def __init__(self, timestamps: np.ndarray):
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        dated = np.flatnonzero(timestamps != ts.MISSING)
+        self.size = len(timestamps)
+        self.chronological = bool(np.all(timestamps[dated][1:] >= timestamps[dated][:-1]))
+        self.order = dated if self.chronological else dated[np.argsort(timestamps[dated], kind='stable')]
+        self.timestamps = timestamps[self.order]
+        # With every message dated and in order, a range of the index is a range of messages.
+        self.contiguous = self.chronological and len(dated) == self.size
+
+    def span(self, start: str | None = None, end: str | None = None) -> tuple[int, int]:
+        """
+        Find the part of the index dated within a range.
+
+        Args:
+        - start (str): ISO 8601 date of the first kept instant, such as '2023-07-01'. None keeps the oldest messages.
+        - end (str): ISO 8601 date just past the last kept instant. None keeps the latest messages.
+
+        Returns:
+        - low (int): Index, in `order`, of the first message at or after `start`.
+        - high (int): Index, in `order`, just past the last message before `end`.
+        """
+        low, high = 0, len(self.order)
+        if start is not None:
+            low = int(np.searchsorted(self.timestamps, ts.parse_dates([start])[0], 'left'))
+        if end is not None:
+            high = int(np.searchsorted(self.timestamps, ts.parse_dates([end])[0], 'left'))
+        return low, max(low, high)
+
+    def positions(self, start: str | None = None, end: str | None = None) -> np.ndarray | slice:
+        """
+        Find the messages dated within a range.
+
+        Args:
+        - start (str): ISO 8601 date of the first kept instant. None keeps the oldest messages.
+        - end (str): ISO 8601 date just past the last kept instant. None keeps the latest messages.
+
+        Returns:
+        - positions (np.ndarray | slice): The positions of the messages in export order; a
+          slice when they are contiguous.
+        """
+        low, high = self.span(start, end)
+        if self.contiguous:
+            return slice(low, high)
+        return np.sort(self.order[low:high])
+
+    def oldest(self, start: str | None = None, end: str | None = None) -> int | None:
+        """
+        Return the position of the oldest message within a range, the first one in export order among ties.
+
+        Args:
+        - start (str): ISO 8601 date of the first kept instant. None keeps the oldest messages.
+        - end (str): ISO 8601 date just past the last kept instant. None keeps the latest messages.
+
+        Returns:
+        - position (int): The position of the message in export order, or None if no message is in the range.
+        """
+        low, high = self.span(start, end)
+        return int(self.order[low]) if low < high else None
+
+    def latest(self, start: str | None = None, end: str | None = None) -> int | None:
+        """
+        Return the position of the latest message within a range, the first one in export order among ties.
+
+        Args:
+        - start (str): ISO 8601 date of the first kept instant. None keeps the oldest messages.
+        - end (str): ISO 8601 date just past the last kept instant. None keeps the latest messages.
+
+        Returns:
+        - position (int): The position of the message in export order, or None if no message is in the range.
+        """
+        low, high = self.span(start, end)
+        if low == high:
+            return None
+        return int(self.order[low + np.searchsorted(self.timestamps[low:high], self.timestamps[high - 1], 'left')])
+
+
+class ChatData(dict):
+    """
+    The JSON data of a chat export, as returned by `tool.load_json`, which keeps its date index.
+
+    It is the parsed dictionary itself, so it is used like any other; `time_index` builds
+    the index on first use and keeps it in `date_index`. The index is rebuilt when the
+    `messages` list is replaced or changes length; after editing the dates of messages in
+    place, reset `date_index` to None.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.date_index = None
+        # The list of messages `date_index` was built from.
+        self.indexed_messages = None
+
+
+def time_index(data: Any) -> TimeIndex:
+    """
+    Return the date index of a loaded export.
+
+    The index of a `MessageTable` comes from its timestamp column, and that of a `ChatData`
+    from the dates of its messages. Either is built on first use and kept on the data, for
+    as long as the data lives, so the date ranges of every following call are binary
+    searches. That of other JSON data, such as a dictionary from `json.load`, is built anew
+    on every call: hold it and pass it to `window` and `edge_message` to reuse it while the
+    messages are unchanged.
+
+    Args:
+    - data: The JSON data, a `ChatData` or a `MessageTable`.
+
+    Returns:
+    - index (TimeIndex): The index of its messages.
+    """
+    if isinstance(data, MessageTable):
+        if data.date_index is None:
+            data.date_index = TimeIndex(data.timestamp)
+        return data.date_index
+    messages = iter_messages(data)
+    if isinstance(data, ChatData):
+        if data.date_index is None or data.indexed_messages is not messages or data.date_index.size != len(messages):
+            data.date_index, data.indexed_messages = TimeIndex(ts.timestamp_column(messages)), messages
+        return data.date_index
+    return TimeIndex(ts.timestamp_column(messages))
+
+
+def window(data: Any, start: str | None = None, end: str | None = None, index: TimeIndex | None = None) -> Any:
+    """
+    Narrow an export to the messages dated within a range.
+
+    A `MessageStore` is narrowed with an indexed SQL condition, and a `MessageTable` or
+    JSON data with a binary search of its `TimeIndex`: the returned view is a slice
+    of the same messages. Streams are filtered as they are read. Messages without a date
+    are left out of any bounded range.
+
+    Args:
+    - data: The JSON data, a `ChatStream`, a `MessageTable`, a `MessageStore`, or an iterable of messages.
+    - start (str): Only keep messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only keep messages dated before this ISO 8601 date.
+    - index (TimeIndex): The index of JSON data returned by `time_index`. Found or built by `time_index` when omitted.
+
+    Returns:
+    - data: `data` itself without bounds; otherwise a view of the same kind, or JSON-like
+      data for streams and iterables.
+    """
+    if start is None and end is None:
+        return data
+    if isinstance(data, MessageStore):
+        return data.filter(start=start, end=end)
+    if isinstance(data, MessageTable):
+        return data.take(time_index(data).positions(start, end))
+    messages = iter_messages(data)
+    header = {key: value for key, value in data.items() if key != 'messages'} if isinstance(data, dict) \
+        else dict(getattr(data, 'header', {}))
+    if isinstance(messages, list):
+        positions = (index or time_index(data)).positions(start, end)
+        if isinstance(positions, slice):
+            return {**header, 'messages': messages[positions]}
+        return {**header, 'messages': [messages[index] for index in positions.tolist()]}
+    return {**header, 'messages': _dated_within(messages, start, end)}
+
+
+def _dated_within(messages: Iterable[dict], start: str | None, end: str | None) -> Iterator[dict]:
+    # Dates in exports are ISO 8601 strings of one fixed format, so they compare as strings.
+    low = str(ts.parse_dates([start])[0].astype('datetime64[s]')) if start is not None else None
+    high = str(ts.parse_dates([end])[0].astype('datetime64[s]')) if end is not None else None
+    return (message for message in messages if message.get('date')
+            and (low is None or message['date'] >= low) and (high is None or message['date'] < high))
+
+
+def edge_message(data: Any, latest: bool = False, index: TimeIndex | None = None,
+                 start: str | None = None, end: str | None = None) -> dict | None:
+    """
+    Find the oldest or the latest message of an export, the first one in export order among ties.
+
+    A `MessageStore` answers with its timestamp index, and a `MessageTable`, a `ChatData`,
+    or JSON data whose index is given, with its `TimeIndex`, without reading the other
+    messages. Other data is scanned once, which costs less than building an index.
+
+    Args:
+    - data: The JSON data, a `ChatStream`, a `MessageTable`, a `MessageStore`, or an iterable of messages.
+    - latest (bool): Find the latest message instead of the oldest.
+    - index (TimeIndex): The index of JSON data returned by `time_index`.
+    - start (str): Only consider messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only consider messages dated before this ISO 8601 date.
+
+    Returns:
+    - message (dict): The message, or None if no message is dated within the range.
+    """
+    if isinstance(data, MessageStore):
+        tail = f"ORDER BY timestamp{' DESC' if latest else ''}, ordinal LIMIT 1"
+        return next(data.filter(start=start, end=end).rows(1, 'timestamp IS NOT NULL', tail), None)
+    messages = data if isinstance(data, MessageTable) else iter_messages(data)
+    if index is None and isinstance(data, (MessageTable, ChatData)):
+        index = time_index(data)
+    if index is not None and isinstance(messages, (MessageTable, list)):
+        position = index.latest(start, end) if latest else index.oldest(start, end)
+        if position is None:
+            return None
+        if isinstance(messages, MessageTable):
+            return next(messages.rows(1, position, position + 1))
+        return messages[position]
+    found = None
+    if start is not None or end is not None:
+        messages = _dated_within(messages, start, end)
+    for message in messages:
+        if 'date' in message and (found is None or (message['date'] > found['date'] if latest
+                                                     else message['date'] < found['date'])):
+            found = message
+    return found
@@ -0,0 +1,392 @@
+from array import array
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Iterable
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from ranking import top_order
+
+
+# Timestamps are seconds since 1970-01-01 on the export's wall clock, i.e. the `date`
+# field read as if it were UTC, so calendar buckets match the strings in the export.
+# The `date_unixtime` field, when present, is kept apart as the true UTC time: that is
+# the one converted to another time zone.
+MISSING = -1
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MONTH_ABBREVIATIONS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+def parse_dates(dates: Iterable[str | None]) -> np.ndarray:
+    """
+    Parse ISO 8601 date strings in one vectorized call.
+
+    Args:
+    - dates (Iterable[str | None]): Date strings such as '2023-03-01T14:05:00'; missing dates may be None.
+
+    Returns:
+    - timestamps (np.ndarray): int64 seconds since the epoch, `MISSING` where a date was absent.
+    """
+    parsed = np.array([date if date else 'NaT' for date in dates], dtype='datetime64[s]')
+    timestamps = parsed.astype(np.int64)
+    timestamps[np.isnat(parsed)] = MISSING
+    return timestamps
+
+
+class TimestampColumn:
+    """
+    Builds the timestamp column of an export while its messages are being scanned.
+
+    Date strings are buffered and parsed in blocks, so only one int64 per message is kept,
+    besides its `date_unixtime`: the UTC column returned by `finish_utc`. Messages without
+    a `date` fall back to `date_unixtime`.
+
+    Args:
+    - block_size (int): Number of dates buffered before they are parsed.
+    """
+
+    def __init__(self, block_size: int = 65536):
+        self.block_size = block_size
+        self.pending = []
+        self.blocks = []
+        self.utc = array('q')
+
+    def append(self, message: dict):
+        date = message.get('date')
+        unixtime = message.get('date_unixtime')
+        self.utc.append(int(unixtime) if unixtime else MISSING)
+        if not date and unixtime:
+            date = str(np.datetime64(int(unixtime), 's'))
+        self.append_date(date)
+
+    def append_date(self, date: str | None):
+        self.pending.append(date)
+        if len(self.pending) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.blocks.append(parse_dates(self.pending))
+            self.pending = []
+
+    def finish(self) -> np.ndarray:
+        """
+        Return the completed column.
+
+        Returns:
+        - timestamps (np.ndarray): int64 timestamps, one per appended message.
+        """
+        self.flush()
+        if not self.blocks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(self.blocks)
+
+    def finish_utc(self) -> np.ndarray:
+        """
+        Return the UTC column of the messages appended with `append`.
+
+        Returns:
+        - utc (np.ndarray): int64 seconds since the epoch from `date_unixtime`, `MISSING` where a message has none.
+        """
+        return np.array(self.utc, dtype=np.int64)
+
+
+def timestamp_column(messages: Iterable[dict]) -> np.ndarray:
+    """
+    Build the timestamp column for a sequence of messages.
+
+    Args:
+    - messages (Iterable[dict]): The messages.
+
+    Returns:
+    - timestamps (np.ndarray): int64 timestamps, `MISSING` where a message has no date.
+    """
+    column = TimestampColumn()
+    for message in messages:
+        column.append(message)
+    return column.finish()
+
+
+@lru_cache(maxsize=32)
+def transitions(tz: str, first_year: int, last_year: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Build the table of UTC offsets a time zone goes through over a range of years.
+
+    The offset is sampled once a day; each day on which it changes is searched to the
+    second for the transition, so the table costs a few thousand lookups per decade.
+
+    Args:
+    - tz (str): IANA time zone name, such as 'Europe/Berlin'.
+    - first_year (int): First year covered.
+    - last_year (int): Last year covered.
+
+    Returns:
+    - instants (np.ndarray): The timestamps from which each offset applies, the first being the start of `first_year`.
+    - offsets (np.ndarray): The UTC offset in seconds from each instant on.
+    """
+    zone = ZoneInfo(tz)
+
+    def offset(instant: int) -> int:
+        return int(datetime.fromtimestamp(instant, zone).utcoffset().total_seconds())
+
+    low = int(np.datetime64(f'{first_year:04d}-01-01', 's').astype(np.int64))
+    high = int(np.datetime64(f'{last_year + 1:04d}-01-01', 's').astype(np.int64))
+    instants, offsets = [low], [offset(low)]
+    for day in range(low, high, SECONDS_PER_DAY):
+        current = offset(day + SECONDS_PER_DAY)
+        if current != offsets[-1]:
+            before, after = day, day + SECONDS_PER_DAY
+            while after - before > 1:
+                middle = (before + after) // 2
+                before, after = (before, middle) if offset(middle) == current else (middle, after)
+            instants.append(after)
+            offsets.append(current)
+    return np.array(instants, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+
+def localize(timestamps: np.ndarray, tz: str | float | None = None) -> np.ndarray:
+    """
+    Convert UTC timestamps to the wall-clock time of a time zone, so they are bucketed by local hours and days.
+
+    The offset of every timestamp is looked up in the zone's transition table with one
+    vectorized binary search, so daylight saving time costs no more than a fixed offset.
+    Offsets are whole quarter hours, so timestamps already bucketed by quarter hour, such
+    as those of `MessageStore.time_counts`, convert exactly.
+
+    Args:
+    - timestamps (np.ndarray): UTC timestamps, such as `date_unixtime` values; `MISSING` where there is none.
+    - tz (str | float): IANA time zone name, such as 'Africa/Addis_Ababa' or 'Europe/Berlin', or a
+      fixed offset from UTC in hours, such as 3 or 5.5. None returns the timestamps unchanged.
+
+    Returns:
+    - timestamps (np.ndarray): The local timestamps, `MISSING` where there was none.
+    """
+    if tz is None:
+        return timestamps
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    dated = timestamps != MISSING
+    if isinstance(tz, (int, float)):
+        offsets = round(tz * SECONDS_PER_HOUR)
+    elif not dated.any():
+        return timestamps
+    else:
+        first, last = years(np.array([timestamps[dated].min(), timestamps[dated].max()])) + 1970
+        instants, table = transitions(tz, int(first), int(last))
+        offsets = table[np.maximum(np.searchsorted(instants, timestamps, 'right') - 1, 0)]
+    return np.where(dated, timestamps + offsets, MISSING)
+
+
+def local_time(timestamps: np.ndarray, utc: np.ndarray, tz: str | float | None = None) -> np.ndarray:
+    """
+    Return the wall-clock time of each message in a time zone.
+
+    The `date` of an export is the wall clock of the app that exported it, so with a time
+    zone each message is converted from its UTC time instead. Messages without one, from
+    exports that predate `date_unixtime`, keep the wall clock of their `date`.
+
+    Args:
+    - timestamps (np.ndarray): The wall-clock timestamps of the messages, `MISSING` where there is none.
+    - utc (np.ndarray): Their UTC timestamps, `MISSING` where there is none.
+    - tz (str | float): Time zone, as accepted by `localize`. None keeps the export's wall clock.
+
+    Returns:
+    - timestamps (np.ndarray): The local timestamps, `MISSING` where a message has no date.
+    """
+    if tz is None:
+        return timestamps
+    utc = np.asarray(utc, dtype=np.int64)
+    return np.where(utc != MISSING, localize(utc, tz), timestamps)
+
+
+def hours(timestamps: np.ndarray) -> np.ndarray:
+    return (timestamps // SECONDS_PER_HOUR) % 24
+
+
+def days(timestamps: np.ndarray) -> np.ndarray:
+    return timestamps // SECONDS_PER_DAY
+
+
+def weekdays(timestamps: np.ndarray) -> np.ndarray:
+    # 1970-01-01 was a Thursday; Monday is 0 as in `datetime.weekday`.
+    return (days(timestamps) + 3) % 7
+
+
+def months(timestamps: np.ndarray) -> np.ndarray:
+    return timestamps.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+
+
+def years(timestamps: np.ndarray) -> np.ndarray:
+    return timestamps.astype('datetime64[s]').astype('datetime64[Y]').astype(np.int64)
+
+
+def day_label(day: int) -> str:
+    return str(np.datetime64(int(day), 'D'))
+
+
+def month_label(month: int) -> str:
+    return str(np.datetime64(int(month), 'M'))
+
+
+def year_label(year: int) -> str:
+    return str(np.datetime64(int(year), 'Y'))
+
+
+def weekday_label(weekday: int) -> str:
+    return WEEKDAY_NAMES[weekday]
+
+
+def month_name(month: int) -> str:
+    return MONTH_ABBREVIATIONS[int(month) % 12]
+
+
+class KeyCounts:
+    """
+    Occurrence counts of integer bucket keys, mergeable across batches of messages.
+
+    Besides its count, each key records the position of its first occurrence, so merged
+    counts can still be ranked exactly like a `Counter` fed all the messages in order.
+
+    Args:
+    - keys (np.ndarray): The distinct keys.
+    - counts (np.ndarray): Number of occurrences of each key.
+    - first (np.ndarray): Position of the first message with each key.
+    - size (int): Number of messages the counts were taken over.
+    """
+
+    def __init__(self, keys: np.ndarray, counts: np.ndarray, first: np.ndarray, size: int):
+        self.keys = keys
+        self.counts = counts
+        self.first = first
+        self.size = size
+
+    @classmethod
+    def from_keys(cls, keys: np.ndarray, positions: np.ndarray, size: int) -> 'KeyCounts':
+        """
+        Count the bucket keys of a batch of messages.
+
+        Args:
+        - keys (np.ndarray): One bucket key per counted message.
+        - positions (np.ndarray): Position of each counted message within the batch.
+        - size (int): Number of messages in the batch, counted or not.
+
+        Returns:
+        - counts (KeyCounts): The counts for the batch.
+        """
+        unique, index, counts = np.unique(keys, return_index=True, return_counts=True)
+        return cls(unique, counts.astype(np.int64), positions[index].astype(np.int64), size)
+
+    @classmethod
+    def from_counts(cls, keys: np.ndarray, counts: np.ndarray, first: np.ndarray, size: int) -> 'KeyCounts':
+        """
+        Combine counts whose keys may repeat, such as counts of finer buckets mapped to coarser ones.
+
+        Args:
+        - keys (np.ndarray): The key of each count.
+        - counts (np.ndarray): The counts.
+        - first (np.ndarray): Position of the first message of each count.
+        - size (int): Number of messages the counts were taken over.
+
+        Returns:
+        - counts (KeyCounts): The counts summed per distinct key.
+        """
+        unique, inverse = np.unique(keys, return_inverse=True)
+        summed = np.zeros(len(unique), dtype=np.int64)
+        np.add.at(summed, inverse, counts)
+        unique_first = np.full(len(unique), np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(unique_first, inverse, first)
+        return cls(unique, summed, unique_first, size)
+
+    def merge(self, other: 'KeyCounts') -> 'KeyCounts':
+        """
+        Combine with the counts of the batch that follows this one.
+
+        Args:
+        - other (KeyCounts): Counts taken over the next messages.
+
+        Returns:
+        - merged (KeyCounts): Counts over both batches.
+        """
+        return KeyCounts.from_counts(np.concatenate((self.keys, other.keys)),
+                                     np.concatenate((self.counts, other.counts)),
+                                     np.concatenate((self.first, other.first + self.size)), self.size + other.size)
+
+    def most_common(self, label: Callable[[int], Any] = int, top_n: int | None = None) -> list[tuple[Any, int]]:
+        """
+        Rank the keys like `Counter.most_common`: by descending count, ties broken by first occurrence.
+
+        Args:
+        - label (Callable): Converts a bucket key to the value reported for it.
+        - top_n (int): Number of keys to keep. None keeps them all.
+
+        Returns:
+        - ranked (list[tuple[Any, int]]): (label, count) pairs, most common first.
+        """
+        order = top_order(self.counts, self.first, top_n)
+        return [(label(key), count) for key, count in zip(self.keys[order].tolist(), self.counts[order].tolist())]
+
+    def first_seen(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the keys in order of first occurrence.
+
+        Returns:
+        - keys (np.ndarray): The distinct keys, in order of first occurrence.
+        - counts (np.ndarray): The number of occurrences of each key.
+        """
+        order = np.argsort(self.first, kind='stable')
+        return self.keys[order], self.counts[order]
+
+    def get_state(self) -> dict:
+        """
+        Return the counts as JSON-serialisable data.
+
+        Returns:
+        - state (dict): The keys, counts, first positions and batch size.
+        """
+        return {'keys': self.keys.tolist(), 'counts': self.counts.tolist(), 'first': self.first.tolist(),
+                'size': self.size}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'KeyCounts':
+        """
+        Rebuild counts from the data returned by `get_state`.
+
+        Args:
+        - state (dict): The serialised counts.
+
+        Returns:
+        - counts (KeyCounts): The counts.
+        """
+        return cls(np.array(state['keys'], dtype=np.int64), np.array(state['counts'], dtype=np.int64),
+                   np.array(state['first'], dtype=np.int64), state['size'])
+
+
+def most_common_by_group(groups: np.ndarray, keys: np.ndarray, counts: np.ndarray,
+                         first: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find the most common key within each group, like `Counter.most_common(1)` per group.
+
+    Ties are broken by the position of the first occurrence of the key.
+
+    Args:
+    - groups (np.ndarray): Group code of each distinct (group, key) pair, such as a sender code.
+    - keys (np.ndarray): Bucket key of each pair.
+    - counts (np.ndarray): Number of messages of each pair.
+    - first (np.ndarray): Position of the first message of each pair.
+
+    Returns:
+    - group_codes (np.ndarray): The groups, in ascending order.
+    - best_keys (np.ndarray): The most common key of each group.
+    - best_counts (np.ndarray): The number of messages with that key in each group.
+    """
+    if len(groups) == 0:
+        return groups, keys, counts
+    order = np.lexsort((first, -counts, groups))
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    best = order[starts]
+    return groups[best], keys[best], counts[best]
@@ -0,0 +1,188 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import re
+from typing import Iterable, Iterator
+
+# Finds the same words as r'\b\w+\b': a maximal run of word characters always starts and
+# ends on a word boundary, so the anchors only cost time.
+WORD_PATTERN = re.compile(r'\w+')
+
+# Texts tokenized together. They are joined with a newline, which is whitespace and
+# cannot be part of a word, so the last word of a text never merges with the next one.
+BLOCK_SIZE = 65536
+SEPARATOR = '\n'
+
+ENGLISH_STOPWORDS = frozenset('''
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers herself him himself his how i if in into is it its itself just me more most my myself no nor not
+now of off on once only or other our ours ourselves out over own same she should so some such than that the
+their theirs them themselves then there these they this those through to too under until up very was we
+were what when where which while who whom why will with would you your yours yourself yourselves
+'''.split())
+
+
+def flatten_text(message: dict) -> str:
+    """
+    Return the text of a message as it is displayed, including formatted parts.
+
+    Rich texts are lists mixing plain strings with entities such as
+    `{'type': 'link', 'text': 'https://...'}`; the text of every part is kept. Messages
+    without a `text` fall back to their `text_entities`.
+
+    Args:
+    - message (dict): The message.
+
+    Returns:
+    - text (str): The displayed text, or an empty string.
+    """
+    text = message.get('text')
+    if text is None:
+        text = message.get('text_entities')
+    if isinstance(text, str):
+        return text
+    if isinstance(text, list):
+        return ''.join(part if isinstance(part, str) else part.get('text', '')
+                       for part in text if isinstance(part, (str, dict)))
+    if isinstance(text, dict):
+        return text.get('text', '')
+    return ''
+
+
+class Tokenizer:
+    """
+    Split texts into lowercase words, a block of many texts at a time.
+
+    Stopwords and short words are not dropped while counting but from the final counts,
+    so counts taken with different filters can still be merged.
+
+    Args:
+    - stopwords (Iterable[str]): Lowercase words left out of the counts, such as `ENGLISH_STOPWORDS`.
+    - min_length (int): Words shorter than this many characters are left out of the counts.
+    """
+
+    def __init__(self, stopwords: Iterable[str] | None = None, min_length: int = 1):
+        self.stopwords = frozenset(stopwords or ())
+        self.min_length = min_length
+
+    @staticmethod
+    def tokens(texts: Iterable[str]) -> list[str]:
+        """
+        Split texts into lowercase words with a single regex call.
+
+        Args:
+        - texts (Iterable[str]): The texts.
+
+        Returns:
+        - words (list[str]): The words of all the texts, in order.
+        """
+        return WORD_PATTERN.findall(SEPARATOR.join(texts).lower())
+
+    @staticmethod
+    def count(texts: Iterable[str], counts: Counter):
+        """
+        Add the words of texts to word counts.
+
+        Whitespace-separated tokens are counted first, by `str.split` and `Counter` in C,
+        and the regex then runs once per distinct token rather than over every text. A word
+        never spans whitespace, so this finds the same words, in the same order of first
+        occurrence, as `tokens`.
+
+        Args:
+        - texts (Iterable[str]): The texts.
+        - counts (Counter): The counts to add to.
+        """
+        for token, occurrences in Counter(SEPARATOR.join(texts).split()).items():
+            for word in WORD_PATTERN.findall(token.lower()):
+                counts[word] += occurrences
+
+    def keep(self, word: str) -> bool:
+        return len(word) >= self.min_length and word not in self.stopwords
+
+    def filter(self, counts: Counter) -> Counter:
+        """
+        Drop stopwords and short words from word counts.
+
+        Args:
+        - counts (Counter): Word counts.
+
+        Returns:
+        - counts (Counter): The counts of the kept words; `counts` itself if nothing is filtered.
+        """
+        if not self.stopwords and self.min_length <= 1:
+            return counts
+        return Counter({word: count for word, count in counts.items() if self.keep(word)})
+
+
+def text_blocks(messages: Iterable[dict], block_size: int = BLOCK_SIZE) -> Iterator[list[str]]:
+    """
+    Group the flattened texts of messages into blocks.
+
+    Args:
+    - messages (Iterable[dict]): The messages.
+    - block_size (int): Number of texts per block.
+
+    Returns:
+    - blocks (Iterator[list[str]]): Lists of at most `block_size` texts, in message order.
+    """
+    block = []
+    for message in messages:
+        text = message.get('text')
+        block.append(text if type(text) is str else flatten_text(message))
+        if len(block) >= block_size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def _count_block(texts: list[str]) -> Counter:
+    counts = Counter()
+    Tokenizer.count(texts, counts)
+    return counts
+
+
+def count_words(messages: Iterable[dict], tokenizer: Tokenizer | None = None, block_size: int = BLOCK_SIZE,
+                workers: int = 1) -> Counter:
+    """
+    Count the words of messages, optionally in several processes.
+
+    With more than one worker, blocks of texts are counted by a pool of processes and the
+    per-block counts are merged in message order, so ties rank exactly as in one process.
+
+    Args:
+    - messages (Iterable[dict]): The messages.
+    - tokenizer (Tokenizer): The stopwords and minimum length to apply. Defaults to none.
+    - block_size (int): Number of texts tokenized together.
+    - workers (int): Number of worker processes. Defaults to 1, counting in this process.
+
+    Returns:
+    - counts (Counter): Occurrences of each word, in order of first occurrence.
+    """
+    tokenizer = tokenizer or Tokenizer()
+    counts = Counter()
+    if workers <= 1:
+        for block in text_blocks(messages, block_size):
+            tokenizer.count(block, counts)
+        return tokenizer.filter(counts)
+    # `parallel` builds on the engine, which tokenizes with this module.
+    from parallel import imap_bounded
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        arguments = ((block,) for block in text_blocks(messages, block_size))
+        for block_counts in imap_bounded(executor, _count_block, arguments, 2 * workers):
+            counts.update(block_counts)
+    return tokenizer.filter(counts)
+
+
+def message_words(message: dict) -> list[str]:
+    """
+    Return the lowercase words of one message.
+
+    Args:
+    - message (dict): The message.
+
+    Returns:
+    - words (list[str]): Its words, in order.
+    """
+    return Tokenizer.tokens([flatten_text(message)])
+
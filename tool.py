@@ -1,43 +1,396 @@
-import json
+import sqlite3
 from datetime import datetime
-from collections import defaultdict
-from collections import Counter
-import re
-from typing import Any, List, Tuple
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+
+from activity import ActivityCube
+from arrow_export import read_arrow, read_parquet, write_arrow, write_parquet
+from batch import run_batch
+from cache import load_cached_table
+from compression import READ_ERRORS
+from engine import Analysis, METRICS, analyze
+from incremental import update_analysis
+from parallel import run_parallel
+from parsers import get_backend, parse_file
+from ranking import top_items
+from search import TextIndex, build_index
+from sketch import DailyDistinct
+from store import MessageStore, import_export
+from stream import ChatStream, is_account_export, iter_chats, iter_messages
+from table import MessageTable
+from timeindex import ChatData, edge_message, window
+from tokenizer import Tokenizer, count_words
+
+
+def _read_export(read: Callable[[], Any], action: str = 'loading the JSON file') -> Any | None:
+    # Report unreadable, truncated or corrupt exports the same way in every entry point.
+    try:
+        return read()
+    except READ_ERRORS as e:
+        print(f"An error occurred while {action}: {e}")
+        return None
 
 
-def load_json(file_path: str = 'result.json') -> Any | None:
+def load_json(file_path: str = 'result.json', backend: str = 'auto') -> Any | None:
     """
     Load JSON data from the specified file path.
 
+    Exports compressed with gzip, xz, zstd or bzip2 are recognised from their first bytes
+    and decompressed in memory while they are read, without a temporary file.
+
+    The data is returned as a `ChatData`, a dictionary that keeps the date index of its
+    messages once a function has built it, so date ranges and the oldest and latest
+    messages are then found by binary search.
+
+    Args:
+    - file_path (str): The path to the JSON file, possibly compressed.
+    - backend (str): The JSON parser to use, such as 'json' or 'orjson'. Defaults to 'auto',
+      the fastest installed parser (see `parsers.available_backends`).
+
+    Returns:
+    - data (ChatData): The loaded JSON data.
+    - None: If an error occurs during file opening or JSON parsing.
+    """
+    # An unknown backend is a programming error, not a problem with the file.
+    get_backend(backend)
+    data = _read_export(lambda: parse_file(file_path, backend))
+    return ChatData(data) if isinstance(data, dict) else data
+
+
+def stream_json(file_path: str = 'result.json') -> ChatStream | None:
+    """
+    Open the specified export for streaming instead of loading it into memory.
+
+    The chat header fields are parsed immediately; messages are read from disk one by one
+    each time they are iterated, so memory use stays flat regardless of the export size.
+    Compressed exports are decompressed on the fly.
+
+    Args:
+    - file_path (str): The path to the JSON file, possibly compressed.
+
+    Returns:
+    - chat (ChatStream): The streamed chat, usable wherever the loaded JSON data is.
+    - None: If an error occurs during file opening or JSON parsing.
+    """
+    return _read_export(lambda: ChatStream(file_path))
+
+
+def load_table(file_path: str = 'result.json', use_cache: bool = True) -> MessageTable | None:
+    """
+    Load the specified export as a compact `MessageTable`.
+
+    The first load streams the JSON file and writes a binary cache next to it
+    (`result.json.cache`); later loads memory-map that cache instead of parsing the JSON
+    again. The cache is rebuilt automatically when the export's size, modification time
+    or content hash changes.
+
     Args:
     - file_path (str): The path to the JSON file.
+    - use_cache (bool): Whether to read and write the cache file. Defaults to True.
+
+    Returns:
+    - table (MessageTable): The loaded messages, usable wherever the loaded JSON data is.
+    - None: If an error occurs during file opening or JSON parsing.
+    """
+    if use_cache:
+        return _read_export(lambda: load_cached_table(file_path, lambda path: MessageTable.build(ChatStream(path))))
+    return _read_export(lambda: MessageTable.build(ChatStream(file_path)))
+
+
+def import_sqlite(file_path: str = 'result.json', db_path: str = 'result.db') -> MessageStore | None:
+    """
+    Import the specified export into a SQLite database.
+
+    The messages are streamed from the file and inserted in batches inside a single
+    transaction, then indexed by date, sender, replied-to message and forward source.
+
+    Args:
+    - file_path (str): The path to the JSON file, possibly compressed.
+    - db_path (str): The path of the database to create. Defaults to 'result.db'.
+
+    Returns:
+    - store (MessageStore): The imported messages, usable wherever the loaded JSON data is.
+    - None: If an error occurs during file opening or JSON parsing.
+    """
+    return _read_export(lambda: import_export(ChatStream(file_path), db_path), 'importing the JSON file')
+
+
+def load_sqlite(db_path: str = 'result.db') -> MessageStore | None:
+    """
+    Open a database written by `import_sqlite`.
+
+    The analysis functions below answer their questions with indexed SQL queries on the
+    returned store. `MessageStore.filter` narrows it to a sender or a date range, for
+    example `get_repliers(store.filter(start='2023-03-01', end='2023-04-01'))`. The store
+    and its filtered views share one connection, released by `store.close()` or at the end
+    of a `with load_sqlite() as store:` block.
+
+    Args:
+    - db_path (str): The path of the database. Defaults to 'result.db'.
 
     Returns:
-    - data (dict): The loaded JSON data.
+    - store (MessageStore): The imported messages, usable wherever the loaded JSON data is.
+    - None: If the database cannot be opened.
+    """
+    try:
+        return MessageStore(db_path)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"An error occurred while opening the database: {e}")
+        return None
+
+
+def export_parquet(file_path: str = 'result.json', parquet_path: str = 'result.parquet',
+                   row_group_size: int = 1 << 17) -> int | None:
+    """
+    Export the specified export to a Parquet file, for pandas, polars, DuckDB and other tools.
+
+    The messages are streamed from the file and written one row group at a time, so memory
+    use is bounded by the row group size. Senders, `from_id` values and forward sources are
+    dictionary-encoded and dates are timestamps (see `arrow_export.schema`). Requires pyarrow.
+
+    Args:
+    - file_path (str): The path to the JSON file, possibly compressed.
+    - parquet_path (str): The path of the Parquet file to create. Defaults to 'result.parquet'.
+    - row_group_size (int): Number of messages per row group.
+
+    Returns:
+    - count (int): Number of messages written.
     - None: If an error occurs during file opening or JSON parsing.
     """
+    return _read_export(lambda: write_parquet(ChatStream(file_path), parquet_path, row_group_size),
+                        'exporting the JSON file')
+
+
+def load_parquet(parquet_path: str = 'result.parquet', columns: List[str] | None = None) -> Any | None:
+    """
+    Read a file written by `export_parquet`.
+
+    Args:
+    - parquet_path (str): The path of the Parquet file. Defaults to 'result.parquet'.
+    - columns (List[str]): Names of the columns to read, such as ['date', 'from']. Defaults to all of them.
+
+    Returns:
+    - table (pyarrow.Table): The messages; `table.to_pandas()` gives a DataFrame with categorical senders.
+    - None: If the file cannot be read.
+    """
     try:
-        with open(file_path, encoding='utf-8') as f:
-            data = json.load(f)
-        return data
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        print(f"An error occurred while loading the JSON file: {e}")
+        return read_parquet(parquet_path, columns)
+    except (OSError, ValueError) as e:
+        print(f"An error occurred while reading the Parquet file: {e}")
         return None
 
 
-def chat_info(data: dict) -> dict:
+def export_arrow(file_path: str = 'result.json', arrow_path: str = 'result.arrow') -> int | None:
+    """
+    Export the specified export to an Arrow IPC (Feather) file, which `load_arrow` maps without copying.
+
+    The file is larger than the Parquet one, being uncompressed, but reading it back takes
+    no time whatever its size. Requires pyarrow.
+
+    Args:
+    - file_path (str): The path to the JSON file, possibly compressed.
+    - arrow_path (str): The path of the Arrow file to create. Defaults to 'result.arrow'.
+
+    Returns:
+    - count (int): Number of messages written.
+    - None: If an error occurs during file opening or JSON parsing.
+    """
+    return _read_export(lambda: write_arrow(ChatStream(file_path), arrow_path), 'exporting the JSON file')
+
+
+def load_arrow(arrow_path: str = 'result.arrow') -> Any | None:
+    """
+    Memory-map a file written by `export_arrow`.
+
+    Args:
+    - arrow_path (str): The path of the Arrow file. Defaults to 'result.arrow'.
+
+    Returns:
+    - table (pyarrow.Table): The messages, backed by the mapped file.
+    - None: If the file cannot be opened.
+    """
+    try:
+        return read_arrow(arrow_path)
+    except (OSError, ValueError) as e:
+        print(f"An error occurred while opening the Arrow file: {e}")
+        return None
+
+
+def build_text_index(file_path: str = 'result.json', index_path: str = 'result.index') -> TextIndex | None:
+    """
+    Build a full-text index of the specified export, for `search_messages`.
+
+    The messages are streamed from the file, so the export never has to fit in memory.
+
+    Args:
+    - file_path (str): The path to the JSON file, possibly compressed.
+    - index_path (str): The path of the index to create. Defaults to 'result.index'.
+
+    Returns:
+    - index (TextIndex): The index, memory-mapped from the written file.
+    - None: If an error occurs during file opening or JSON parsing.
+    """
+    return _read_export(lambda: build_index(ChatStream(file_path), index_path), 'indexing the JSON file')
+
+
+def load_text_index(index_path: str = 'result.index') -> TextIndex | None:
+    """
+    Open an index written by `build_text_index`.
+
+    Args:
+    - index_path (str): The path of the index. Defaults to 'result.index'.
+
+    Returns:
+    - index (TextIndex): The index.
+    - None: If the index cannot be opened.
+    """
+    try:
+        return TextIndex.open(index_path)
+    except (OSError, ValueError) as e:
+        print(f"An error occurred while opening the index: {e}")
+        return None
+
+
+def search_messages(index: TextIndex, query: str, sender: str | None = None, start: str | None = None,
+                    end: str | None = None, limit: int | None = None) -> list:
+    """
+    Find who said something, and when.
+
+    Words separated by spaces must all occur in a message, in any order; double quotes
+    match an exact phrase and `OR` separates alternatives, for example
+    `"machine learning" python OR rust`. Words are matched case-insensitively.
+
+    Args:
+    - index (TextIndex): The index returned by `build_text_index` or `load_text_index`.
+    - query (str): The query.
+    - sender (str): Only return messages from this sender. Defaults to None.
+    - start (str): Only return messages dated at or after this ISO 8601 date, such as '2023-03-01'.
+    - end (str): Only return messages dated before this ISO 8601 date.
+    - limit (int): Number of messages to return, the earliest first. Defaults to None, which returns all of them.
+
+    Returns:
+    - hits (list): List of dictionaries with the ordinal, id, sender and date of each matching message.
+    """
+    return index.hits(index.search(query, sender, start, end)[:limit])
+
+
+def load_chats(file_path: str = 'result.json') -> Iterator[Any]:
+    """
+    Iterate over the chats of the specified export, whether it holds one chat or a whole account.
+
+    A single-chat export yields one `ChatStream`. A full-account export yields the chats
+    under `chats.list` one at a time, each shaped like a single-chat export, so memory use
+    is bounded by the largest chat rather than the whole account.
+
+    Args:
+    - file_path (str): The path to the JSON file.
+
+    Returns:
+    - chats (Iterator): The chats, usable wherever the loaded JSON data is.
+    """
+    if is_account_export(file_path):
+        return iter_chats(file_path)
+    return iter([ChatStream(file_path)])
+
+
+def analyze_account(file_path: str = 'result.json', output_dir: str = 'results', metrics: List[str] | None = None,
+                    workers: int | None = None) -> dict | None:
+    """
+    Analyse every chat of the specified export in parallel and write the results to a directory.
+
+    One `chat_<id>.json` file is written per chat, plus a `summary.json` file with the
+    results over all chats together.
+
+    Args:
+    - file_path (str): The path to the JSON file, a full-account or a single-chat export.
+    - output_dir (str): The directory to write the results to. Defaults to 'results'.
+    - metrics (List[str]): Names of the metrics to compute (see `engine.METRICS`). Defaults to all of them.
+    - workers (int): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+    - summary (dict): The number of chats and messages, the information of each chat and
+      the results over all chats together.
+    - None: If an error occurs during file opening or JSON parsing.
+    """
+    analysis = Analysis(*(metrics if metrics is not None else METRICS))
+    return _read_export(lambda: run_batch(analysis, file_path, output_dir, workers))
+
+
+def analyze_parallel(file_path: str = 'result.json', metrics: List[str] | None = None,
+                     workers: int | None = None) -> dict | None:
+    """
+    Compute several analyses of the specified export using multiple processes.
+
+    The messages are split into byte ranges that are parsed and aggregated by separate
+    worker processes; the partial results are merged into exactly what the corresponding
+    functions below return for the whole export.
+
+    Args:
+    - file_path (str): The path to the JSON file.
+    - metrics (List[str]): Names of the metrics to compute, such as 'senders' or
+      'most_active_hours' (see `engine.METRICS`). Defaults to all of them.
+    - workers (int): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+    - results (dict): Dictionary mapping each metric name to its result.
+    - None: If an error occurs during file opening or JSON parsing.
+    """
+    analysis = Analysis(*(metrics if metrics is not None else METRICS))
+    return _read_export(lambda: run_parallel(analysis, file_path, workers))
+
+
+def analyze_incremental(file_path: str = 'result.json', state_dir: str = 'analysis_state',
+                        metrics: List[str] | None = None) -> dict | None:
+    """
+    Compute several analyses of the specified export, reusing the work done on earlier exports of the same chat.
+
+    The state of each chat is saved in `state_dir` under the chat's `id`. When the chat is
+    exported again, only the messages past the last one already analysed, and the older
+    messages that were edited since, are processed.
+
+    Args:
+    - file_path (str): The path to the JSON file.
+    - state_dir (str): The directory holding the saved states. Defaults to 'analysis_state'.
+    - metrics (List[str]): Names of the metrics to compute (see `engine.METRICS`). Defaults to all of them.
+
+    Returns:
+    - results (dict): Dictionary mapping each metric name to its result.
+    - None: If an error occurs during file opening or JSON parsing.
+    """
+    analysis = Analysis(*(metrics if metrics is not None else METRICS))
+    return _read_export(lambda: update_analysis(analysis, file_path, state_dir))
+
+
+def chat_info(data: dict, start: str | None = None, end: str | None = None) -> dict:
     """
     Extract chat information from the JSON data.
 
     Args:
     - data (dict): The JSON data.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
 
     Returns:
     - chat_info (dict): Dictionary containing chat information.
     """
-    chat = data
-    messages_count = len(data.get('messages', []))
+    chat = data if hasattr(data, 'get') else {}
+    chats = chat.get('chats')
+    if isinstance(chats, dict) and 'list' in chats:
+        # A full-account export: report the account and the totals over its chats.
+        person = chat.get('personal_information', {})
+        name = ' '.join(part for part in (person.get('first_name'), person.get('last_name')) if part)
+        return {
+            'name': name or 'Unknown',
+            'type': 'account',
+            'id': person.get('user_id', 'Unknown'),
+            'messages_count': sum(len(item.get('messages', [])) for item in chats['list']),
+            'chats_count': len(chats['list'])
+        }
+    data = window(data, start, end)
+    if isinstance(data, (MessageTable, MessageStore)):
+        messages_count = len(data)
+    else:
+        messages = iter_messages(data)
+        messages_count = len(messages) if isinstance(messages, list) else sum(1 for _ in messages)
 
     chat_info = {
         'name': chat.get('name', 'Unknown'),
@@ -49,26 +402,23 @@ def chat_info(data: dict) -> dict:
     return chat_info
 
 
-def get_oldest_message(data: dict) -> dict:
+def get_oldest_message(data: dict, start: str | None = None, end: str | None = None) -> dict:
     """
     Retrieves the oldest message from the JSON data.
 
+    The data returned by `load_json` and `load_table`, and a `MessageStore`, look the message
+    up in their date index; other data is scanned once.
+
     Args:
     - data (dict): The JSON data.
+    - start (str): Only consider messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only consider messages dated before this ISO 8601 date.
 
     Returns:
-    - oldest_message (dict): Dictionary containing the oldest message with full timestamp.
+    - oldest_message (dict): A copy of the oldest message, with its date replaced by the full timestamp.
     """
-
-    oldest_message = {'date': '9999-12-31T23:59:59'}
-
-    for message in data.get('messages', []):
-        if 'date' in message and message['date'] < oldest_message['date']:
-            oldest_message = message
-
-    oldest_message['date'] = extract_date_info(oldest_message)
-
-    return oldest_message
+    oldest_message = edge_message(data, start=start, end=end) or {'date': '9999-12-31T23:59:59'}
+    return {**oldest_message, 'date': extract_date_info(oldest_message)}
 
 
 def extract_date_info(message: dict) -> dict:
@@ -97,580 +447,729 @@ def extract_date_info(message: dict) -> dict:
     return date_info
 
 
-def get_latest_message(data: dict) -> dict:
+def get_latest_message(data: dict, start: str | None = None, end: str | None = None) -> dict:
     """
     Retrieves the latest message from the JSON data.
 
+    The data returned by `load_json` and `load_table`, and a `MessageStore`, look the message
+    up in their date index; other data is scanned once.
+
     Args:
     - data (dict): The JSON data.
+    - start (str): Only consider messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only consider messages dated before this ISO 8601 date.
 
     Returns:
-    - latest_message (dict): Dictionary containing the latest message with full timestamp.
+    - latest_message (dict): A copy of the latest message, with its date replaced by the full timestamp.
     """
-    latest_message = {'date': '0000-01-01T00:00:00'}
-
-    for message in data.get('messages', []):
-        if 'date' in message and message['date'] > latest_message['date']:
-            latest_message = message
-
-    latest_message['date'] = extract_date_info(latest_message)
-    return latest_message
+    latest_message = edge_message(data, latest=True, start=start, end=end) or {'date': '0000-01-01T00:00:00'}
+    return {**latest_message, 'date': extract_date_info(latest_message)}
 
 
-def get_senders(data: dict) -> list:
+def get_senders(data: dict, top_n: int | None = None, start: str | None = None, end: str | None = None) -> list:
     """
     Extracts the list of unique senders from the JSON data and ranks them by the number of messages they sent.
 
     Args:
     - data (dict): The JSON data.
+    - top_n (int): Number of senders to return. Defaults to None, which returns all of them.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
 
     Returns:
     - senders_ranked (list): List of dictionaries containing sender names and the total number of messages they sent.
     """
-    sender_count = defaultdict(int)
+    return Analysis().add('senders', top_n=top_n).run(data, start, end)['senders']
 
-    for message in data.get('messages', []):
-        if 'from' in message:
-            sender = message['from']
-            sender = sender if sender is not None else 'Deleted Account'
-            sender_count[sender] += 1
 
-    senders_ranked = [{'sender': sender, 'messages': count} for sender, count in
-                      sorted(sender_count.items(), key=lambda x: x[1], reverse=True)]
-    return senders_ranked
-
-
-def count_forwarded_messages(data: dict) -> int:
+def count_forwarded_messages(data: dict, start: str | None = None, end: str | None = None) -> int:
     """
     Count the number of forwarded messages in the provided JSON data.
 
     Args:
     - data (dict): The JSON data.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
 
     Returns:
     - count (int): The number of forwarded messages.
     """
-    count = 0
-    for message in data.get('messages', []):
-        if 'forwarded_from' in message:
-            count += 1
-    return count
+    return analyze(data, 'forwarded_count', start=start, end=end)['forwarded_count']
 
 
-def get_forwarded_messages(data: dict) -> list:
+def get_forwarded_messages(data: dict, start: str | None = None, end: str | None = None) -> list:
     """
     Extract all forwarded messages from the provided JSON data.
 
     Args:
     - data (dict): The JSON data.
+    - start (str): Only return messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only return messages dated before this ISO 8601 date.
 
     Returns:
     - forwarded_messages (list): List of dictionaries containing forwarded messages.
     """
     forwarded_messages = []
-    for message in data.get('messages', []):
+    for message in iter_messages(window(data, start, end)):
         if 'forwarded_from' in message:
             forwarded_messages.append(message)
     return forwarded_messages
 
 
-def get_forwarders(data: dict) -> dict:
+def get_forwarders(data: dict, top_n: int | None = 100, start: str | None = None, end: str | None = None) -> dict:
     """
     Get a ranking of forwarders based on the number of messages they forwarded.
 
     Args:
     - data (dict): The JSON data.
+    - top_n (int): Number of forwarders to return. Defaults to 100; None returns all of them.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
 
     Returns:
     - forwarder_ranking (dict): Dictionary containing forwarders ranked by the number of messages they forwarded.
     """
-    forwarder_count = defaultdict(int)
-
-    for message in data.get('messages', []):
-        if 'forwarded_from' in message:
-            forwarder = message['from']
-            forwarder = forwarder if forwarder is not None else 'Deleted Account'
-            forwarder_count[forwarder] += 1
-
-    sorted_forwarders = sorted(forwarder_count.items(), key=lambda x: x[1], reverse=True)[:100]
-    forwarder_ranking = dict(sorted_forwarders)
-    return forwarder_ranking
+    return Analysis().add('forwarders', top_n=top_n).run(data, start, end)['forwarders']
 
 
-def get_forward_sources(data: dict) -> dict:
+def get_forward_sources(data: dict, top_n: int | None = 100, start: str | None = None, end: str | None = None) -> dict:
     """
     Get a dictionary of users (forward sources) with the number of messages they are the source for,
     sorted from largest to smallest based on the number of messages.
 
     Args:
     - data (dict): The JSON data.
+    - top_n (int): Number of forward sources to return. Defaults to 100; None returns all of them.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
 
     Returns:
     - forward_sources_count (dict): Dictionary of users with the number of messages they are the source for,
                                     sorted from largest to smallest based on the number of messages.
     """
-    forward_sources_count = defaultdict(int)
+    return Analysis().add('forward_sources', top_n=top_n).run(data, start, end)['forward_sources']
 
-    for message in data.get('messages', []):
-        if 'forwarded_from' in message:
-            forward_source = message['forwarded_from']
-            forward_source = forward_source if forward_source is not None else 'Deleted Account'
-            forward_sources_count[forward_source] += 1
-
-    sorted_forward_sources = sorted(forward_sources_count.items(), key=lambda x: x[1], reverse=True)[:100]
-    forward_sources_count = dict(sorted_forward_sources)
-
-    return forward_sources_count
 
-
-def count_replies(data: dict) -> int:
+def count_replies(data: dict, start: str | None = None, end: str | None = None) -> int:
     """
     Count all replies in the JSON data.
 
     Args:
     - data (dict): The JSON data.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
 
     Returns:
     - reply_count (int): The total number of replies.
     """
-    reply_count = 0
+    return analyze(data, 'reply_count', start=start, end=end)['reply_count']
 
-    for message in data.get('messages', []):
-        if 'reply_to_message_id' in message:
-            reply_count += 1
 
-    return reply_count
-
-
-def get_replies(data: dict) -> list:
+def get_replies(data: dict, start: str | None = None, end: str | None = None) -> list:
     """
     Get a list of all messages that are replies to other messages from the JSON data.
 
     Args:
     - data (dict): The JSON data.
+    - start (str): Only return messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only return messages dated before this ISO 8601 date.
 
     Returns:
     - replies (list): List of all reply messages.
     """
     replies = []
 
-    for message in data.get('messages', []):
+    for message in iter_messages(window(data, start, end)):
         if 'reply_to_message_id' in message:
             replies.append(message)
 
     return replies
 
 
-def get_repliers(data: dict) -> dict:
+def get_repliers(data: dict, top_n: int | None = 100, start: str | None = None, end: str | None = None) -> dict:
     """
     Get a ranking of repliers based on the number of messages they replied to.
 
     Args:
     - data (dict): The JSON data.
+    - top_n (int): Number of repliers to return. Defaults to 100; None returns all of them.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
 
     Returns:
     - replier_ranking (dict): Dictionary containing repliers ranked by the number of messages they replied to.
     """
-    replier_count = defaultdict(int)
+    return Analysis().add('repliers', top_n=top_n).run(data, start, end)['repliers']
 
-    for message in data.get('messages', []):
-        replier = message.get('from', 'Deleted Account') if message.get('from') is not None else 'Deleted Account'
-        if 'reply_to_message_id' in message:
-            replier_count[replier] += 1
 
-    sorted_repliers = sorted(replier_count.items(), key=lambda x: x[1], reverse=True)[:100]
-    replier_ranking = dict(sorted_repliers)
-    return replier_ranking
+def get_reply_threads(data: dict, top_n: int | None = 10, start: str | None = None, end: str | None = None) -> dict:
+    """
+    Measure the reply threads: each message that was replied to, together with all the replies that follow from it.
 
+    Args:
+    - data (dict): The JSON data.
+    - top_n (int): Number of largest and deepest threads to return. Defaults to 10.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
 
-def count_edited_messages(data: dict) -> int:
+    Returns:
+    - reply_threads (dict): The number of threads, the depth of the deepest one, and the largest and
+      deepest threads, each described by the id and sender of its root message, its size (number of
+      messages), its depth (longest chain of replies) and its fan-out (most direct replies to one message).
     """
-    Count the number of edited messages in the JSON data.
+    return Analysis().add('reply_threads', top_n=top_n).run(data, start, end)['reply_threads']
+
+
+def get_most_replied_messages(data: dict, top_n: int | None = 10,
+                              start: str | None = None, end: str | None = None) -> list:
+    """
+    Get the top N messages that received the most direct replies.
 
     Args:
     - data (dict): The JSON data.
+    - top_n (int): Number of messages to return. Defaults to 10.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
 
     Returns:
-    - edited_count (int): The number of edited messages.
+    - most_replied_messages (list): List of dictionaries with the id and sender of each message and its number of replies.
     """
-    edited_count = 0
+    return Analysis().add('most_replied_messages', top_n=top_n).run(data, start, end)['most_replied_messages']
 
-    for message in data.get('messages', []):
-        if 'edited' in message:
-            edited_count += 1
 
-    return edited_count
+def get_most_replied_users(data: dict, top_n: int | None = 10,
+                           start: str | None = None, end: str | None = None) -> dict:
+    """
+    Get the top N users whose messages received the most replies.
+
+    Args:
+    - data (dict): The JSON data.
+    - top_n (int): Number of users to return. Defaults to 10.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+
+    Returns:
+    - most_replied_users (dict): Dictionary mapping users to the number of replies their messages received.
+    """
+    return Analysis().add('most_replied_users', top_n=top_n).run(data, start, end)['most_replied_users']
+
+
+def get_reply_latency(data: dict, top_n: int | None = 10, start: str | None = None, end: str | None = None) -> dict:
+    """
+    Measure how fast users answer each other, from the time between each reply and the message it replies to.
+
+    Replies to one's own messages, and replies to messages that are not in the export, are left out.
+
+    Args:
+    - data (dict): The JSON data.
+    - top_n (int): Number of users and of user pairs to return, those with the most replies first. Defaults to 10.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+
+    Returns:
+    - reply_latency (dict): The overall latency distribution, the distribution of each replying user under
+      'users', and of each replier and replied-to user under 'pairs'. Each distribution holds the number of
+      replies, the median and 90th percentile latency in seconds, and a histogram of replies per latency bucket.
+    """
+    return Analysis().add('reply_latency', top_n=top_n).run(data, start, end)['reply_latency']
 
 
-def get_edited_messages(data: dict) -> list:
+def count_edited_messages(data: dict, start: str | None = None, end: str | None = None) -> int:
+    """
+    Count the number of edited messages in the JSON data.
+
+    Args:
+    - data (dict): The JSON data.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+
+    Returns:
+    - edited_count (int): The number of edited messages.
+    """
+    return analyze(data, 'edited_count', start=start, end=end)['edited_count']
+
+
+def get_edited_messages(data: dict, start: str | None = None, end: str | None = None) -> list:
     """
     Get a list of all edited messages from the JSON data.
 
     Args:
     - data (dict): The JSON data.
+    - start (str): Only return messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only return messages dated before this ISO 8601 date.
 
     Returns:
     - edited_messages (list): List of all edited messages.
     """
     edited_messages = []
 
-    for message in data.get('messages', []):
+    for message in iter_messages(window(data, start, end)):
         if 'edited' in message:
             edited_messages.append(message)
 
     return edited_messages
 
 
-def get_editors(data: dict) -> dict:
+def get_editors(data: dict, top_n: int | None = 100, start: str | None = None, end: str | None = None) -> dict:
     """
     Get a ranking of editors based on the number of edited messages.
 
     Args:
     - data (dict): The JSON data.
+    - top_n (int): Number of editors to return. Defaults to 100; None returns all of them.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
 
     Returns:
     - editor_ranking (dict): Dictionary containing editors ranked by the number of edited messages.
     """
-    editor_count = defaultdict(int)
-
-    for message in data.get('messages', []):
-        if 'edited' in message:
-            editor = message.get('from')
-            if editor is None:
-                editor = 'Deleted Account'
-            editor_count[editor] += 1
+    return Analysis().add('editors', top_n=top_n).run(data, start, end)['editors']
 
-    sorted_editors = sorted(editor_count.items(), key=lambda x: x[1], reverse=True)[:100]
-    editor_ranking = dict(sorted_editors)
-    return editor_ranking
 
-
-def get_longest_messages(data: dict) -> list:
+def get_longest_messages(data: dict, start: str | None = None, end: str | None = None) -> list:
     """
     Get the messages with the longest text from the JSON data
 
     Args:
     - data (dict): The JSON data.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
 
     Returns:
     - longest_messages (list): List of dictionaries containing the text and sender of the messages with the longest text.
     """
-    longest_messages = []
-    max_length = 0
-
-    for message in data.get('messages', []):
+    return analyze(data, 'longest_messages', start=start, end=end)['longest_messages']
 
-        text = message.get('text', '')
-        length = len(text)
-        if length > max_length:
-            longest_messages = [{'text': text, 'sender': message.get('from', 'Unknown')}]
-            max_length = length
-        elif length == max_length:
-            longest_messages.append({'text': text, 'sender': message.get('from', 'Unknown')})
 
-    return longest_messages
-
-
-def get_most_common_words(data: dict, top_n=10) -> list:
+def get_most_common_words(data: dict, top_n: int | None = 10, stopwords: Iterable[str] | None = None,
+                          min_length: int = 1, workers: int = 1,
+                          start: str | None = None, end: str | None = None) -> list:
     """
     Get the top N most common single words in the text key of messages
 
+    Formatted parts of rich texts, such as links and bold text, are counted as well.
+
     Args:
     - data (dict): The JSON data.
     - top_n (int): Number of top words to return.
+    - stopwords (Iterable[str]): Lowercase words to leave out, such as `tokenizer.ENGLISH_STOPWORDS`.
+    - min_length (int): Words shorter than this many characters are left out. Defaults to 1.
+    - workers (int): Number of processes counting words. Defaults to 1.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
 
     Returns:
     - most_common_words (list): List of dictionaries containing the top N most common single words along with their occurrences.
     """
-    words_count = Counter()
+    stopwords = sorted(stopwords) if stopwords is not None else None
+    if workers > 1:
+        counts = count_words(iter_messages(window(data, start, end)), Tokenizer(stopwords, min_length), workers=workers)
+        return [{'word': word, 'occurrence': count} for word, count in top_items(counts, top_n)]
+    analysis = Analysis().add('most_common_words', top_n=top_n, stopwords=stopwords, min_length=min_length)
+    return analysis.run(data, start, end)['most_common_words']
+
+
+def get_ngrams(data: dict, n: int = 2, top_n: int | None = 10, stopwords: Iterable[str] | None = None,
+               min_length: int = 1, max_size: int | None = None, by_sender: bool = False,
+               start: str | None = None, end: str | None = None) -> list | dict:
+    """
+    Get the top N most common n-grams, such as bigrams or trigrams, in the text of messages.
+
+    An n-gram never spans two messages or two lines of a message.
+
+    Args:
+    - data (dict): The JSON data.
+    - n (int): Number of words per n-gram. Defaults to 2, for bigrams.
+    - top_n (int): Number of top n-grams to return.
+    - stopwords (Iterable[str]): N-grams containing these lowercase words are left out.
+    - min_length (int): N-grams containing words shorter than this many characters are left out.
+    - max_size (int): Maximum number of distinct n-grams kept while counting, the rarest being
+      pruned. Defaults to None, keeping them all.
+    - by_sender (bool): Return the top n-grams of each sender. Defaults to False.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+
+    Returns:
+    - ngrams (list | dict): List of dictionaries with each n-gram, its words separated by a space, and
+      its occurrences; with `by_sender`, a dictionary mapping each sender to such a list.
+    """
+    stopwords = sorted(stopwords) if stopwords is not None else None
+    analysis = Analysis().add('ngrams', n=n, top_n=top_n, stopwords=stopwords, min_length=min_length,
+                              max_size=max_size, by_sender=by_sender)
+    return analysis.run(data, start, end)['ngrams']
 
-    for message in data.get('messages', []):
 
-        text = message.get('text', '')
-        if isinstance(text, list):
-            text = ' '.join(str(item) for item in text if isinstance(item, str))
-        elif isinstance(text, dict):
+def get_collocations(data: dict, n: int = 2, top_n: int | None = 10, min_count: int = 5,
+                     stopwords: Iterable[str] | None = None, min_length: int = 1, max_size: int | None = None,
+                     by_sender: bool = False, start: str | None = None, end: str | None = None) -> list | dict:
+    """
+    Get the top N collocations: n-grams whose words occur together far more often than by chance.
 
-            text = str(text)
+    N-grams are ranked by pointwise mutual information (PMI), the base 2 logarithm of how
+    many times more often their words occur together than if they were independent.
 
-        words = re.findall(r'\b\w+\b', text.lower())
-        words_count.update(words)
+    Args:
+    - data (dict): The JSON data.
+    - n (int): Number of words per n-gram. Defaults to 2, for bigrams.
+    - top_n (int): Number of top collocations to return.
+    - min_count (int): N-grams occurring fewer times are left out. Defaults to 5.
+    - stopwords (Iterable[str]): N-grams containing these lowercase words are left out.
+    - min_length (int): N-grams containing words shorter than this many characters are left out.
+    - max_size (int): Maximum number of distinct n-grams kept while counting. Defaults to None.
+    - by_sender (bool): Return the top collocations of each sender. Defaults to False.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
 
-    most_common_words = words_count.most_common(top_n)
-    top_words_list = []
-    for word, count in most_common_words:
-        top_words_list.append({'word': word, 'occurrence': count})
-    return top_words_list
+    Returns:
+    - collocations (list | dict): List of dictionaries with each n-gram, its PMI and its occurrences;
+      with `by_sender`, a dictionary mapping each sender to such a list.
+    """
+    stopwords = sorted(stopwords) if stopwords is not None else None
+    analysis = Analysis().add('collocations', n=n, top_n=top_n, stopwords=stopwords, min_length=min_length,
+                              max_size=max_size, by_sender=by_sender, min_count=min_count)
+    return analysis.run(data, start, end)['collocations']
 
 
-def get_most_active_users(data: dict, top_n: int = 10) -> list:
+def get_unique_senders(data: dict, period: str = 'day', error: float = 0.02, start: str | None = None,
+                       end: str | None = None, tz: str | float | None = None) -> dict:
     """
-    Get the top N most active users based on the number of messages they sent, replacing None with "Deleted User".
+    Estimate the number of distinct senders per day, week or month, in a fixed amount of memory per day.
+
+    Senders are told apart by their `from_id` and counted with HyperLogLog sketches rather than sets.
 
     Args:
     - data (dict): The JSON data.
-    - top_n (int): The number of top users to return. Defaults to 10.
+    - period (str): 'day', 'week' (starting on Monday) or 'month'. Defaults to 'day'.
+    - error (float): Target relative standard error of the counts. Defaults to 0.02.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+    - tz (str | float): Time zone to count in, such as 'Africa/Addis_Ababa' or 'Europe/Berlin', or a fixed offset
+      from UTC in hours such as 3. Defaults to None, which counts in the export's local time.
 
     Returns:
-    - top_active_users (list): List of dictionaries containing information about the top active users.
+    - unique_senders (dict): 'periods', a list of dictionaries with the first day of each period and its
+      estimated number of senders; 'total', the estimated number of senders overall; and 'error'.
+    """
+    analysis = Analysis().add('unique_senders', period=period, error=error, tz=tz)
+    return analysis.run(data, start, end)['unique_senders']
+
+
+def get_sender_sketch(data: dict, error: float = 0.02, start: str | None = None, end: str | None = None,
+                      tz: str | float | None = None) -> DailyDistinct:
     """
-    user_message_count = defaultdict(int)
+    Build the daily HyperLogLog sketches of the senders, to count distinct senders over any dates without a rescan.
 
-    for message in data.get('messages', []):
-        if 'from' in message:
-            sender = message['from']
-            sender = sender if sender is not None else 'Deleted Account'
-            user_message_count[sender] += 1
-    sorted_users = sorted(user_message_count.items(), key=lambda x: x[1], reverse=True)[:top_n]
-    top_active_users = [{'user': user, 'message_count': count} for user, count in sorted_users]
+    `count(start, end)` estimates the distinct senders between two dates and `periods(period)`
+    per day, week or month. Sketches of other chats or exports merge in with `merge`.
 
-    return top_active_users
+    Args:
+    - data (dict): The JSON data.
+    - error (float): Target relative standard error of the counts. Defaults to 0.02.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+    - tz (str | float): Time zone to count in, such as 'Africa/Addis_Ababa' or 'Europe/Berlin', or a fixed offset
+      from UTC in hours such as 3. Defaults to None, which counts in the export's local time.
 
+    Returns:
+    - sender_sketch (DailyDistinct): The sketches of the senders of each day.
+    """
+    return Analysis().add('unique_senders', error=error, tz=tz).scan(data, start, end)['unique_senders'].sketch
 
-def get_average_message_length(data):
-    total_length = 0
-    total_messages = 0
 
-    for message in data.get('messages', []):
-        text = message.get('text', '')
-        total_length += len(text)
-        total_messages += 1
+def get_approximate_most_common_words(data: dict, top_n: int | None = 10, epsilon: float = 1e-4,
+                                      memory: int | None = None, stopwords: Iterable[str] | None = None,
+                                      min_length: int = 1, start: str | None = None, end: str | None = None) -> dict:
+    """
+    Estimate the top N most common words in a fixed amount of memory.
 
-    if total_messages == 0:
-        return 0
+    Words are counted in a Count-Min sketch instead of a dictionary, so memory does not
+    grow with the vocabulary. Estimated occurrences are never below the true ones.
 
-    average_length = total_length / total_messages
-    return average_length
+    Args:
+    - data (dict): The JSON data.
+    - top_n (int): Number of top words to return.
+    - epsilon (float): Target error, as a fraction of the total number of words.
+    - memory (int): Maximum size of the sketch in bytes. Defaults to None, sizing it from `epsilon`.
+    - stopwords (Iterable[str]): Lowercase words to leave out, such as `tokenizer.ENGLISH_STOPWORDS`.
+    - min_length (int): Words shorter than this many characters are left out. Defaults to 1.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
 
+    Returns:
+    - approximate_words (dict): The ranking, a list of dictionaries with the word and its estimated
+      occurrences, along with the achieved error (`epsilon`, `error_bound`, `confidence`, `total`, `memory_bytes`).
+    """
+    stopwords = sorted(stopwords) if stopwords is not None else None
+    analysis = Analysis().add('approximate_words', top_n=top_n, epsilon=epsilon, memory=memory,
+                              stopwords=stopwords, min_length=min_length)
+    return analysis.run(data, start, end)['approximate_words']
 
-def each_average_message_length(data: dict) -> dict:
-    from collections import defaultdict
-    user_lengths = defaultdict(int)
-    user_counts = defaultdict(int)
 
-    for message in data.get('messages', []):
-        if 'from' in message:
-            message_text = message.get('text', '')
-            message_length = len(message_text) if isinstance(message_text, str) else sum(
-                len(part['text']) for part in message_text if isinstance(part, dict))
-            user_lengths[message['from']] += message_length
-            user_counts[message['from']] += 1
+def get_approximate_senders(data: dict, top_n: int | None = 10, epsilon: float = 1e-4,
+                            memory: int | None = None, start: str | None = None, end: str | None = None) -> dict:
+    """
+    Estimate the top N senders by number of messages in a fixed amount of memory.
 
-    average_lengths = {user: user_lengths[user] / user_counts[user] for user in user_lengths}
-    return average_lengths
+    Args:
+    - data (dict): The JSON data.
+    - top_n (int): Number of top senders to return.
+    - epsilon (float): Target error, as a fraction of the total number of messages.
+    - memory (int): Maximum size of the sketch in bytes. Defaults to None, sizing it from `epsilon`.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+
+    Returns:
+    - approximate_senders (dict): The ranking, a list of dictionaries with the sender and their estimated
+      number of messages, along with the achieved error.
+    """
+    analysis = Analysis().add('approximate_senders', top_n=top_n, epsilon=epsilon, memory=memory)
+    return analysis.run(data, start, end)['approximate_senders']
 
 
-def get_most_active_hours(data: dict) -> list[tuple[Any, int]]:
+def get_approximate_forward_sources(data: dict, top_n: int | None = 100, epsilon: float = 1e-4,
+                                    memory: int | None = None,
+                                    start: str | None = None, end: str | None = None) -> dict:
     """
-    Calculates the most active hours in the Telegram group.
+    Estimate the top N sources of forwarded messages in a fixed amount of memory.
 
     Args:
-    - data (dict): The JSON data from the Telegram group export.
+    - data (dict): The JSON data.
+    - top_n (int): Number of top sources to return. Defaults to 100.
+    - epsilon (float): Target error, as a fraction of the total number of forwarded messages.
+    - memory (int): Maximum size of the sketch in bytes. Defaults to None, sizing it from `epsilon`.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
 
     Returns:
-    - active_hours (Counter): A Counter object with hours as keys and message counts as values.
+    - approximate_forward_sources (dict): The ranking, a list of dictionaries with the source and its
+      estimated number of forwarded messages, along with the achieved error.
     """
+    analysis = Analysis().add('approximate_forward_sources', top_n=top_n, epsilon=epsilon, memory=memory)
+    return analysis.run(data, start, end)['approximate_forward_sources']
 
-    active_hours = Counter()
 
-    for message in data.get('messages', []):
-        message_date = datetime.fromisoformat(message['date'])
-        active_hours[message_date.hour] += 1
+def get_most_active_users(data: dict, top_n: int | None = 10, start: str | None = None, end: str | None = None) -> list:
+    """
+    Get the top N most active users based on the number of messages they sent, replacing None with "Deleted User".
+
+    Args:
+    - data (dict): The JSON data.
+    - top_n (int): The number of top users to return. Defaults to 10.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+
+    Returns:
+    - top_active_users (list): List of dictionaries containing information about the top active users.
+    """
+    return Analysis().add('most_active_users', top_n=top_n).run(data, start, end)['most_active_users']
+
 
-    return active_hours.most_common()
+def get_average_message_length(data, start: str | None = None, end: str | None = None):
+    return analyze(data, 'average_message_length', start=start, end=end)['average_message_length']
 
 
-def get_most_active_days(data: dict) -> list[tuple[Any, int]]:
+def each_average_message_length(data: dict, start: str | None = None, end: str | None = None) -> dict:
+    return analyze(data, 'each_average_message_length', start=start, end=end)['each_average_message_length']
+
+
+def get_most_active_hours(data: dict, top_n: int | None = None,
+                          start: str | None = None, end: str | None = None,
+                          tz: str | float | None = None) -> list[tuple[Any, int]]:
+    """
+    Calculates the most active hours in the Telegram group.
+
+    Args:
+    - data (dict): The JSON data from the Telegram group export.
+    - top_n (int): Number of hours to return. Defaults to None, which returns all of them.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+    - tz (str | float): Time zone to count in, such as 'Africa/Addis_Ababa' or 'Europe/Berlin', or a fixed offset
+      from UTC in hours such as 3. Defaults to None, which counts in the export's local time.
+
+    Returns:
+    - active_hours (Counter): A Counter object with hours as keys and message counts as values.
+    """
+    return Analysis().add('most_active_hours', top_n=top_n, tz=tz).run(data, start, end)['most_active_hours']
+
+
+def get_most_active_days(data: dict, top_n: int | None = None,
+                         start: str | None = None, end: str | None = None,
+                         tz: str | float | None = None) -> list[tuple[Any, int]]:
     """
     Calculates the most active days in the Telegram group.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
+    - top_n (int): Number of days to return. Defaults to None, which returns all of them.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+    - tz (str | float): Time zone to count in, such as 'Africa/Addis_Ababa' or 'Europe/Berlin', or a fixed offset
+      from UTC in hours such as 3. Defaults to None, which counts in the export's local time.
 
     Returns:
     - active_days (Counter): A Counter object with days as keys and message counts as values.
     """
+    return Analysis().add('most_active_days', top_n=top_n, tz=tz).run(data, start, end)['most_active_days']
+
+
+def get_daily_activity(data: dict, window: int = 7, start: str | None = None, end: str | None = None,
+                       tz: str | float | None = None) -> dict:
+    """
+    Build daily time series of the activity in the Telegram group, for trend monitoring.
 
-    active_days = Counter()
+    Every day from the first to the last message is listed, days without messages included.
+    Active senders are told apart by their `from_id`.
 
-    for message in data.get('messages', []):
-        message_date = datetime.fromisoformat(message['date'])
-        active_days[message_date.strftime('%Y-%m-%d')] += 1
+    Args:
+    - data (dict): The JSON data from the Telegram group export.
+    - window (int): Number of days of the rolling sums and means. Defaults to 7.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+    - tz (str | float): Time zone to count in, such as 'Africa/Addis_Ababa' or 'Europe/Berlin', or a fixed offset
+      from UTC in hours such as 3. Defaults to None, which counts in the export's local time.
 
-    return active_days.most_common()
+    Returns:
+    - daily_activity (dict): Lists over the days: 'days', the dates; 'messages', 'replies' and 'forwards', the
+      daily counts; 'dau', 'wau' and 'mau', the distinct senders over the 1, 7 and 30 days ending with each day;
+      'dau_wau' and 'dau_mau', their ratios; and under 'rolling', the rolling sums and means of the counts.
+    """
+    return Analysis().add('daily_activity', window=window, tz=tz).run(data, start, end)['daily_activity']
 
 
-def get_most_active_weekdays(data: dict) -> list[tuple[Any, int]]:
+def get_most_active_weekdays(data: dict, top_n: int | None = None,
+                             start: str | None = None, end: str | None = None,
+                             tz: str | float | None = None) -> list[tuple[Any, int]]:
     """
     Calculates the most active weekdays in the Telegram group.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
+    - top_n (int): Number of weekdays to return. Defaults to None, which returns all of them.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+    - tz (str | float): Time zone to count in, such as 'Africa/Addis_Ababa' or 'Europe/Berlin', or a fixed offset
+      from UTC in hours such as 3. Defaults to None, which counts in the export's local time.
 
     Returns:
     - active_weekdays (Counter): A Counter object with weekdays as keys and message counts as values.
     """
+    return Analysis().add('most_active_weekdays', top_n=top_n, tz=tz).run(data, start, end)['most_active_weekdays']
 
-    active_weekdays = Counter()
 
-    for message in data.get('messages', []):
-        message_date = datetime.fromisoformat(message['date'])
-        active_weekdays[message_date.strftime('%A')] += 1
-
-    return active_weekdays.most_common()
-
-
-def get_most_active_months(data: dict) -> list[tuple[Any, int]]:
+def get_most_active_months(data: dict, top_n: int | None = None,
+                           start: str | None = None, end: str | None = None,
+                           tz: str | float | None = None) -> list[tuple[Any, int]]:
     """
     Calculates the most active months in the Telegram group.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
+    - top_n (int): Number of months to return. Defaults to None, which returns all of them.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+    - tz (str | float): Time zone to count in, such as 'Africa/Addis_Ababa' or 'Europe/Berlin', or a fixed offset
+      from UTC in hours such as 3. Defaults to None, which counts in the export's local time.
 
     Returns:
     - active_months (Counter): A Counter object with months as keys and message counts as values.
     """
+    return Analysis().add('most_active_months', top_n=top_n, tz=tz).run(data, start, end)['most_active_months']
 
-    active_months = Counter()
-
-    for message in data.get('messages', []):
-        message_date = datetime.fromisoformat(message['date'])
-        active_months[message_date.strftime('%Y-%m')] += 1
-
-    return active_months.most_common()
 
-
-def get_user_activity(data: dict) -> dict:
+def get_user_activity(data: dict, start: str | None = None, end: str | None = None,
+                      tz: str | float | None = None) -> dict:
     """
     Analyzes the activity of each user in the Telegram group based on different time dimensions.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+    - tz (str | float): Time zone to count in, such as 'Africa/Addis_Ababa' or 'Europe/Berlin', or a fixed offset
+      from UTC in hours such as 3. Defaults to None, which counts in the export's local time.
 
     Returns:
     - user_activity (dict): Dictionary containing user activity information.
     """
+    return Analysis().add('user_activity', tz=tz).run(data, start, end)['user_activity']
 
-    user_activity = defaultdict(lambda: defaultdict(Counter))
-
-    for message in data.get('messages', []):
-        sender = message.get('from', 'Deleted Account')
-        timestamp = message.get('date')
-        if sender and timestamp:
-            message_date = datetime.fromisoformat(timestamp)
-            hour = message_date.hour
-            day = message_date.strftime('%Y-%m-%d')
-            weekday = message_date.strftime('%A')
-            month = message_date.strftime('%Y-%m')
-
-            user_activity[sender]['Hour'][hour] += 1
-            user_activity[sender]['Day'][day] += 1
-            user_activity[sender]['Weekday'][weekday] += 1
-            user_activity[sender]['Month'][month] += 1
-
-    formatted_user_activity = {}
-    for user, activity_info in user_activity.items():
-        formatted_activity_info = {}
-        for time_dimension, counts in activity_info.items():
-            most_active_info = counts.most_common(1)
-            if most_active_info:
-                most_active_time = most_active_info[0][0]
-                most_active_count = most_active_info[0][1]
-            else:
-                most_active_time = 'N/A'
-                most_active_count = 0
-            formatted_activity_info[time_dimension] = {
-                'most_active': most_active_time,
-                'messages': most_active_count
-            }
-
-        overall_activity = sum(sum(counter.values()) for counter in activity_info.values())
-        formatted_activity_info['Overall'] = {
-            'most_active': 'N/A' if overall_activity == 0 else 'Overall',
-            'messages': overall_activity
-        }
-        formatted_user_activity[user] = formatted_activity_info
 
-    return formatted_user_activity
+def get_activity_cube(data: dict, start: str | None = None, end: str | None = None,
+                      tz: str | float | None = None) -> ActivityCube:
+    """
+    Count the messages of each user per weekday and hour of day, and per month and day, for further queries.
+
+    The cube gives each user's most active time through `most_active`, heatmaps of any users
+    through `heatmap`, and any slice of users, weekdays and hours through `select`.
+
+    Args:
+    - data (dict): The JSON data from the Telegram group export.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+    - tz (str | float): Time zone to count in, such as 'Africa/Addis_Ababa' or 'Europe/Berlin', or a fixed offset
+      from UTC in hours such as 3. Defaults to None, which counts in the export's local time.
+
+    Returns:
+    - activity_cube (ActivityCube): The message counts of every user.
+    """
+    return Analysis().add('user_activity', tz=tz).scan(data, start, end)['user_activity'].cube
 
 
-def get_most_active_year(data: dict) -> list[tuple[Any, int]]:
+def get_most_active_year(data: dict, top_n: int | None = None,
+                         start: str | None = None, end: str | None = None,
+                         tz: str | float | None = None) -> list[tuple[Any, int]]:
     """
     Calculates the most active year in the Telegram group.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
+    - top_n (int): Number of years to return. Defaults to None, which returns all of them.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+    - tz (str | float): Time zone to count in, such as 'Africa/Addis_Ababa' or 'Europe/Berlin', or a fixed offset
+      from UTC in hours such as 3. Defaults to None, which counts in the export's local time.
 
     Returns:
     - active_years (Counter): A Counter object with years as keys and message counts as values.
     """
+    return Analysis().add('most_active_year', top_n=top_n, tz=tz).run(data, start, end)['most_active_year']
 
-    active_years = Counter()
 
-    for message in data.get('messages', []):
-        message_date = datetime.fromisoformat(message['date'])
-        active_years[message_date.strftime('%Y')] += 1
-
-    return active_years.most_common()
-
-
-def get_most_active_months_all_time(data: dict) -> list:
+def get_most_active_months_all_time(data: dict, top_n: int | None = None,
+                                    start: str | None = None, end: str | None = None,
+                                    tz: str | float | None = None) -> list:
     """
     Calculates the most active months in the Telegram group for all months and all years.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
+    - top_n (int): Number of months to return. Defaults to None, which returns all of them.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+    - tz (str | float): Time zone to count in, such as 'Africa/Addis_Ababa' or 'Europe/Berlin', or a fixed offset
+      from UTC in hours such as 3. Defaults to None, which counts in the export's local time.
 
     Returns:
     - active_months_list (list): A list of dictionaries with 'name' and 'messages' as keys.
     """
+    analysis = Analysis().add('most_active_months_all_time', top_n=top_n, tz=tz)
+    return analysis.run(data, start, end)['most_active_months_all_time']
 
-    active_months = Counter()
-    month_names = {
-        '01': 'Jan', '02': 'Feb', '03': 'Mar', '04': 'Apr', '05': 'May', '06': 'Jun',
-        '07': 'Jul', '08': 'Aug', '09': 'Sep', '10': 'Oct', '11': 'Nov', '12': 'Dec'
-    }
-
-    for message in data.get('messages', []):
-        message_date = datetime.fromisoformat(message['date'])
-        month_num = message_date.strftime('%m')
-        active_months[month_names[month_num]] += 1
 
-    active_months_list = sorted([{'name': month, 'messages': count} for month, count in active_months.items()], key=lambda x: x['messages'], reverse=True)
-
-    return active_months_list
-
-
-def get_most_active_months_by_year(data: dict) -> dict:
+def get_most_active_months_by_year(data: dict, start: str | None = None, end: str | None = None,
+                                   tz: str | float | None = None) -> dict:
     """
     Calculates the most active months in the Telegram group for each year.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
+    - start (str): Only count messages dated at or after this ISO 8601 date, such as '2023-07-01'.
+    - end (str): Only count messages dated before this ISO 8601 date.
+    - tz (str | float): Time zone to count in, such as 'Africa/Addis_Ababa' or 'Europe/Berlin', or a fixed offset
+      from UTC in hours such as 3. Defaults to None, which counts in the export's local time.
 
     Returns:
     - active_months_by_year (dict): A dictionary with years as keys and a list of dictionaries
       for active months as values.
     """
-
-    active_months_by_year = {}
-    month_names = {
-        '01': 'Jan', '02': 'Feb', '03': 'Mar', '04': 'Apr', '05': 'May', '06': 'Jun',
-        '07': 'Jul', '08': 'Aug', '09': 'Sep', '10': 'Oct', '11': 'Nov', '12': 'Dec'
-    }
-
-    for message in data.get('messages', []):
-        message_date = datetime.fromisoformat(message['date'])
-        year = message_date.strftime('%Y')
-        month_num = message_date.strftime('%m')
-        month_name = month_names[month_num]
-
-        if year not in active_months_by_year:
-            active_months_by_year[year] = Counter()
-
-        active_months_by_year[year][month_name] += 1
-
-    for year, months_counter in active_months_by_year.items():
-        active_months_by_year[year] = [{'name': month, 'messages': count} for month, count in months_counter.items()]
-
-    return active_months_by_year
\ No newline at end of file
+    return Analysis().add('most_active_months_by_year', tz=tz).run(data, start, end)['most_active_months_by_year']
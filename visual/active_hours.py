@@ -1,25 +1,25 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 from matplotlib import pyplot as plt
 import seaborn as sns
 import sys
 sys.path.append('../')
 from tool import get_most_active_hours, load_json
 
-def visualize_bar(data: dict):
+def visualize_bar(data: dict, tz: str | float | None = 'Africa/Addis_Ababa'):
    
-    active_hours = get_most_active_hours(data)
+    active_hours = get_most_active_hours(data, tz=tz)
     hours, counts = zip(*active_hours)
 
-    # Convert UTC to Ethiopian time
-    ethiopian_hours = [(datetime.strptime(str(hour), '%H') + timedelta(hours=3)).strftime('%I %p') for hour in hours]
+    # The hours are already counted in local time, Ethiopian time unless another zone is given.
+    local_hours = [datetime.strptime(str(hour), '%H').strftime('%I %p') for hour in hours]
 
     
     colors = ['skyblue', 'orange', 'green', 'red', 'purple', 'yellow', 'brown', 'pink', 'gray', 'cyan', 'magenta', 'lightgreen']
 
     # Plotting the bar chart
     plt.figure(figsize=(12, 6))
-    plt.bar(ethiopian_hours, counts, color=colors)
-    plt.xlabel('Hour of the Day (Ethiopian Time)')
+    plt.bar(local_hours, counts, color=colors)
+    plt.xlabel(f"Hour of the Day ({tz if tz is not None else 'export time'})")
     plt.ylabel('Message Count')
     plt.title('Most Active Hours in the Telegram Group')
     plt.grid(axis='y', linestyle='--', alpha=0.7) 
@@ -28,17 +28,17 @@ def visualize_bar(data: dict):
     plt.show()
 
 
-def visualize_line(data: dict):
+def visualize_line(data: dict, tz: str | float | None = 'Africa/Addis_Ababa'):
     
-    active_hours = get_most_active_hours(data)
+    active_hours = get_most_active_hours(data, tz=tz)
     hours, counts = zip(*active_hours)
 
-    # Convert UTC to Ethiopian time
-    ethiopian_hours = [(datetime.strptime(str(hour), '%H') + timedelta(hours=3)).strftime('%I %p') for hour in hours]
+    # The hours are already counted in local time, Ethiopian time unless another zone is given.
+    local_hours = [datetime.strptime(str(hour), '%H').strftime('%I %p') for hour in hours]
 
     # Plotting the line chart
     plt.figure(figsize=(10, 6))
-    plt.plot(ethiopian_hours, counts, marker='o', color='skyblue', linestyle='-')
+    plt.plot(local_hours, counts, marker='o', color='skyblue', linestyle='-')
     plt.xlabel('Hour of the Day')
     plt.ylabel('Message Count')
     plt.title('Most Active Hours in the Telegram Group')
@@ -8,15 +8,17 @@ import numpy as np
 sys.path.append('../')
 from tool import get_most_active_months, get_most_active_months_all_time, get_most_active_months_by_year, load_json
 
-def visualize_bar_chart(data: dict):
+def visualize_bar_chart(data: dict, tz: str | float | None = None):
     """
     Visualize the most active months in the Telegram group for all months and all years using a bar chart.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
+    - tz (str | float): Time zone to chart in, such as 'Europe/Berlin', or an offset from UTC in hours.
+      Defaults to the export's local time.
     """
     
-    active_months_list = get_most_active_months_all_time(data)
+    active_months_list = get_most_active_months_all_time(data, tz=tz)
 
     
     months = [month['name'] for month in active_months_list]
@@ -32,15 +34,17 @@ def visualize_bar_chart(data: dict):
     plt.tight_layout()
     plt.show()
 
-def visualize_line_chart(data: dict):
+def visualize_line_chart(data: dict, tz: str | float | None = None):
     """
     Visualize the most active months in the Telegram group for all months and all years using a line chart.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
+    - tz (str | float): Time zone to chart in, such as 'Europe/Berlin', or an offset from UTC in hours.
+      Defaults to the export's local time.
     """
     
-    active_months_list = get_most_active_months_all_time(data)
+    active_months_list = get_most_active_months_all_time(data, tz=tz)
 
    
     months = [month['name'] for month in active_months_list]
@@ -57,15 +61,17 @@ def visualize_line_chart(data: dict):
     plt.grid(True)
     plt.show()
 
-def visualize_area_chart(data: dict):
+def visualize_area_chart(data: dict, tz: str | float | None = None):
     """
     Visualize the most active months in the Telegram group for all months and all years using an area chart.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
+    - tz (str | float): Time zone to chart in, such as 'Europe/Berlin', or an offset from UTC in hours.
+      Defaults to the export's local time.
     """
     
-    active_months_list = get_most_active_months_all_time(data)
+    active_months_list = get_most_active_months_all_time(data, tz=tz)
 
     
     months = [month['name'] for month in active_months_list]
@@ -83,15 +89,17 @@ def visualize_area_chart(data: dict):
     plt.grid(True)
     plt.show()
 
-def visualize_pie_chart(data: dict):
+def visualize_pie_chart(data: dict, tz: str | float | None = None):
     """
     Visualize the most active months in the Telegram group for all months and all years using a pie chart.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
+    - tz (str | float): Time zone to chart in, such as 'Europe/Berlin', or an offset from UTC in hours.
+      Defaults to the export's local time.
     """
     
-    active_months_list = get_most_active_months_all_time(data)
+    active_months_list = get_most_active_months_all_time(data, tz=tz)
 
     
     months = [month['name'] for month in active_months_list]
@@ -104,9 +112,9 @@ def visualize_pie_chart(data: dict):
     plt.show()
 
 
-def visualize_most_active_months_trend(data: dict):
+def visualize_most_active_months_trend(data: dict, tz: str | float | None = None):
    
-    active_months = get_most_active_months(data)
+    active_months = get_most_active_months(data, tz=tz)
 
    
     months = [datetime.strptime(month, '%Y-%m') for month, _ in active_months]
@@ -125,9 +133,9 @@ def visualize_most_active_months_trend(data: dict):
 
 
 
-def visualize_top_10_most_active_months(data: dict):
+def visualize_top_10_most_active_months(data: dict, tz: str | float | None = None):
   
-    active_months = get_most_active_months(data)
+    active_months = get_most_active_months(data, 10, tz=tz)
 
     # Get the top 10 most active months
     top_10_months = [month for month, _ in active_months[:10]]
@@ -154,17 +162,19 @@ def visualize_top_10_most_active_months(data: dict):
     plt.tight_layout()
     plt.show()
 
-def visualize_most_active_months_by_year(data: dict):
+def visualize_most_active_months_by_year(data: dict, tz: str | float | None = None):
     """
     Visualize the most active months in the Telegram group for each year using a grouped bar plot and export the data.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
+    - tz (str | float): Time zone to chart in, such as 'Europe/Berlin', or an offset from UTC in hours.
+      Defaults to the export's local time.
     - export_excel (bool): Whether to export the data to an Excel file. Defaults to True.
     - export_json (bool): Whether to export the data to a JSON file. Defaults to True.
     """
    
-    active_months_by_year = get_most_active_months_by_year(data)
+    active_months_by_year = get_most_active_months_by_year(data, tz=tz)
 
     
     years = sorted(active_months_by_year.keys())
@@ -39,7 +39,7 @@ def visualize_pie_chart(data: dict, top_n: int = 10):
     - top_n (int): The number of top senders to include. Defaults to 10.
     """
  
-    senders_ranked = get_senders(data)[:top_n]
+    senders_ranked = get_senders(data, top_n)
 
   
     senders = [sender['sender'] for sender in senders_ranked]
@@ -5,8 +5,8 @@ sys.path.append('../')
 from tool import  get_most_active_weekdays, load_json
 
 
-def visualize_most_active_weekdays_bar(data: dict):
-    active_weekdays = get_most_active_weekdays(data)
+def visualize_most_active_weekdays_bar(data: dict, tz: str | float | None = None):
+    active_weekdays = get_most_active_weekdays(data, tz=tz)
 
     weekdays = [weekday for weekday, _ in active_weekdays]
     message_counts = [count for _, count in active_weekdays]
@@ -20,8 +20,8 @@ def visualize_most_active_weekdays_bar(data: dict):
     plt.tight_layout()
     plt.show()
 
-def visualize_most_active_weekdays_pie(data: dict):
-    active_weekdays = get_most_active_weekdays(data)
+def visualize_most_active_weekdays_pie(data: dict, tz: str | float | None = None):
+    active_weekdays = get_most_active_weekdays(data, tz=tz)
 
     weekdays = [weekday for weekday, _ in active_weekdays]
     message_counts = [count for _, count in active_weekdays]
@@ -6,14 +6,16 @@ from tool import get_most_active_year, load_json
 
 
 
-def visualize_message_trend_over_year(data: dict):
+def visualize_message_trend_over_year(data: dict, tz: str | float | None = None):
     """
     Visualize the change in message activity over time using a line plot.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
+    - tz (str | float): Time zone to chart in, such as 'Europe/Berlin', or an offset from UTC in hours.
+      Defaults to the export's local time.
     """
-    active_years_data = get_most_active_year(data)
+    active_years_data = get_most_active_year(data, tz=tz)
    
     sorted_years = active_years_data
     years, message_counts = zip(*sorted_years)
@@ -30,14 +32,16 @@ def visualize_message_trend_over_year(data: dict):
     plt.tight_layout()
     plt.show()
 
-def visualize_message_trend_over_year_bar(data: dict):
+def visualize_message_trend_over_year_bar(data: dict, tz: str | float | None = None):
     """
     Visualize the change in message activity over time using a bar chart.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
+    - tz (str | float): Time zone to chart in, such as 'Europe/Berlin', or an offset from UTC in hours.
+      Defaults to the export's local time.
     """
-    active_years_data = get_most_active_year(data)
+    active_years_data = get_most_active_year(data, tz=tz)
    
     sorted_years = active_years_data
     years, message_counts = zip(*sorted_years)
@@ -52,14 +56,16 @@ def visualize_message_trend_over_year_bar(data: dict):
     plt.tight_layout()
     plt.show()
 
-def visualize_message_trend_over_year_pie(data: dict):
+def visualize_message_trend_over_year_pie(data: dict, tz: str | float | None = None):
     """
     Visualize the distribution of message activity over years using a pie chart.
 
     Args:
     - data (dict): The JSON data from the Telegram group export.
+    - tz (str | float): Time zone to chart in, such as 'Europe/Berlin', or an offset from UTC in hours.
+      Defaults to the export's local time.
     """
-    active_years_data = get_most_active_year(data)
+    active_years_data = get_most_active_year(data, tz=tz)
    
     sorted_years = active_years_data
     years, message_counts = zip(*sorted_years)
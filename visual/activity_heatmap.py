@@ -0,0 +1,18 @@
+from matplotlib import pyplot as plt
+import seaborn as sns
+import sys
+sys.path.append('../')
+from timestamps import WEEKDAY_NAMES
+from tool import get_activity_cube, load_json
+
+
+def visualize_heatmap(data: dict, users: list | None = None, tz: str | float | None = None):
+    heatmap = get_activity_cube(data, tz=tz).heatmap(users)
+
+    plt.figure(figsize=(14, 5))
+    sns.heatmap(heatmap, cmap='YlGnBu', xticklabels=range(24), yticklabels=WEEKDAY_NAMES)
+    plt.xlabel(f"Hour of the Day ({tz if tz is not None else 'export time'})")
+    plt.ylabel('Weekday')
+    plt.title('Messages per Weekday and Hour' + (f" of {', '.join(map(str, users))}" if users else ''))
+    plt.tight_layout()
+    plt.show()
@@ -15,7 +15,7 @@ def visualize_bar_chart(data: dict, top_n: int = 10):
     """
 
     # Get editors data
-    editor_ranking = get_editors(data)
+    editor_ranking = get_editors(data, top_n)
     top_editors = list(editor_ranking.keys())[:top_n]
     edited_message_counts = list(editor_ranking.values())[:top_n]
 
@@ -36,7 +36,7 @@ def visualize_pie_chart(data: dict, top_n: int = 6):
     - data (dict): The JSON data.
     - top_n (int): The number of top editors to include. Defaults to 6.
     """
-    editor_ranking = get_editors(data)
+    editor_ranking = get_editors(data, top_n)
     top_editors = list(editor_ranking.keys())[:top_n]
     edited_message_counts = list(editor_ranking.values())[:top_n]
 
@@ -56,7 +56,7 @@ def visualize_vertical_bar_chart(data: dict, top_n: int = 10):
     - top_n (int): The number of top editors to visualize. Defaults to 10.
     """
 
-    editor_ranking = get_editors(data)
+    editor_ranking = get_editors(data, top_n)
     top_editors = list(editor_ranking.keys())[:top_n]
     edited_message_counts = list(editor_ranking.values())[:top_n]
 
@@ -77,7 +77,7 @@ def visualize_line_chart(data: dict, top_n: int = 10):
     - top_n (int): The number of top editors to visualize. Defaults to 10.
     """
 
-    editor_ranking = get_editors(data)
+    editor_ranking = get_editors(data, top_n)
     top_editors = list(editor_ranking.keys())[:top_n]
     edited_message_counts = list(editor_ranking.values())[:top_n]
 
@@ -101,7 +101,7 @@ def visualize_area_chart(data: dict, top_n: int = 10):
     - top_n (int): The number of top editors to visualize. Defaults to 10.
     """
 
-    editor_ranking = get_editors(data)
+    editor_ranking = get_editors(data, top_n)
     top_editors = list(editor_ranking.keys())[:top_n]
     edited_message_counts = list(editor_ranking.values())[:top_n]
 
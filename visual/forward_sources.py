@@ -15,7 +15,7 @@ def visualize_bar_chart(data: dict, top_n: int = 10):
     """
 
     # Get forward sources data
-    forward_source_ranking = get_forward_sources(data)
+    forward_source_ranking = get_forward_sources(data, top_n)
     top_forward_sources = list(forward_source_ranking.keys())[:top_n]
     message_counts = list(forward_source_ranking.values())[:top_n]
 
@@ -36,7 +36,7 @@ def visualize_pie_chart(data: dict, top_n: int = 6):
     - data (dict): The JSON data.
     - top_n (int): The number of top forward sources to include. Defaults to 6.
     """
-    forward_source_ranking = get_forward_sources(data)
+    forward_source_ranking = get_forward_sources(data, top_n)
     top_forward_sources = list(forward_source_ranking.keys())[:top_n]
     message_counts = list(forward_source_ranking.values())[:top_n]
 
@@ -56,7 +56,7 @@ def visualize_vertical_bar_chart(data: dict, top_n: int = 10):
     - top_n (int): The number of top forward sources to visualize. Defaults to 10.
     """
 
-    forward_source_ranking = get_forward_sources(data)
+    forward_source_ranking = get_forward_sources(data, top_n)
     top_forward_sources = list(forward_source_ranking.keys())[:top_n]
     message_counts = list(forward_source_ranking.values())[:top_n]
 
@@ -77,7 +77,7 @@ def visualize_line_chart(data: dict, top_n: int = 10):
     - top_n (int): The number of top forward sources to visualize. Defaults to 10.
     """
 
-    forward_source_ranking = get_forward_sources(data)
+    forward_source_ranking = get_forward_sources(data, top_n)
     top_forward_sources = list(forward_source_ranking.keys())[:top_n]
     message_counts = list(forward_source_ranking.values())[:top_n]
 
@@ -101,7 +101,7 @@ def visualize_area_chart(data: dict, top_n: int = 10):
     - top_n (int): The number of top forward sources to visualize. Defaults to 10.
     """
 
-    forward_source_ranking = get_forward_sources(data)
+    forward_source_ranking = get_forward_sources(data, top_n)
     top_forward_sources = list(forward_source_ranking.keys())[:top_n]
     message_counts = list(forward_source_ranking.values())[:top_n]
 
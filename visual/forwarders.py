@@ -16,7 +16,7 @@ def visualize_bar_chart(data: dict, top_n: int = 10):
     """
 
     # Get forwarders data
-    forwarder_ranking = get_forwarders(data)
+    forwarder_ranking = get_forwarders(data, top_n)
     top_forwarders = list(forwarder_ranking.keys())[:top_n]
     message_counts = list(forwarder_ranking.values())[:top_n]
 
@@ -37,7 +37,7 @@ def visualize_pie_chart(data: dict, top_n: int = 6):
     - data (dict): The JSON data.
     - top_n (int): The number of top forwarders to include. Defaults to 10.
     """
-    forwarder_ranking = get_forwarders(data)
+    forwarder_ranking = get_forwarders(data, top_n)
     top_forwarders = list(forwarder_ranking.keys())[:top_n]
     message_counts = list(forwarder_ranking.values())[:top_n]
 
@@ -57,7 +57,7 @@ def visualize_vertical_bar_chart(data: dict, top_n: int = 10):
     - top_n (int): The number of top forwarders to visualize. Defaults to 10.
     """
 
-    forwarder_ranking = get_forwarders(data)
+    forwarder_ranking = get_forwarders(data, top_n)
     top_forwarders = list(forwarder_ranking.keys())[:top_n]
     message_counts = list(forwarder_ranking.values())[:top_n]
 
@@ -78,7 +78,7 @@ def visualize_line_chart(data: dict, top_n: int = 10):
     - top_n (int): The number of top forwarders to visualize. Defaults to 10.
     """
 
-    forwarder_ranking = get_forwarders(data)
+    forwarder_ranking = get_forwarders(data, top_n)
     top_forwarders = list(forwarder_ranking.keys())[:top_n]
     message_counts = list(forwarder_ranking.values())[:top_n]
 
@@ -102,7 +102,7 @@ def visualize_area_chart(data: dict, top_n: int = 10):
     - top_n (int): The number of top forwarders to visualize. Defaults to 10.
     """
 
-    forwarder_ranking = get_forwarders(data)
+    forwarder_ranking = get_forwarders(data, top_n)
     top_forwarders = list(forwarder_ranking.keys())[:top_n]
     message_counts = list(forwarder_ranking.values())[:top_n]
 
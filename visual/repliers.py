@@ -16,7 +16,7 @@ def visualize_bar_chart_repliers(data: dict, top_n: int = 10):
     """
 
     # Get repliers data
-    replier_ranking = get_repliers(data)
+    replier_ranking = get_repliers(data, top_n)
     top_repliers = list(replier_ranking.keys())[:top_n]
     message_counts = list(replier_ranking.values())[:top_n]
 
@@ -37,7 +37,7 @@ def visualize_pie_chart_repliers(data: dict, top_n: int = 6):
     - data (dict): The JSON data.
     - top_n (int): The number of top repliers to include. Defaults to 10.
     """
-    replier_ranking = get_repliers(data)
+    replier_ranking = get_repliers(data, top_n)
     top_repliers = list(replier_ranking.keys())[:top_n]
     message_counts = list(replier_ranking.values())[:top_n]
 
@@ -57,7 +57,7 @@ def visualize_vertical_bar_chart_repliers(data: dict, top_n: int = 10):
     - top_n (int): The number of top repliers to visualize. Defaults to 10.
     """
 
-    replier_ranking = get_repliers(data)
+    replier_ranking = get_repliers(data, top_n)
     top_repliers = list(replier_ranking.keys())[:top_n]
     message_counts = list(replier_ranking.values())[:top_n]
 
@@ -78,7 +78,7 @@ def visualize_line_chart_repliers(data: dict, top_n: int = 10):
     - top_n (int): The number of top repliers to visualize. Defaults to 10.
     """
 
-    replier_ranking = get_repliers(data)
+    replier_ranking = get_repliers(data, top_n)
     top_repliers = list(replier_ranking.keys())[:top_n]
     message_counts = list(replier_ranking.values())[:top_n]
 
@@ -102,7 +102,7 @@ def visualize_area_chart_repliers(data: dict, top_n: int = 10):
     - top_n (int): The number of top repliers to visualize. Defaults to 10.
     """
 
-    replier_ranking = get_repliers(data)
+    replier_ranking = get_repliers(data, top_n)
     top_repliers = list(replier_ranking.keys())[:top_n]
     message_counts = list(replier_ranking.values())[:top_n]
 